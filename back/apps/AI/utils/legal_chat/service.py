@@ -1,6 +1,4 @@
-import json
-import os
-import requests
+from apps.AI.utils.llm_gateway.service import get_gateway
 
 
 def build_system_prompt():
@@ -13,10 +11,6 @@ def build_system_prompt():
 
 
 def ask_legal_chat(message: str):
-    api_key = os.getenv("OPENAI_API_KEY") or os.getenv("APIKEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY no está configurada.")
-
     payload = {
         "model": "gpt-4.1-mini",
         "input": [
@@ -25,22 +19,7 @@ def ask_legal_chat(message: str):
         ],
     }
 
-    response = requests.post(
-        "https://api.openai.com/v1/responses",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json=payload,
-        timeout=40,
-    )
-
-    if response.status_code >= 400:
-        raise RuntimeError(
-            f"OpenAI error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
+    data = get_gateway().responses(payload, feature="legal_chat")
     if data.get("output_text"):
         return data["output_text"].strip()
 
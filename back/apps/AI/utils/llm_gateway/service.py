@@ -0,0 +1,327 @@
+"""
+llm_gateway/service.py
+──────────────────────
+Punto único de salida hacia OpenAI para toda la app (búsqueda con IA, chat
+legal, borrador de productos y chat de soporte).
+
+  - Sesión HTTP compartida con pool de conexiones.
+  - Timeout por endpoint (``chat`` / ``responses``).
+  - Reintentos con backoff exponencial y jitter para 408/409/429/5xx y
+    errores de red.
+  - Circuit breaker: tras varios fallos seguidos deja de llamar durante un
+    tiempo y falla rápido.
+  - Semáforo de concurrencia por proceso: como máximo N llamadas en vuelo;
+    el resto espera un tiempo acotado y luego falla.
+  - Métricas de uso de tokens y latencia por funcionalidad.
+
+En pruebas se reemplaza el transporte HTTP por ``StubTransport``::
+
+    stub = StubTransport()
+    stub.queue({"choices": [{"message": {"content": "{}"}}]})
+    set_gateway(LLMGateway(transport=stub, api_key="test"))
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    "chat": "/v1/chat/completions",
+    "responses": "/v1/responses",
+}
+
+DEFAULT_TIMEOUTS = {
+    "chat": 20,
+    "responses": 40,
+}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMGatewayError(RuntimeError):
+    """Error de la API de OpenAI o de red al llamarla."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMUnavailable(LLMGatewayError):
+    """Circuito abierto o demasiadas llamadas simultáneas: se falla sin llamar."""
+
+
+# ─────────────────────────────────────────────────────────────
+#  Transportes
+# ─────────────────────────────────────────────────────────────
+
+class HTTPTransport:
+    """
+    POST JSON sobre una ``requests.Session`` con pool de conexiones.
+    Los reintentos los maneja el gateway, no urllib3.
+    """
+
+    def __init__(self, pool_size: int = 10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, url: str, headers: dict, payload: dict, timeout: float):
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": {"message": response.text}}
+        return response.status_code, body
+
+
+class StubTransport:
+    """
+    Transporte en memoria para pruebas sin red. Devuelve en orden las
+    respuestas encoladas (o lo que retorne ``handler``) y registra cada
+    llamada en ``calls``.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.responses = deque()
+        self.calls = []
+
+    def queue(self, body: dict, status_code: int = 200):
+        self.responses.append((status_code, body))
+
+    def post(self, url: str, headers: dict, payload: dict, timeout: float):
+        self.calls.append({"url": url, "payload": payload, "timeout": timeout})
+        if self.handler is not None:
+            result = self.handler(url, payload)
+            if isinstance(result, Exception):
+                raise result
+            return result if isinstance(result, tuple) else (200, result)
+        if not self.responses:
+            raise requests.ConnectionError("StubTransport sin respuestas encoladas")
+        status_code, body = self.responses.popleft()
+        if isinstance(body, Exception):
+            raise body
+        return status_code, body
+
+
+# ─────────────────────────────────────────────────────────────
+#  Circuit breaker y métricas
+# ─────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """
+    Cerrado → abierto tras ``threshold`` fallos seguidos. Abierto durante
+    ``reset_timeout`` segundos; después deja pasar una llamada de prueba
+    (semiabierto) y se cierra si sale bien.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Semiabierto: una sola llamada de prueba por ventana
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class LLMMetrics:
+    """
+    Contadores en memoria por funcionalidad: llamadas, errores, tokens y
+    latencia acumulada. ``snapshot()`` los expone para logs o un endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, feature: str, latency: float, usage: dict = None, error: bool = False):
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+        completion_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+        with self._lock:
+            entry = self._data.setdefault(feature, {
+                "calls": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["latency_total"] += latency
+            entry["latency_max"] = max(entry["latency_max"], latency)
+        logger.info(
+            "LLM %s: %.0f ms, tokens=%s/%s%s",
+            feature, latency * 1000, prompt_tokens, completion_tokens,
+            " (error)" if error else "",
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {feature: dict(values) for feature, values in self._data.items()}
+
+
+# ─────────────────────────────────────────────────────────────
+#  Gateway
+# ─────────────────────────────────────────────────────────────
+
+class LLMGateway:
+
+    def __init__(
+        self,
+        transport=None,
+        api_key: str = None,
+        base_url: str = "https://api.openai.com",
+        timeouts: dict = None,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_concurrency: int = 8,
+        queue_timeout: float = 5,
+        breaker: CircuitBreaker = None,
+    ):
+        self.transport = transport or HTTPTransport(pool_size=max_concurrency)
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LLMMetrics()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def chat(self, payload: dict, feature: str = "chat", timeout: float = None) -> dict:
+        """POST /v1/chat/completions"""
+        return self._call("chat", payload, feature, timeout)
+
+    def responses(self, payload: dict, feature: str = "responses", timeout: float = None) -> dict:
+        """POST /v1/responses"""
+        return self._call("responses", payload, feature, timeout)
+
+    def _sleep_before_retry(self, attempt: int):
+        # Backoff exponencial con jitter para no sincronizar reintentos
+        delay = self.backoff * (2 ** attempt)
+        time.sleep(random.uniform(delay / 2, delay * 1.5))
+
+    def _call(self, endpoint: str, payload: dict, feature: str, timeout: float = None) -> dict:
+        if not self.api_key:
+            raise LLMGatewayError("OPENAI_API_KEY no configurada")
+        if not self.breaker.allow():
+            raise LLMUnavailable("El servicio de IA no está disponible temporalmente")
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            raise LLMUnavailable("Demasiadas solicitudes simultáneas al servicio de IA")
+
+        url = f"{self.base_url}{ENDPOINTS[endpoint]}"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        timeout = timeout or self.timeouts[endpoint]
+        try:
+            error = None
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._sleep_before_retry(attempt - 1)
+                started = time.monotonic()
+                try:
+                    status_code, body = self.transport.post(url, headers, payload, timeout)
+                except requests.RequestException as exc:
+                    self.metrics.record(feature, time.monotonic() - started, error=True)
+                    error = LLMGatewayError(f"Error de red con OpenAI: {exc}")
+                    continue
+
+                latency = time.monotonic() - started
+                if status_code < 400:
+                    self.metrics.record(feature, latency, body.get("usage"))
+                    self.breaker.record_success()
+                    return body
+
+                self.metrics.record(feature, latency, error=True)
+                message = (body.get("error") or {}).get("message") if isinstance(body, dict) else body
+                error = LLMGatewayError(f"OpenAI error {status_code}: {message}", status_code)
+                if status_code not in RETRYABLE_STATUS:
+                    # Error del cliente (payload, auth): reintentar no ayuda
+                    raise error
+
+            self.breaker.record_failure()
+            raise error
+        finally:
+            self._semaphore.release()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def build_gateway(transport=None) -> LLMGateway:
+    return LLMGateway(
+        transport=transport,
+        api_key=getattr(settings, "OPENAI_API_KEY", None) or os.getenv("OPENAI_API_KEY"),
+        base_url=getattr(settings, "OPENAI_BASE_URL", "https://api.openai.com"),
+        timeouts=getattr(settings, "LLM_TIMEOUTS", None),
+        max_retries=getattr(settings, "LLM_MAX_RETRIES", 2),
+        max_concurrency=getattr(settings, "LLM_MAX_CONCURRENCY", 8),
+        queue_timeout=getattr(settings, "LLM_QUEUE_TIMEOUT", 5),
+        breaker=CircuitBreaker(
+            threshold=getattr(settings, "LLM_BREAKER_THRESHOLD", 5),
+            reset_timeout=getattr(settings, "LLM_BREAKER_RESET_SECONDS", 30),
+        ),
+    )
+
+
+def get_gateway() -> LLMGateway:
+    """Gateway compartido por el proceso (se crea en el primer uso)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway()
+    return _gateway
+
+
+def set_gateway(gateway: LLMGateway = None):
+    """Reemplaza el gateway del proceso (pruebas); ``None`` lo reinicia."""
+    global _gateway
+    _gateway = gateway
+
+
+def chat_content(data: dict) -> str:
+    """Texto del primer mensaje de una respuesta de chat/completions."""
+    return data["choices"][0]["message"]["content"]
@@ -1,7 +1,7 @@
 import json
-import os
 import re
-import requests
+
+from apps.AI.utils.llm_gateway.service import get_gateway
 
 FIELDS_ORDER = ["nombre", "descripcion", "categoria", "precio", "stock", "descuento"]
 
@@ -231,10 +231,6 @@ def tool_schema():
 
 
 def ask_openai(message: str, draft: dict, next_field: str, language: str):
-    api_key = os.getenv("OPENAI_API_KEY") or os.getenv("APIKEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY no está configurada.")
-
     language = normalize_language(language)
     context = {
         "draft": draft,
@@ -256,22 +252,7 @@ def ask_openai(message: str, draft: dict, next_field: str, language: str):
         "tool_choice": {"type": "function", "name": "update_product_draft"},
     }
 
-    response = requests.post(
-        "https://api.openai.com/v1/responses",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json=payload,
-        timeout=40,
-    )
-
-    if response.status_code >= 400:
-        raise RuntimeError(
-            f"OpenAI error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
+    data = get_gateway().responses(payload, feature="product_draft")
     output = data.get("output", [])
     for item in output:
         if item.get("type") in {"function_call", "tool_call"}:
@@ -1,4 +1,4 @@
-from .models import Cart, CartItem
+from .models import Cart, CartItem, ProductReservation
 from unfold.admin import ModelAdmin
 from django.contrib.admin import register
 @register(Cart)
@@ -16,3 +16,10 @@ class CartItemAdmin(ModelAdmin):
     list_filter = ('created_at', 'updated_at')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
+
+
+@register(ProductReservation)
+class ProductReservationAdmin(ModelAdmin):
+    list_display = ('product', 'cart', 'reserved_until')
+    search_fields = ('cart__user__username', 'product__name')
+    ordering = ('-reserved_until',)
@@ -1,5 +1,35 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_product_reservations(sender, using="default", **kwargs):
+    """
+    Crea las reservas de los carritos que ya tenían prendas apartadas antes
+    de existir la tabla de reservas (la más reciente por producto).
+    """
+    from django.utils import timezone
+    from .models import CartItem, ProductReservation
+    if ProductReservation.objects.using(using).exists():
+        return
+    active = (
+        CartItem.objects.using(using)
+        .filter(reserved_until__gt=timezone.now())
+        .order_by("product_id", "-reserved_until")
+        .values_list("product_id", "cart_id", "reserved_until")
+    )
+    reservations = {}
+    for product_id, cart_id, reserved_until in active:
+        reservations.setdefault(
+            product_id,
+            ProductReservation(product_id=product_id, cart_id=cart_id, reserved_until=reserved_until),
+        )
+    ProductReservation.objects.using(using).bulk_create(
+        reservations.values(), batch_size=500, ignore_conflicts=True
+    )
 
 
 class CartConfig(AppConfig):
     name = 'apps.cart'
+
+    def ready(self):
+        post_migrate.connect(sync_product_reservations, sender=self)
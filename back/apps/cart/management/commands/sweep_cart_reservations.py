@@ -0,0 +1,40 @@
+"""
+Comando de Django para eliminar las reservas de carrito vencidas.
+Uso: python manage.py sweep_cart_reservations [--interval 60] [--batch-size 1000]
+
+Sin ``--interval`` hace una sola pasada (cron); con él se queda en bucle.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.cart.utils import sweep_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes los ítems de carrito con la reserva vencida'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Segundos entre pasadas; 0 ejecuta una sola vez',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Cantidad de ítems por lote',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            close_old_connections()
+            total = sweep_expired_reservations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} ítems con reserva vencida eliminados'))
+            if interval <= 0:
+                break
+            time.sleep(interval)
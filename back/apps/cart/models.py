@@ -8,6 +8,8 @@ class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     total_items = models.IntegerField(default=0)
+    # Sube en cada cambio del carrito; el cliente la compara para detectar desfases
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     class Meta:
@@ -33,8 +35,36 @@ class CartItem(models.Model):
         verbose_name_plural = 'Items de carrito'
         ordering = ['-created_at']
         unique_together = ('cart', 'product')
+        indexes = [
+            # Barrido de reservas vencidas (sweep_expired_reservations)
+            models.Index(fields=['reserved_until']),
+        ]
         
     def __str__(self):
         return f'{self.product} - {self.count}'
     
     
+class ProductReservation(models.Model):
+    """
+    Reserva exclusiva de un producto por un carrito. La PK es el producto, así
+    que hay como mucho una reserva por prenda y reclamarla es una sola
+    escritura condicional (ver ``reserve`` en apps/cart/utils.py).
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='reservation'
+    )
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    reserved_until = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Reserva de producto'
+        verbose_name_plural = 'Reservas de productos'
+        indexes = [
+            models.Index(fields=['reserved_until']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} → {self.cart_id} hasta {self.reserved_until}'
@@ -1,9 +1,13 @@
 from datetime import timedelta
-from typing import Iterable, Optional, Union
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional, Union
 
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from .models import Cart, CartItem
+from .models import Cart, CartItem, ProductReservation
 
 RESERVATION_DURATION_MINUTES = 60
 RESERVATION_DURATION = timedelta(minutes=RESERVATION_DURATION_MINUTES)
@@ -21,35 +25,201 @@ def _cart_id(value: Union[Cart, str, None]) -> Optional[str]:
     return value
 
 
-def sync_cart_total(cart: Union[Cart, str, None]):
+def _product_id(value):
+    return getattr(value, "pk", value)
+
+
+def reserve(cart, product, duration: Optional[timedelta] = None):
+    """
+    Reclama (o renueva) la reserva de ``product`` para ``cart`` de forma
+    atómica. Devuelve ``(True, vence)`` si el carrito quedó como titular, o
+    ``(False, vence_del_titular)`` si otro carrito la tiene vigente.
+
+    No hay comprobación previa: un UPDATE condicional toma la reserva si es
+    propia o ya venció, y si no existe fila se inserta; la PK por producto
+    hace que de dos inserciones simultáneas solo una gane.
+    """
     cart_id = _cart_id(cart)
-    if not cart_id:
-        return
-    total = CartItem.objects.filter(cart_id=cart_id).count()
-    Cart.objects.filter(pk=cart_id).update(total_items=total)
+    product_id = _product_id(product)
+    now = timezone.now()
+    until = now + (duration or RESERVATION_DURATION)
+
+    claimed = (
+        ProductReservation.objects.filter(product_id=product_id)
+        .filter(Q(cart_id=cart_id) | Q(reserved_until__lte=now))
+        .update(cart_id=cart_id, reserved_until=until)
+    )
+    if claimed:
+        return True, until
+    try:
+        with transaction.atomic():
+            ProductReservation.objects.create(
+                product_id=product_id, cart_id=cart_id, reserved_until=until
+            )
+        return True, until
+    except IntegrityError:
+        holder_until = (
+            ProductReservation.objects.filter(product_id=product_id)
+            .values_list("reserved_until", flat=True)
+            .first()
+        )
+        return False, holder_until
 
 
-def cleanup_expired_reservations(
-    *, cart: Union[Cart, str, None] = None, product=None
-) -> int:
+def extend(cart, product, duration: Optional[timedelta] = None):
+    """
+    Alarga una reserva vigente del carrito. Devuelve el nuevo vencimiento o
+    ``None`` si el carrito ya no la tiene.
+    """
     now = timezone.now()
+    until = now + (duration or RESERVATION_DURATION)
+    updated = ProductReservation.objects.filter(
+        product_id=_product_id(product),
+        cart_id=_cart_id(cart),
+        reserved_until__gt=now,
+    ).update(reserved_until=until)
+    return until if updated else None
+
+
+def reserve_many(cart, product_ids, duration: Optional[timedelta] = None):
+    """
+    Versión por lotes de ``reserve`` con un número fijo de consultas.
+    Devuelve ``(vence, reclamados, bloqueados)``: el vencimiento de las
+    reservas obtenidas, el conjunto de productos reclamados y
+    ``{product_id: vence_del_titular}`` para los que tiene otro carrito.
+    """
+    cart_id = _cart_id(cart)
+    product_ids = set(product_ids)
+    now = timezone.now()
+    until = now + (duration or RESERVATION_DURATION)
+    if not product_ids:
+        return until, set(), {}
+
+    # Mismo criterio que reserve(): renovar las propias o tomar las vencidas,
+    # insertar las que no existen y ver quién quedó como titular.
+    (
+        ProductReservation.objects.filter(product_id__in=product_ids)
+        .filter(Q(cart_id=cart_id) | Q(reserved_until__lte=now))
+        .update(cart_id=cart_id, reserved_until=until)
+    )
+    ProductReservation.objects.bulk_create(
+        [
+            ProductReservation(product_id=product_id, cart_id=cart_id, reserved_until=until)
+            for product_id in product_ids
+        ],
+        ignore_conflicts=True,
+    )
+    claimed, blocked = set(), {}
+    for product_id, holder_id, reserved_until in ProductReservation.objects.filter(
+        product_id__in=product_ids
+    ).values_list("product_id", "cart_id", "reserved_until"):
+        if holder_id == cart_id:
+            claimed.add(product_id)
+        else:
+            blocked[product_id] = reserved_until
+    return until, claimed, blocked
+
+
+def release(cart, product=None) -> int:
+    """
+    Libera la reserva de un producto del carrito, o todas si no se indica.
+    """
+    qs = ProductReservation.objects.filter(cart_id=_cart_id(cart))
+    if product is not None:
+        qs = qs.filter(product_id=_product_id(product))
+    deleted, _ = qs.delete()
+    return deleted
+
+
+def bump_cart(cart: Union[Cart, str], items_delta: int = 0, reset: bool = False):
+    """
+    Ajusta ``total_items`` con un incremento atómico (F) y sube la versión
+    del carrito, sin recontar ítems. Devuelve ``(total_items, version)``.
+    """
+    cart_id = _cart_id(cart)
+    Cart.objects.filter(pk=cart_id).update(
+        total_items=Value(0) if reset else F("total_items") + items_delta,
+        version=F("version") + 1,
+        updated_at=timezone.now(),
+    )
+    return Cart.objects.filter(pk=cart_id).values_list("total_items", "version").get()
+
+
+def cart_totals(cart_items) -> dict:
+    """Total con descuento y total sin descuento de los ítems indicados."""
+    discounted_total = Decimal("0.00")
+    regular_total = Decimal("0.00")
+
+    for cart_item in cart_items:
+        unit_price = Decimal(cart_item.product.price)
+        regular_total += unit_price * cart_item.count
+
+        discount_percent = Decimal(cart_item.product.discount_percent or 0)
+        multiplier = Decimal("1.00") - (discount_percent / Decimal("100"))
+        line_total = (unit_price * multiplier) * cart_item.count
+        discounted_total += line_total
+
+    def _fmt(value: Decimal) -> float:
+        return float(value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+    return {
+        "total_cost": _fmt(discounted_total),
+        "total_compare_cost": _fmt(regular_total),
+    }
+
+
+def active_cart_items(cart: Union[Cart, str, None] = None, now=None):
+    """
+    Ítems con reserva vigente (o sin vencimiento). Las lecturas filtran los
+    vencidos en lugar de borrarlos; de eso se encarga ``sweep_expired_reservations``.
+    """
+    now = now or timezone.now()
     qs = CartItem.objects.filter(
-        reserved_until__isnull=False, reserved_until__lt=now
+        Q(reserved_until__isnull=True) | Q(reserved_until__gt=now)
     )
-    if cart:
+    if cart is not None:
         qs = qs.filter(cart_id=_cart_id(cart))
-    if product:
-        qs = qs.filter(product=product)
-
-    expired_cart_ids: Iterable[str] = qs.values_list("cart_id", flat=True)
-    expired_ids = list(expired_cart_ids)
-    if not expired_ids:
-        return 0
-
-    qs.delete()
-    for cart_id in set(expired_ids):
-        sync_cart_total(cart_id)
-    return len(expired_ids)
+    return qs
+
+
+def sweep_expired_reservations(batch_size: int = 1000, now=None) -> int:
+    """
+    Borra por lotes los ítems y reservas vencidos (índice sobre
+    ``reserved_until``) y recalcula en una sola sentencia los totales de los
+    carritos afectados. Lo ejecuta ``manage.py sweep_cart_reservations``.
+    """
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                CartItem.objects.filter(reserved_until__lt=now)
+                .order_by("reserved_until")
+                .values_list("id", "cart_id")[:batch_size]
+            )
+            if not rows:
+                break
+            # Se vuelve a exigir el vencimiento: un ítem renovado entre la
+            # lectura y el borrado (AddItemView, SynchCartView) se conserva
+            _, deleted = CartItem.objects.filter(
+                id__in=[item_id for item_id, _ in rows], reserved_until__lt=now
+            ).delete()
+            item_counts = (
+                CartItem.objects.filter(cart=OuterRef("pk"))
+                .order_by()
+                .values("cart")
+                .annotate(total=Count("id"))
+                .values("total")
+            )
+            Cart.objects.filter(pk__in={cart_id for _, cart_id in rows}).update(
+                total_items=Coalesce(Subquery(item_counts), 0),
+                version=F("version") + 1,
+            )
+        removed += deleted.get(CartItem._meta.label, 0)
+        if len(rows) < batch_size:
+            break
+    ProductReservation.objects.filter(reserved_until__lt=now).delete()
+    return removed
 
 
 def seconds_until(expiration) -> Optional[int]:
@@ -1,5 +1,5 @@
 # apps/cart/views.py
-from decimal import Decimal, ROUND_HALF_UP
+import uuid
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.views import APIView
@@ -11,46 +11,99 @@ from .models import Cart, CartItem
 from apps.product.models import Product
 from apps.product.serializers import ProductMinimalSerializer
 from .utils import (
-    cleanup_expired_reservations,
-    reservation_deadline,
+    active_cart_items,
+    bump_cart,
+    cart_totals,
+    release,
+    reserve,
+    reserve_many,
     seconds_until,
-    sync_cart_total,
 )
 
 
 # --------------------------------------------------
 # helpers
 # --------------------------------------------------
-def _serialize_cart(cart):
-    """
-    Devuelve una lista de ítems con el formato:
-    [
-        {"id": <cart_item_id>, "count": <int>, "product": <ProductSerializer>}
-    ]
-    """
-    cleanup_expired_reservations(cart=cart)
-    now = timezone.now()
-    items = (
-        CartItem.objects.filter(cart=cart)
-        .select_related("product")
-        .order_by("product")
-    )
+def _serialize_lines(items, request=None):
+    products = ProductMinimalSerializer(
+        [ci.product for ci in items], many=True, context={"request": request}
+    ).data
 
     return [
         {
             "id": ci.id,
             "product_id": ci.product.id,
             "count": ci.count,
-            "product": ProductMinimalSerializer(ci.product).data,
+            "product": product_data,
             "reservation_expires_at": ci.reserved_until.isoformat()
             if ci.reserved_until
             else None,
             "reservation_seconds_left": seconds_until(ci.reserved_until),
         }
-        for ci in items
+        for ci, product_data in zip(items, products)
     ]
 
 
+def _serialize_cart(cart, request=None):
+    """
+    Devuelve una lista de ítems con el formato:
+    [
+        {"id": <cart_item_id>, "count": <int>, "product": <ProductSerializer>}
+    ]
+    """
+    items = list(
+        active_cart_items(cart)
+        .select_related("product")
+        .order_by("product")
+    )
+    return _serialize_lines(items, request)
+
+
+def _wants_delta(request):
+    return request.query_params.get("delta") in ("1", "true")
+
+
+def _cart_response(request, cart, version, response_status, changed=(), removed=(), **extra):
+    """
+    Respuesta de una mutación del carrito. Por defecto, el carrito completo.
+    Con ``?delta=1`` solo las líneas cambiadas, los ids de producto quitados
+    y los totales nuevos; ``version`` permite al cliente detectar desfases
+    y pedir el carrito completo.
+    """
+    _, cart_version = version
+    if not _wants_delta(request):
+        return Response(
+            {**extra, "cart": _serialize_cart(cart, request), "version": cart_version},
+            status=response_status,
+        )
+    # Como GetItemTotalView: solo ítems vigentes. ``Cart.total_items`` aún
+    # cuenta los vencidos que el barrido no ha borrado
+    active_items = list(active_cart_items(cart).select_related("product"))
+    return Response(
+        {
+            **extra,
+            "delta": True,
+            "version": cart_version,
+            "total_items": len(active_items),
+            "changed": _serialize_lines(list(changed), request),
+            "removed": [str(product_id) for product_id in removed],
+            **cart_totals(active_items),
+        },
+        status=response_status,
+    )
+
+
+def _reserved_by_other(reserved_until):
+    return Response(
+        {
+            "detail": "Esta prenda está reservada por otra persona en este momento.",
+            "reservation_expires_at": reserved_until,
+            "reservation_seconds_left": seconds_until(reserved_until),
+        },
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
 # --------------------------------------------------
 # GET /api/cart/cart-items
 # --------------------------------------------------
@@ -59,7 +112,10 @@ class GetItemsView(APIView):
 
     def get(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        return Response({"cart": _serialize_cart(cart)}, status=status.HTTP_200_OK)
+        return Response(
+            {"cart": _serialize_cart(cart, request), "version": cart.version},
+            status=status.HTTP_200_OK,
+        )
 
 
 # --------------------------------------------------
@@ -78,57 +134,46 @@ class AddItemView(APIView):
 
         product = get_object_or_404(Product, id=product_id)
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cleanup_expired_reservations(cart=cart, product=product)
 
-        now = timezone.now()
-        blocking_item = (
-            CartItem.objects.select_related("cart")
-            .filter(product=product, reserved_until__gt=now)
-            .exclude(cart=cart)
-            .first()
-        )
-        if blocking_item:
+        # Verificar si el item ya existe en el carrito (con reserva vigente)
+        existing_item = active_cart_items(cart).filter(product=product).first()
+        new_count = existing_item.count + 1 if existing_item else 1
+
+        # Validar stock si existe el campo
+        if existing_item and hasattr(product, 'stock') and new_count > product.stock:
             return Response(
-                {
-                    "detail": "Esta prenda está reservada por otra persona en este momento.",
-                    "reservation_expires_at": blocking_item.reserved_until,
-                    "reservation_seconds_left": seconds_until(
-                        blocking_item.reserved_until
-                    ),
-                },
-                status=status.HTTP_409_CONFLICT,
+                {"error": "Stock insuficiente"}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Verificar si el item ya existe en el carrito
-        existing_item = CartItem.objects.filter(cart=cart, product=product).first()
-        
+        # Reclamar la reserva en una sola escritura atómica
+        claimed, reserved_until = reserve(cart, product)
+        if not claimed:
+            return _reserved_by_other(reserved_until)
+
         if existing_item:
             # Si ya existe, aumentar la cantidad
-            new_count = existing_item.count + 1
-            
-            # Validar stock si existe el campo
-            if hasattr(product, 'stock') and new_count > product.stock:
-                return Response(
-                    {"error": "Stock insuficiente"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
+            existing_item.product = product
             existing_item.count = new_count
-            existing_item.reserved_until = reservation_deadline()
+            existing_item.reserved_until = reserved_until
             existing_item.save(update_fields=["count", "reserved_until"])
-            
-            return Response({"cart": _serialize_cart(cart)}, status=status.HTTP_200_OK)
+            version = bump_cart(cart)
+
+            return _cart_response(
+                request, cart, version, status.HTTP_200_OK, changed=[existing_item]
+            )
         else:
-            # Si no existe, crear nuevo item
-            CartItem.objects.create(
+            # Si no existe, crear nuevo item (o reutilizar uno vencido aún sin barrer)
+            item, created = CartItem.objects.update_or_create(
                 cart=cart,
                 product=product,
-                count=1,
-                reserved_until=reservation_deadline(),
+                defaults={"count": 1, "reserved_until": reserved_until},
+            )
+            version = bump_cart(cart, items_delta=1 if created else 0)
+
+            return _cart_response(
+                request, cart, version, status.HTTP_201_CREATED, changed=[item]
             )
-            sync_cart_total(cart)
-            
-            return Response({"cart": _serialize_cart(cart)}, status=status.HTTP_201_CREATED)
 
 
 # --------------------------------------------------
@@ -139,31 +184,8 @@ class GetTotalView(APIView):
 
     def get(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cleanup_expired_reservations(cart=cart)
-
-        cart_items = CartItem.objects.filter(cart=cart).select_related("product")
-        discounted_total = Decimal("0.00")
-        regular_total = Decimal("0.00")
-
-        for cart_item in cart_items:
-            unit_price = Decimal(cart_item.product.price)
-            regular_total += unit_price * cart_item.count
-
-            discount_percent = Decimal(cart_item.product.discount_percent or 0)
-            multiplier = Decimal("1.00") - (discount_percent / Decimal("100"))
-            line_total = (unit_price * multiplier) * cart_item.count
-            discounted_total += line_total
-
-        def _fmt(value: Decimal) -> float:
-            return float(value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-
-        return Response(
-            {
-                "total_cost": _fmt(discounted_total),
-                "total_compare_cost": _fmt(regular_total),
-            },
-            status=status.HTTP_200_OK,
-        )
+        cart_items = active_cart_items(cart).select_related("product")
+        return Response(cart_totals(cart_items), status=status.HTTP_200_OK)
 
 
 # --------------------------------------------------
@@ -174,9 +196,8 @@ class GetItemTotalView(APIView):
 
     def get(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cleanup_expired_reservations(cart=cart)
         return Response(
-            {"total_items": cart.total_items}, status=status.HTTP_200_OK
+            {"total_items": active_cart_items(cart).count()}, status=status.HTTP_200_OK
         )
 
 
@@ -198,8 +219,7 @@ class UpdateItemView(APIView):
 
         product = get_object_or_404(Product, id=product_id)
         cart    = get_object_or_404(Cart, user=request.user)
-        item    = get_object_or_404(CartItem, cart=cart, product=product)
-        cleanup_expired_reservations(cart=cart, product=product)
+        item    = get_object_or_404(active_cart_items(cart), product=product)
 
         # (opcional) validar stock
         # Reemplaza 'stock' por el nombre correcto del campo de stock en tu modelo Product si es diferente
@@ -208,11 +228,17 @@ class UpdateItemView(APIView):
                 {"error": "Cantidad no permitida"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        claimed, reserved_until = reserve(cart, product)
+        if not claimed:
+            return _reserved_by_other(reserved_until)
+
+        item.product = product
         item.count = count
-        item.reserved_until = reservation_deadline()
+        item.reserved_until = reserved_until
         item.save(update_fields=["count", "reserved_until"])
+        version = bump_cart(cart)
 
-        return Response({"cart": _serialize_cart(cart)}, status=status.HTTP_200_OK)
+        return _cart_response(request, cart, version, status.HTTP_200_OK, changed=[item])
 
 
 # --------------------------------------------------
@@ -230,13 +256,15 @@ class RemoveItemView(APIView):
 
         product = get_object_or_404(Product, id=product_id)
         cart    = get_object_or_404(Cart, user=request.user)
-        cleanup_expired_reservations(cart=cart, product=product)
-        item    = get_object_or_404(CartItem, cart=cart, product=product)
+        item    = get_object_or_404(active_cart_items(cart), product=product)
 
         item.delete()
-        sync_cart_total(cart)
+        release(cart, product)
+        version = bump_cart(cart, items_delta=-1)
 
-        return Response({"cart": _serialize_cart(cart)}, status=status.HTTP_200_OK)
+        return _cart_response(
+            request, cart, version, status.HTTP_200_OK, removed=[product.id]
+        )
 
 
 # --------------------------------------------------
@@ -248,10 +276,12 @@ class EmptyCartView(APIView):
     def delete(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
         CartItem.objects.filter(cart=cart).delete()
-        Cart.objects.filter(pk=cart.pk).update(total_items=0)
+        release(cart)
+        _, version = bump_cart(cart, reset=True)
 
         return Response(
-            {"success": "Cart emptied successfully"}, status=status.HTTP_200_OK
+            {"success": "Cart emptied successfully", "version": version},
+            status=status.HTTP_200_OK,
         )
 
 
@@ -268,55 +298,106 @@ class SynchCartView(APIView):
             ...
         ]
     }
+
+    La fusión se calcula en memoria y se aplica con bulk_create/bulk_update,
+    así que el número de consultas no depende de la cantidad de ítems.
+    ``results`` informa qué pasó con cada producto:
+    added, merged, capped (limitado por stock), blocked (reservado por otra
+    persona) o not_found.
     """
     permission_classes = [IsAuthenticated]
 
+    @staticmethod
+    def _parse(incoming):
+        """{product_id: cantidad} sumando repetidos, y los ids no válidos."""
+        requested, invalid = {}, []
+        for entry in incoming if isinstance(incoming, list) else []:
+            pid = entry.get("product_id") if isinstance(entry, dict) else None
+            if not pid:
+                continue
+            try:
+                pid = uuid.UUID(str(pid))
+                qty = int(entry.get("count", 1))
+            except (TypeError, ValueError):
+                invalid.append(str(pid))
+                continue
+            if qty < 1:
+                invalid.append(str(pid))
+                continue
+            requested[pid] = requested.get(pid, 0) + qty
+        return requested, invalid
+
+    @staticmethod
+    def _stock_limit(product, wanted):
+        max_stock = getattr(product, "stock", None)
+        if isinstance(max_stock, int) and max_stock > 0:
+            return min(wanted, max_stock)
+        return wanted
+
     def put(self, request):
-        incoming = request.data.get("cart_items", [])
+        requested, invalid = self._parse(request.data.get("cart_items", []))
         cart, _  = Cart.objects.get_or_create(user=request.user)
-        cleanup_expired_reservations(cart=cart)
         now = timezone.now()
 
-        for entry in incoming:
-            pid   = entry.get("product_id")
-            qty   = entry.get("count", 1)
-            if not pid:
-                continue
+        products = Product.objects.in_bulk(list(requested))
+        reserved_until, claimed, blocked = reserve_many(cart, products.keys())
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=claimed)
+        }
 
-            product = Product.objects.filter(id=pid).first()
-            if not product:
+        results = [{"product_id": pid, "status": "not_found"} for pid in invalid]
+        to_create, to_update = [], []
+        for pid, qty in requested.items():
+            product = products.get(pid)
+            if product is None:
+                results.append({"product_id": str(pid), "status": "not_found"})
                 continue
-
-            blocking_item = (
-                CartItem.objects.select_related("cart")
-                .filter(product=product, reserved_until__gt=now)
-                .exclude(cart=cart)
-                .first()
-            )
-            if blocking_item:
+            if pid in blocked:
+                results.append({
+                    "product_id": str(pid),
+                    "status": "blocked",
+                    "reservation_expires_at": blocked[pid],
+                    "reservation_seconds_left": seconds_until(blocked[pid]),
+                })
                 continue
 
-            item, created = CartItem.objects.get_or_create(
-                cart=cart, product=product, defaults={"count": qty}
-            )
-            if not created:
+            item = existing.get(pid)
+            expired = bool(item and item.reserved_until and item.reserved_until <= now)
+            if item is None or expired:
+                # Nuevo, o vencido aún sin barrer: manda la cantidad del dispositivo
+                wanted, outcome = qty, "added"
+            else:
                 # sumamos cantidades respetando stock
-                max_stock = getattr(product, "stock", None)
-                limit = (
-                    max_stock
-                    if isinstance(max_stock, int) and max_stock > 0
-                    else item.count + qty
-                )
-                item.count = min(item.count + qty, limit)
-                item.reserved_until = reservation_deadline()
-                item.save(update_fields=["count", "reserved_until"])
+                wanted, outcome = item.count + qty, "merged"
+            count = self._stock_limit(product, wanted)
+            if count < wanted:
+                outcome = "capped"
+
+            if item is None:
+                to_create.append(CartItem(
+                    cart=cart, product=product, count=count, reserved_until=reserved_until
+                ))
             else:
-                item.reserved_until = reservation_deadline()
-                item.save(update_fields=["reserved_until"])
-
-        sync_cart_total(cart)
-
-        return Response(
-            {"success": "Cart synchronized", "cart": _serialize_cart(cart)},
-            status=status.HTTP_201_CREATED,
+                item.product = product
+                item.count = count
+                item.reserved_until = reserved_until
+                item.updated_at = now
+                to_update.append(item)
+            results.append({"product_id": str(pid), "status": outcome, "count": count})
+
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ["count", "reserved_until", "updated_at"])
+        version = bump_cart(cart, items_delta=len(to_create))
+
+        return _cart_response(
+            request,
+            cart,
+            version,
+            status.HTTP_201_CREATED,
+            changed=to_create + to_update,
+            success="Cart synchronized",
+            results=results,
         )
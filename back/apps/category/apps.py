@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_category_closure_table(sender, using="default", **kwargs):
+    from .models import Category, CategoryClosure
+    from .utils import rebuild_category_closure
+    categories = Category.objects.using(using).count()
+    if CategoryClosure.objects.using(using).filter(depth=0).count() != categories:
+        rebuild_category_closure(using=using)
 
 
 class CategoryConfig(AppConfig):
     name = 'apps.category'
+
+    def ready(self):
+        post_migrate.connect(sync_category_closure_table, sender=self)
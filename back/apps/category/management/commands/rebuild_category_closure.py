@@ -0,0 +1,15 @@
+"""
+Comando de Django para regenerar la tabla de clausura de categorías.
+Uso: python manage.py rebuild_category_closure
+"""
+from django.core.management.base import BaseCommand
+
+from apps.category.utils import rebuild_category_closure
+
+
+class Command(BaseCommand):
+    help = 'Regenera la tabla de clausura (ancestro/descendiente) de categorías'
+
+    def handle(self, *args, **options):
+        total = rebuild_category_closure()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} enlaces de categoría generados'))
@@ -1,5 +1,7 @@
 # models.py
 from django.db import models
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 import uuid
 
 class Category(models.Model):
@@ -24,3 +26,88 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class CategoryClosure(models.Model):
+    """
+    Tabla de clausura del árbol de categorías: una fila por cada par
+    (ancestro, descendiente), incluida la propia categoría con depth=0.
+    Permite filtrar una rama completa con un solo IN, a cualquier profundidad.
+    Se mantiene con las señales de abajo (ver apps/category/utils.py).
+    """
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='descendant_links'
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links'
+    )
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
+
+class CategoryTreeVersion(models.Model):
+    """
+    Fila única con la versión del árbol de categorías (marca de tiempo en
+    milisegundos del último cambio). Vive en la base de datos para que todos
+    los procesos compartan ETag e invalidación aunque la caché sea local.
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.version)
+
+
+@receiver(pre_save, sender=Category)
+def remember_previous_parent(sender, instance, raw=False, **kwargs):
+    """
+    Guarda el padre anterior para detectar si la categoría se movió de rama.
+    """
+    if raw or instance._state.adding:
+        return
+    instance._previous_parent_id = (
+        Category.objects.filter(pk=instance.pk)
+        .values_list('parent_id', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def sync_category_closure(sender, instance, created, raw=False, **kwargs):
+    """
+    Inserta las filas de clausura de una categoría nueva o reubica su rama
+    cuando cambia de padre. Las filas se borran en cascada con la categoría.
+    """
+    if raw:
+        return
+    from .utils import attach_to_closure, move_in_closure
+    if created:
+        attach_to_closure(instance)
+        return
+    previous_parent_id = getattr(instance, '_previous_parent_id', instance.parent_id)
+    if previous_parent_id != instance.parent_id:
+        move_in_closure(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, raw=False, **kwargs):
+    """
+    Cualquier cambio en el árbol invalida la versión cacheada de ListCategoriesView.
+    """
+    if raw:
+        return
+    from .utils import bump_category_tree_version
+    bump_category_tree_version()
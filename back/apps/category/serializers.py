@@ -18,7 +18,11 @@ class CategorySerializer(serializers.ModelSerializer):
         # Solo incluir subcategorías en el detalle, no en listados
         if self.context.get('include_children', False):
             children = obj.children.all()
-            return CategorySerializer(children, many=True, context={'include_children': False}).data
+            context = {
+                'include_children': False,
+                'product_counts': self.context.get('product_counts'),
+            }
+            return CategorySerializer(children, many=True, context=context).data
         return []
     
     def get_level(self, obj):
@@ -31,12 +35,14 @@ class CategorySerializer(serializers.ModelSerializer):
             return 2
     
     def get_product_count(self, obj):
-        """Cuenta productos disponibles en esta categoría y sus hijos"""
-        from django.db.models import Q, Count
-        # Contar productos directos
-        count = obj.products.filter(is_available=True).count()
-        # Sumar productos de categorías hijas recursivamente
-        for child in obj.children.all():
-            count += self.get_product_count(child)
-        return count
+        """
+        Productos disponibles en esta categoría y sus hijos. Las vistas pasan
+        ``product_counts`` calculado de una vez con ``subtree_product_counts``;
+        si falta, se cuenta la rama con una consulta sobre la closure table.
+        """
+        counts = self.context.get('product_counts')
+        if counts is not None and obj.id in counts:
+            return counts[obj.id]
+        from .utils import subtree_product_counts
+        return subtree_product_counts([obj.id], is_available=True).get(obj.id, 0)
 
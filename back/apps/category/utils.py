@@ -0,0 +1,201 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import Category, CategoryClosure, CategoryTreeVersion
+
+
+def _normalize_ids(category_ids: Union[Iterable, str, None]) -> list:
+    if category_ids in (None, ""):
+        return []
+    if isinstance(category_ids, (list, tuple, set)):
+        return list(category_ids)
+    return [category_ids]
+
+
+def subtree_ids(category_ids):
+    """
+    Subconsulta con los ids de las categorías indicadas y de todos sus
+    descendientes. Pensada para ``filter(category_id__in=subtree_ids(...))``.
+    """
+    return (
+        CategoryClosure.objects.filter(ancestor_id__in=_normalize_ids(category_ids))
+        .values('descendant_id')
+    )
+
+
+def subtree_product_counts(category_ids=None, **product_filters) -> dict:
+    """
+    {category_id: productos de su rama} en una sola consulta agregada.
+    Los filtros se aplican a los productos, p. ej. ``is_available=True``;
+    con ``category_ids`` solo se cuentan esas ramas.
+    """
+    product_q = Q(**{f'descendant__products__{key}': value for key, value in product_filters.items()})
+    closure = CategoryClosure.objects.all()
+    if category_ids is not None:
+        closure = closure.filter(ancestor_id__in=category_ids)
+    rows = (
+        closure.values('ancestor_id')
+        .annotate(total=Count('descendant__products', filter=product_q))
+        .values_list('ancestor_id', 'total')
+    )
+    return dict(rows)
+
+
+def attach_to_closure(category: Category):
+    """
+    Crea las filas de una categoría recién creada: ella misma y un enlace
+    con cada ancestro de su padre.
+    """
+    links = [CategoryClosure(ancestor=category, descendant=category, depth=0)]
+    if category.parent_id:
+        links.extend(
+            CategoryClosure(ancestor_id=ancestor_id, descendant=category, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list('ancestor_id', 'depth')
+        )
+    CategoryClosure.objects.bulk_create(links, ignore_conflicts=True)
+
+
+@transaction.atomic
+def move_in_closure(category: Category):
+    """
+    Reubica la rama de ``category`` bajo su nuevo padre: corta los enlaces
+    con los ancestros anteriores y crea los del nuevo padre.
+    """
+    subtree = list(
+        CategoryClosure.objects.filter(ancestor=category).values_list('descendant_id', 'depth')
+    )
+    if not subtree:
+        # Categoría anterior a la tabla de clausura: se reconstruye todo.
+        rebuild_category_closure()
+        return
+    branch_ids = [descendant_id for descendant_id, _ in subtree]
+    (
+        CategoryClosure.objects.filter(descendant_id__in=branch_ids)
+        .exclude(ancestor_id__in=branch_ids)
+        .delete()
+    )
+    if not category.parent_id:
+        return
+    new_ancestors = list(
+        CategoryClosure.objects.filter(descendant_id=category.parent_id)
+        .values_list('ancestor_id', 'depth')
+    )
+    CategoryClosure.objects.bulk_create(
+        [
+            CategoryClosure(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + depth + 1,
+            )
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def rebuild_category_closure(using: str = 'default') -> int:
+    """
+    Regenera la tabla completa a partir de ``Category.parent``. Útil tras
+    cargas masivas (``loaddata``, ``queryset.update``) que no disparan señales.
+    """
+    parents = dict(Category.objects.using(using).values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth)
+            )
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.using(using).all().delete()
+    CategoryClosure.objects.using(using).bulk_create(links, batch_size=1000)
+    return len(links)
+
+
+# ─────────────────────────────────────────────────────────────
+#  Árbol cacheado para ListCategoriesView
+# ─────────────────────────────────────────────────────────────
+
+CATEGORY_TREE_VERSION_PK = 1
+
+
+def category_tree_version() -> int:
+    """
+    Versión actual del árbol: marca de tiempo en milisegundos del último
+    cambio. Sirve a la vez de clave de caché, ETag y Last-Modified.
+
+    Se lee de la base de datos (una consulta por clave primaria): con caché
+    local por proceso todos los workers siguen viendo la misma versión.
+    """
+    version = (
+        CategoryTreeVersion.objects.filter(pk=CATEGORY_TREE_VERSION_PK)
+        .values_list('version', flat=True)
+        .first()
+    )
+    if version is None:
+        CategoryTreeVersion.objects.bulk_create(
+            [CategoryTreeVersion(pk=CATEGORY_TREE_VERSION_PK, version=int(time.time() * 1000))],
+            ignore_conflicts=True,
+        )
+        version = CategoryTreeVersion.objects.get(pk=CATEGORY_TREE_VERSION_PK).version
+    return version
+
+
+def category_tree_modified() -> datetime:
+    return datetime.fromtimestamp(category_tree_version() / 1000, tz=dt_timezone.utc)
+
+
+def bump_category_tree_version():
+    """
+    Invalida el árbol cacheado. El UPDATE va en la misma transacción que el
+    cambio: ninguna petición ve la versión nueva antes que los datos nuevos.
+    """
+    updated = CategoryTreeVersion.objects.filter(pk=CATEGORY_TREE_VERSION_PK).update(
+        version=Greatest(F('version') + 1, Value(int(time.time() * 1000)))
+    )
+    if not updated:
+        category_tree_version()
+
+
+def build_category_tree() -> list:
+    """
+    Árbol completo de categorías con los productos disponibles de cada rama.
+    """
+    categories = list(Category.objects.all())
+    # Productos disponibles por rama completa, en una sola consulta
+    product_counts = subtree_product_counts(is_available=True)
+
+    children_map = {}
+    for category in categories:
+        children_map.setdefault(category.parent_id, []).append(category)
+
+    def build_node(cat):
+        return {
+            'id': str(cat.id),
+            'name': cat.name,
+            'product_count': product_counts.get(cat.id, 0),
+            'sub_categories': [build_node(child) for child in children_map.get(cat.id, [])],
+        }
+
+    return [build_node(root) for root in children_map.get(None, [])]
+
+
+def cached_category_tree() -> list:
+    key = f'category:tree:{category_tree_version()}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, getattr(settings, 'CATEGORY_TREE_CACHE_TIMEOUT', 3600))
+    return tree
@@ -3,8 +3,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import permissions
 from django.http import Http404
-from django.db.models import Count, Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from .models import Category
+from .utils import (
+    cached_category_tree,
+    category_tree_modified,
+    category_tree_version,
+    subtree_ids,
+    subtree_product_counts,
+)
 from apps.utils.pagination import MediumSetPagination, LargeSetPagination
 from .serializers import CategorySerializer
 class CategoriesView(APIView):
@@ -18,7 +26,13 @@ class CategoriesView(APIView):
     def get(self, request, *args, **kwargs):
         if 'pk' in kwargs:
             category = self.get_object(kwargs['pk'])
-            serializer = CategorySerializer(category, context={'include_children': True})
+            # Conteos de la categoría y sus hijos en una sola consulta
+            category_ids = [category.id, *category.children.values_list('id', flat=True)]
+            context = {
+                'include_children': True,
+                'product_counts': subtree_product_counts(category_ids, is_available=True),
+            }
+            serializer = CategorySerializer(category, context=context)
             return Response(serializer.data)
         else:
             # Filtrar por categoría raíz si se especifica
@@ -32,11 +46,7 @@ class CategoriesView(APIView):
                 try:
                     root_category = Category.objects.get(name__iexact=root_filter, parent=None)
                     # Obtener esta categoría y todos sus descendientes
-                    categories = categories.filter(
-                        Q(id=root_category.id) | 
-                        Q(parent=root_category) | 
-                        Q(parent__parent=root_category)
-                    )
+                    categories = categories.filter(id__in=subtree_ids(root_category.id))
                 except Category.DoesNotExist:
                     return Response({'error': f'Root category "{root_filter}" not found'}, status=status.HTTP_404_NOT_FOUND)
             
@@ -51,7 +61,12 @@ class CategoriesView(APIView):
             
             paginator = LargeSetPagination()
             result_page = paginator.paginate_queryset(categories, request)
-            serializer = CategorySerializer(result_page, many=True)
+            product_counts = subtree_product_counts(
+                [category.id for category in result_page], is_available=True
+            )
+            serializer = CategorySerializer(
+                result_page, many=True, context={'product_counts': product_counts}
+            )
             return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, *args, **kwargs):
@@ -75,45 +90,13 @@ class CategoriesView(APIView):
 class ListCategoriesView(APIView):
     permission_classes = (permissions.AllowAny, )
 
+    @method_decorator(condition(
+        etag_func=lambda request, *args, **kwargs: f'"categories-{category_tree_version()}"',
+        last_modified_func=lambda request, *args, **kwargs: category_tree_modified(),
+    ))
     def get(self, request, format=None):
-        if not Category.objects.exists():
-            return Response({'error': 'No categories found'}, status=status.HTTP_404_NOT_FOUND)
-
-        categories = list(
-            Category.objects
-            .all()
-            .annotate(
-                available_products=Count(
-                    'products',
-                    filter=Q(products__is_available=True)
-                )
-            )
-        )
-        if not categories:
-            return Response({'error': 'No categories found'}, status=status.HTTP_404_NOT_FOUND)
-
-        children_map = {}
-        for category in categories:
-            parent_id = category.parent_id
-            children_map.setdefault(parent_id, []).append(category)
-
-        def build_node(cat):
-            sub_nodes = [build_node(child) for child in children_map.get(cat.id, [])]
-            total_products = (cat.available_products or 0) + sum(
-                child['product_count'] for child in sub_nodes
-            )
-            node = {
-                'id': cat.id,
-                'name': cat.name,
-                'product_count': total_products,
-                'sub_categories': sub_nodes,
-            }
-            return node
-
-        result = []
-        for root in children_map.get(None, []):
-            node = build_node(root)
-            result.append(node)
+        # El árbol se sirve desde caché; se invalida al cambiar categorías o productos
+        result = cached_category_tree()
 
         if not result:
             return Response({'error': 'No categories found'}, status=status.HTTP_404_NOT_FOUND)
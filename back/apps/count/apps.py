@@ -1,6 +1,31 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def backfill_visitor_keys(sender, using="default", **kwargs):
+    from .models import PageView, visitor_key
+    pending = PageView.objects.using(using).filter(visitor_key__isnull=True)
+    if not pending.exists():
+        return
+    taken = set(
+        PageView.objects.using(using).filter(visitor_key__isnull=False)
+        .values_list('visitor_key', flat=True)
+    )
+    batch = []
+    for view in pending.only('id', 'ip_address', 'user_agent').order_by('id').iterator():
+        key = visitor_key(view.ip_address, view.user_agent)
+        # Duplicados históricos: solo la visita más antigua recibe la huella
+        if key in taken:
+            continue
+        taken.add(key)
+        view.visitor_key = key
+        batch.append(view)
+    PageView.objects.using(using).bulk_update(batch, ['visitor_key'], batch_size=500)
 
 
 class CountConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.count'
+
+    def ready(self):
+        post_migrate.connect(backfill_visitor_keys, sender=self)
@@ -1,5 +1,14 @@
+import hashlib
+
 from django.db import models
 
+
+def visitor_key(ip_address, user_agent):
+  """Huella sha256 de (ip, user agent) para deduplicar visitas por índice."""
+  raw = f"{ip_address or ''}|{user_agent or ''}"
+  return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
 class PageView(models.Model):
   ip_address = models.CharField(max_length=255)
   user_agent = models.TextField()  # Para almacenar el user agent del navegador
@@ -9,7 +18,14 @@ class PageView(models.Model):
   country = models.CharField(max_length=255,null=True, blank=True)
   city = models.CharField(max_length=255,null=True, blank=True)
   created_at = models.DateTimeField(auto_now_add=True)
-  
+  # visitor_key(ip_address, user_agent); único para que bulk_create(ignore_conflicts) deduplique
+  visitor_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+  def save(self, *args, **kwargs):
+    if not self.visitor_key:
+      self.visitor_key = visitor_key(self.ip_address, self.user_agent)
+    super().save(*args, **kwargs)
+
   def __str__(self):
     return f"{self.ip_address} - {self.timestamp}"
   
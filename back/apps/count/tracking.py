@@ -0,0 +1,293 @@
+"""
+count/tracking.py
+─────────────────
+Registro de visitas fuera del camino de la petición.
+
+  - ``record`` solo calcula la huella (sha256 de ip + user agent) y encola la
+    visita en memoria: ninguna consulta ni llamada de red antes de responder.
+  - Un hilo en segundo plano vacía el buffer cada ``PAGEVIEW_FLUSH_INTERVAL``
+    segundos (o antes si se llena un lote), resuelve la ubicación de cada IP
+    y guarda todo con un único ``bulk_create``. La restricción única sobre
+    ``visitor_key`` descarta los duplicados entre procesos.
+  - La geolocalización usa una caché LRU con TTL por IP. Si ``GEOIP_DATABASE``
+    apunta a una base MaxMind (GeoLite2-City) y está instalado ``geoip2`` se
+    resuelve sin red; si no, se consulta ip-api.com con timeout corto.
+
+En pruebas se usa un recorder sin hilo y con resolvedor fijo::
+
+    set_recorder(PageViewRecorder(resolver=lambda ip: {}, background=False))
+    get_recorder().record("1.2.3.4", "UA")
+    get_recorder().flush()
+"""
+
+import atexit
+import ipaddress
+import logging
+import threading
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from apps.utils.ttl_cache import TTLCache
+
+from .models import PageView, visitor_key
+
+logger = logging.getLogger(__name__)
+
+EMPTY_LOCATION = {
+    "country": "",
+    "city": "",
+    "latitude": None,
+    "longitude": None,
+}
+
+
+def client_ip(request) -> str:
+    """IP del visitante: la última de X-Forwarded-For o, si no hay, REMOTE_ADDR."""
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+# ─────────────────────────────────────────────────────────────
+#  Geolocalización
+# ─────────────────────────────────────────────────────────────
+
+def _is_public(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip).is_global
+    except ValueError:
+        return False
+
+
+class GeoIPDatabaseResolver:
+    """Base MaxMind local (GeoLite2-City): sin red ni límites de cuota."""
+
+    def __init__(self, path: str):
+        import geoip2.database
+        self.reader = geoip2.database.Reader(path)
+
+    def __call__(self, ip: str) -> dict:
+        import geoip2.errors
+        try:
+            data = self.reader.city(ip)
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return dict(EMPTY_LOCATION)
+        return {
+            "country": data.country.name or "",
+            "city": data.city.name or "",
+            "latitude": data.location.latitude,
+            "longitude": data.location.longitude,
+        }
+
+
+class IPAPIResolver:
+    """ip-api.com con sesión HTTP reutilizada y timeout corto."""
+
+    url = "http://ip-api.com/json/{ip}"
+
+    def __init__(self, timeout: float = 2):
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def __call__(self, ip: str) -> dict:
+        response = self.session.get(self.url.format(ip=ip), timeout=self.timeout)
+        if response.status_code != 200:
+            # 429 / 5xx son pasajeros: se lanzan para que el locator no los cachee
+            raise requests.HTTPError(
+                f"ip-api.com respondió {response.status_code}", response=response
+            )
+        data = response.json()
+        if data.get("status") != "success":
+            return dict(EMPTY_LOCATION)
+        return {
+            "country": data.get("country", ""),
+            "city": data.get("city", ""),
+            "latitude": data.get("lat"),
+            "longitude": data.get("lon"),
+        }
+
+
+def build_resolver():
+    path = getattr(settings, "GEOIP_DATABASE", None)
+    if path:
+        try:
+            return GeoIPDatabaseResolver(path)
+        except (ImportError, OSError, ValueError) as exc:
+            logger.warning("Base GeoIP no disponible (%s); se usa ip-api.com", exc)
+    return IPAPIResolver(timeout=getattr(settings, "PAGEVIEW_GEO_TIMEOUT", 2))
+
+
+class CachedGeoLocator:
+    """
+    Resolvedor envuelto en una caché LRU/TTL por IP. Solo se cachean las
+    respuestas del resolvedor; si lanza una excepción (red, cuota, 5xx) la
+    IP se vuelve a consultar en la próxima visita.
+    """
+
+    def __init__(self, resolver, maxsize: int = 10000, ttl: float = 86400):
+        self.resolver = resolver
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def locate(self, ip: str) -> dict:
+        if not _is_public(ip):
+            return dict(EMPTY_LOCATION)
+        location = self.cache.get(ip)
+        if location is not None:
+            return location
+        try:
+            location = self.resolver(ip)
+        except Exception as exc:
+            # Sin ubicación se guarda igual la visita; no se cachea el fallo
+            logger.warning("Error al geolocalizar %s: %s", ip, exc)
+            return dict(EMPTY_LOCATION)
+        self.cache.set(ip, location)
+        return location
+
+
+# ─────────────────────────────────────────────────────────────
+#  Buffer de visitas
+# ─────────────────────────────────────────────────────────────
+
+class PageViewRecorder:
+
+    def __init__(
+        self,
+        resolver=None,
+        flush_interval: float = 5,
+        batch_size: int = 200,
+        buffer_limit: int = 10000,
+        seen_size: int = 50000,
+        geo_cache_size: int = 10000,
+        geo_cache_ttl: float = 86400,
+        background: bool = True,
+    ):
+        self.locator = CachedGeoLocator(
+            resolver or build_resolver(), maxsize=geo_cache_size, ttl=geo_cache_ttl
+        )
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.background = background
+        # Si la base de datos no responde se descartan las visitas más viejas
+        self._buffer = deque(maxlen=buffer_limit)
+        # Huellas ya encoladas o guardadas por este proceso
+        self._seen = TTLCache(maxsize=seen_size, ttl=geo_cache_ttl)
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def seen(self, key: str) -> bool:
+        return key in self._seen
+
+    def record(self, ip_address: str, user_agent: str) -> bool:
+        """
+        Encola una visita. Devuelve False si este proceso ya la había visto.
+        """
+        key = visitor_key(ip_address, user_agent)
+        if not self._seen.add(key, True):
+            return False
+        self._buffer.append((key, ip_address, user_agent))
+        if self.background:
+            self._ensure_worker()
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.set()
+        return True
+
+    def _take_batch(self) -> list:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    def flush(self) -> int:
+        """Guarda todo lo pendiente; devuelve cuántas visitas se procesaron."""
+        total = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                rows = []
+                for key, ip_address, user_agent in batch:
+                    location = self.locator.locate(ip_address)
+                    rows.append(PageView(
+                        visitor_key=key,
+                        ip_address=ip_address,
+                        user_agent=user_agent,
+                        country=location.get("country", ""),
+                        city=location.get("city", ""),
+                        latitude=location.get("latitude"),
+                        longitude=location.get("longitude"),
+                    ))
+                try:
+                    PageView.objects.bulk_create(rows, ignore_conflicts=True)
+                except DatabaseError as exc:
+                    logger.error("No se pudieron guardar %s visitas: %s", len(rows), exc)
+                total += len(rows)
+        return total
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="pageview-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error al vaciar el buffer de visitas")
+            finally:
+                # Conexiones propias de este hilo
+                connections.close_all()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def build_recorder() -> PageViewRecorder:
+    return PageViewRecorder(
+        flush_interval=getattr(settings, "PAGEVIEW_FLUSH_INTERVAL", 5),
+        batch_size=getattr(settings, "PAGEVIEW_BATCH_SIZE", 200),
+        buffer_limit=getattr(settings, "PAGEVIEW_BUFFER_LIMIT", 10000),
+        geo_cache_size=getattr(settings, "PAGEVIEW_GEO_CACHE_SIZE", 10000),
+        geo_cache_ttl=getattr(settings, "PAGEVIEW_GEO_CACHE_TTL", 86400),
+    )
+
+
+def get_recorder() -> PageViewRecorder:
+    """Recorder compartido por el proceso (se crea en el primer uso)."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = build_recorder()
+    return _recorder
+
+
+def set_recorder(recorder: PageViewRecorder = None):
+    """Reemplaza el recorder del proceso (pruebas); ``None`` lo reinicia."""
+    global _recorder
+    _recorder = recorder
+
+
+@atexit.register
+def _flush_on_exit():
+    if _recorder is not None:
+        try:
+            _recorder.flush()
+        except Exception:
+            logger.exception("Visitas pendientes sin guardar al salir")
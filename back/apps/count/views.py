@@ -4,21 +4,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import PageViewSerializer,NewsLetterSerializer
-from .models import PageView,NewsLetter
+from .models import PageView,NewsLetter,visitor_key
+from .tracking import client_ip, get_recorder
 from rest_framework import permissions
-import requests
 from apps.user.models import UserAccount
 class PageViewCountView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, format=None):
-        # Obtener la IP del usuario: se privilegia HTTP_X_FORWARDED_FOR, sino REMOTE_ADDR.
-        ip_address = request.META.get('HTTP_X_FORWARDED_FOR')
-        if ip_address:
-            # Toma la última IP del listado en caso de múltiples
-            ip_address = ip_address.split(',')[-1].strip()
-        else:
-            ip_address = request.META.get('REMOTE_ADDR', '')
+        ip_address = client_ip(request)
 
         # Obtener el user agent desde las cabeceras del request
         user_agent = request.META.get('HTTP_USER_AGENT', '')
@@ -30,46 +24,18 @@ class PageViewCountView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Si ya existe un registro con la misma IP y user agent, se evita duplicar
-        if PageView.objects.filter(ip_address=ip_address, user_agent=user_agent).exists():
+        # Si ya existe un registro con la misma IP y user agent, se evita duplicar.
+        # Primero el buffer en memoria y luego el índice único por huella.
+        recorder = get_recorder()
+        key = visitor_key(ip_address, user_agent)
+        if recorder.seen(key) or PageView.objects.filter(visitor_key=key).exists():
             return Response(
                 {'message': "Registro ya existente"},
                 status=status.HTTP_200_OK
             )
 
-        # Inicializar datos de ubicación por defecto
-        location_data = {
-            "country": "",
-            "city": "",
-            "latitude": None,
-            "longitude": None,
-        }
-
-        try:
-            # Realizar consulta a la API de geolocalización (ip-api.com)
-            response = requests.get(f"http://ip-api.com/json/{ip_address}")
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    location_data = {
-                        "country": data.get("country", ""),
-                        "city": data.get("city", ""),
-                        "latitude": data.get("lat"),
-                        "longitude": data.get("lon"),
-                    }
-        except Exception as e:
-            # En caso de error, se mantiene la información por defecto
-            print("Error retrieving location data:", e)
-
-        # Crear el registro PageView con los datos obtenidos
-        PageView.objects.create(
-            ip_address=ip_address,
-            user_agent=user_agent,
-            country=location_data.get("country", ""),
-            city=location_data.get("city", ""),
-            latitude=location_data.get("latitude"),
-            longitude=location_data.get("longitude"),
-        )
+        # La geolocalización y el guardado se hacen en segundo plano
+        recorder.record(ip_address, user_agent)
 
         return Response(
             {'message': "Registro completado satisfactoriamente"},
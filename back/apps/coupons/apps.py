@@ -1,5 +1,35 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def backfill_coupon_codes(sender, using="default", **kwargs):
+    """
+    Calcula el código normalizado de los cupones creados antes de existir
+    la columna. Si dos nombres solo difieren en mayúsculas, el más antiguo
+    conserva el código y el otro queda sin él hasta renombrarlo.
+    """
+    from .models import FixedPriceCoupon, PercentageCoupon, normalize_coupon_code
+    for model in (FixedPriceCoupon, PercentageCoupon):
+        pending = model.objects.using(using).filter(code__isnull=True)
+        if not pending.exists():
+            continue
+        taken = set(
+            model.objects.using(using).filter(code__isnull=False)
+            .values_list('code', flat=True)
+        )
+        batch = []
+        for coupon in pending.only('id', 'name').order_by('created_at'):
+            code = normalize_coupon_code(coupon.name)
+            if code in taken:
+                continue
+            taken.add(code)
+            coupon.code = code
+            batch.append(coupon)
+        model.objects.using(using).bulk_update(batch, ['code'], batch_size=500)
 
 
 class CouponsConfig(AppConfig):
     name = 'apps.coupons'
+
+    def ready(self):
+        post_migrate.connect(backfill_coupon_codes, sender=self)
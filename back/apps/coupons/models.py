@@ -1,9 +1,26 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 import uuid
 
+
+def normalize_coupon_code(name) -> str:
+    """Código comparable de un cupón: sin espacios sobrantes y sin mayúsculas."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def _validate_unique_code(coupon):
+    code = normalize_coupon_code(coupon.name)
+    if type(coupon).objects.filter(code=code).exclude(pk=coupon.pk).exists():
+        raise ValidationError({'name': 'Ya existe un cupón con este nombre.'})
+
+
 class FixedPriceCoupon(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, unique=True)
+    # Nombre normalizado: la búsqueda usa este índice en lugar de name__iexact
+    code = models.CharField(max_length=255, unique=True, null=True, editable=False)
     discount_price = models.DecimalField(max_digits=5, decimal_places=2)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -17,10 +34,18 @@ class FixedPriceCoupon(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        _validate_unique_code(self)
+
+    def save(self, *args, **kwargs):
+        self.code = normalize_coupon_code(self.name)
+        super().save(*args, **kwargs)
+
 
 class PercentageCoupon(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, unique=True)
+    code = models.CharField(max_length=255, unique=True, null=True, editable=False)
     discount_percentage = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,4 +56,25 @@ class PercentageCoupon(models.Model):
         
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def clean(self):
+        _validate_unique_code(self)
+
+    def save(self, *args, **kwargs):
+        self.code = normalize_coupon_code(self.name)
+        super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=FixedPriceCoupon)
+@receiver(post_save, sender=PercentageCoupon)
+@receiver(post_delete, sender=FixedPriceCoupon)
+@receiver(post_delete, sender=PercentageCoupon)
+def invalidate_coupon_cache(sender, raw=False, **kwargs):
+    """
+    Vacía la caché de cupones del proceso al crear, editar o borrar uno.
+    """
+    if raw:
+        return
+    from .utils import clear_coupon_cache
+    clear_coupon_cache()
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import CheckCouponView
+from .views import CheckCouponView, CheckCouponsView
 
 urlpatterns = [
     path('check-coupon', CheckCouponView.as_view()),
+    path('check-coupons', CheckCouponsView.as_view()),
 ]
\ No newline at end of file
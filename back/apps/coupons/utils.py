@@ -0,0 +1,106 @@
+"""
+coupons/utils.py
+────────────────
+Búsqueda de cupones para el checkout y la app.
+
+  - Un cupón se identifica por su ``code`` (nombre normalizado, índice
+    único), así que cada tabla se consulta con un ``IN`` indexado en lugar de
+    ``name__iexact``.
+  - Los resultados (también los códigos inexistentes) se guardan en una
+    caché LRU/TTL del proceso. Se vacía al guardar o borrar un cupón; los
+    demás procesos ven el cambio al vencer ``COUPON_CACHE_TTL``.
+  - ``get_coupons`` valida muchos códigos con como máximo dos consultas.
+
+Si un código existe en las dos tablas gana el de precio fijo, como antes.
+"""
+
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+
+from apps.utils.ttl_cache import TTLCache
+
+from .models import FixedPriceCoupon, PercentageCoupon, normalize_coupon_code
+
+_NOT_FOUND = False
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTLCache(
+                    maxsize=getattr(settings, "COUPON_CACHE_SIZE", 5000),
+                    ttl=getattr(settings, "COUPON_CACHE_TTL", 60),
+                )
+    return _cache
+
+
+def clear_coupon_cache():
+    if _cache is not None:
+        _cache.clear()
+
+
+def get_coupons(names) -> dict:
+    """
+    ``{código normalizado: cupón o None}`` para cada nombre recibido.
+    """
+    cache = _get_cache()
+    codes = {normalize_coupon_code(name) for name in names}
+    codes.discard("")
+    found = {}
+    missing = []
+    for code in codes:
+        coupon = cache.get(code)
+        if coupon is None:
+            missing.append(code)
+        else:
+            found[code] = coupon or None
+    if missing:
+        fetched = {}
+        # Precio fijo al final: tiene prioridad si el código está en ambas
+        for model in (PercentageCoupon, FixedPriceCoupon):
+            for coupon in model.objects.filter(code__in=missing):
+                fetched[coupon.code] = coupon
+        for code in missing:
+            coupon = fetched.get(code)
+            cache.set(code, coupon or _NOT_FOUND)
+            found[code] = coupon
+    return found
+
+
+def get_coupon(name):
+    """Cupón con ese nombre (sin distinguir mayúsculas) o None."""
+    code = normalize_coupon_code(name)
+    if not code:
+        return None
+    return get_coupons([code]).get(code)
+
+
+def apply_coupon(total: Decimal, name: str):
+    """
+    Descuenta el cupón ``name`` de ``total``. Devuelve ``(total, nombre del
+    cupón aplicado o "")``; nunca baja de cero.
+    """
+    applied = ""
+    coupon = get_coupon(name)
+
+    if isinstance(coupon, FixedPriceCoupon):
+        discount_amount = Decimal(coupon.discount_price)
+        if discount_amount < total:
+            total -= discount_amount
+            applied = coupon.name
+    elif isinstance(coupon, PercentageCoupon):
+        percentage = Decimal(coupon.discount_percentage)
+        if Decimal("1") < percentage < Decimal("100"):
+            total -= total * (percentage / Decimal("100"))
+            applied = coupon.name
+
+    if total < Decimal("0.00"):
+        total = Decimal("0.00")
+
+    return total, applied
@@ -1,38 +1,70 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import FixedPriceCoupon, PercentageCoupon
+from .models import FixedPriceCoupon, normalize_coupon_code
 from .serializers import FixedPriceCouponSerializer, PercentageCouponSerializer
+from .utils import get_coupon, get_coupons
+
+MAX_COUPONS_PER_CHECK = 100
+
+
+def _serialize_coupon(coupon):
+    if isinstance(coupon, FixedPriceCoupon):
+        return FixedPriceCouponSerializer(coupon).data
+    return PercentageCouponSerializer(coupon).data
 
 
 class CheckCouponView(APIView):
     def get(self, request, format=None):
         try:
-            coupon_name = request.query_params.get('coupon_name')
+            coupon = get_coupon(request.query_params.get('coupon_name'))
 
-            if FixedPriceCoupon.objects.filter(name=coupon_name).exists():
-                coupon = FixedPriceCoupon.objects.get(name=coupon_name)
-                coupon = FixedPriceCouponSerializer(coupon)
-
-                return Response(
-                    {'coupon': coupon.data},
-                    status=status.HTTP_200_OK
-                )
-            elif PercentageCoupon.objects.filter(name=coupon_name).exists():
-                coupon = PercentageCoupon.objects.get(name=coupon_name)
-                coupon = PercentageCouponSerializer(coupon)
-
-                return Response(
-                    {'coupon': coupon.data},
-                    status=status.HTTP_200_OK
-                )
-            else:
+            if coupon is None:
                 return Response(
                     {'error': 'Coupon code not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
-        except:
+            return Response(
+                {'coupon': _serialize_coupon(coupon)},
+                status=status.HTTP_200_OK
+            )
+        except Exception:
             return Response(
                 {'error': 'Something went wrong when checking coupon'},
                 status=status.HTTP_404_NOT_FOUND
-            )
\ No newline at end of file
+            )
+
+
+class CheckCouponsView(APIView):
+    """
+    POST /api/coupons/check-coupons
+    Body: { coupon_names: [..] }
+    Valida varios códigos a la vez (máximo 100) con una consulta por tipo.
+    """
+
+    def post(self, request, format=None):
+        names = request.data.get('coupon_names')
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return Response(
+                {'error': 'coupon_names debe ser una lista de códigos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(names) > MAX_COUPONS_PER_CHECK:
+            return Response(
+                {'error': f'Máximo {MAX_COUPONS_PER_CHECK} códigos por consulta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        coupons = get_coupons(names)
+        found = []
+        not_found = []
+        for name in dict.fromkeys(names):
+            coupon = coupons.get(normalize_coupon_code(name))
+            if coupon is None:
+                not_found.append(name)
+            else:
+                found.append(_serialize_coupon(coupon))
+        return Response(
+            {'coupons': found, 'not_found': not_found},
+            status=status.HTTP_200_OK
+        )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, OrderParticipant
 from unfold.admin import ModelAdmin
 
 @admin.register(Order)
@@ -17,4 +17,12 @@ class OrderItemAdmin(ModelAdmin):
     list_display = ('id', 'name', 'price', 'count', )
     list_display_links = ('id', 'name', )
     list_per_page = 25
-    
\ No newline at end of file
+    
+
+
+@admin.register(OrderParticipant)
+class OrderParticipantAdmin(ModelAdmin):
+
+    list_display = ('order', 'user', 'role', 'created_at', )
+    list_filter = ('role', )
+    list_per_page = 25
@@ -1,5 +1,41 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_sales_ranking(sender, using="default", **kwargs):
+    from .models import OrderItem, ProductSales
+    from .utils import COUNTED_STATUSES, rebuild_sales_ranking
+    if ProductSales.objects.exists():
+        return
+    if OrderItem.objects.filter(order__status__in=COUNTED_STATUSES).exists():
+        rebuild_sales_ranking()
+
+
+def sync_order_participants(sender, using="default", **kwargs):
+    from .models import Order, OrderParticipant
+    from .utils import rebuild_order_participants
+    if OrderParticipant.objects.exists():
+        return
+    if Order.objects.exists():
+        rebuild_order_participants()
+
+
+def sync_unread_counters(sender, using="default", **kwargs):
+    # Después de los participantes: los pendientes del chat dependen de ellos
+    from apps.user.models import UnreadCounter
+    from apps.user.utils.unread import rebuild_unread_counters
+    from .models import OrderChatMessage, OrderChatThread
+    missing_threads = (
+        not OrderChatThread.objects.exists() and OrderChatMessage.objects.exists()
+    )
+    if missing_threads or not UnreadCounter.objects.exists():
+        rebuild_unread_counters()
 
 
 class OrdersConfig(AppConfig):
     name = 'apps.orders'
+
+    def ready(self):
+        post_migrate.connect(sync_sales_ranking, sender=self)
+        post_migrate.connect(sync_order_participants, sender=self)
+        post_migrate.connect(sync_unread_counters, sender=self)
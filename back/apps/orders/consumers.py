@@ -0,0 +1,50 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Order
+from .realtime import chat_group
+from .utils import has_order_access
+
+
+class OrderChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/orders/chat/<transaction_id>/?token=<JWT>
+
+    Solo lectura: los mensajes se envían con ``POST /api/orders/chat/…``
+    y llegan aquí como ``{"type": "message", "message": {...}}`` con el
+    mismo formato que la API REST. Al reconectar, el cliente recupera lo
+    perdido con ``GET …?after=<id del último mensaje recibido>``.
+    """
+
+    group_name = None
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        order = await self.get_order(self.scope["url_route"]["kwargs"]["transaction_id"])
+        if order is None or not await database_sync_to_async(has_order_access)(user, order):
+            await self.close(code=4403)
+            return
+
+        self.group_name = chat_group(order.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Keep-alive para proxies que cierran conexiones inactivas
+        if content.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+
+    async def chat_message(self, event):
+        await self.send_json({"type": "message", "message": event["message"]})
+
+    @database_sync_to_async
+    def get_order(self, transaction_id):
+        return Order.objects.filter(transaction_id=transaction_id).first()
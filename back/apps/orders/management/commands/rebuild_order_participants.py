@@ -0,0 +1,18 @@
+"""
+Comando de Django para reconstruir los participantes de los pedidos.
+Uso: python manage.py rebuild_order_participants
+
+El checkout registra al comprador y a los vendedores de cada pedido; este
+comando los recalcula desde las líneas si la tabla se desincroniza.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.orders.utils import rebuild_order_participants
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye compradores y vendedores de cada pedido desde sus líneas'
+
+    def handle(self, *args, **options):
+        total = rebuild_order_participants()
+        self.stdout.write(self.style.SUCCESS(f'✅ Participantes actualizados: {total} registros'))
@@ -0,0 +1,18 @@
+"""
+Comando de Django para recalcular el ranking de más vendidos.
+Uso: python manage.py rebuild_sales_ranking
+
+Las ventas se actualizan de forma incremental al cambiar el estado de los
+pedidos; este comando puede programarse (cron) como corrección periódica.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.orders.utils import rebuild_sales_ranking
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las unidades vendidas por producto desde el historial de pedidos'
+
+    def handle(self, *args, **options):
+        total = rebuild_sales_ranking()
+        self.stdout.write(self.style.SUCCESS(f'✅ Ranking actualizado: {total} productos con ventas'))
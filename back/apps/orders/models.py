@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from apps.product.models import Product
 from .countries import Countries
 from datetime import datetime
@@ -70,6 +72,59 @@ class OrderItem(models.Model):
         return self.name
 
 
+class ProductSales(models.Model):
+    """
+    Unidades vendidas por producto en pedidos confirmados (procesados, en
+    camino o entregados). Se actualiza de forma incremental con las señales
+    de abajo y alimenta los destacados sin recorrer todo el historial.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sales'
+    )
+    units_sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Ventas de Producto'
+        verbose_name_plural = 'Ventas de Productos'
+        indexes = [
+            models.Index(fields=['-units_sold']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units_sold}"
+
+
+class OrderParticipant(models.Model):
+    """
+    Quién participa en cada pedido: el comprador y los vendedores de sus
+    productos. Se llena en el checkout y permite comprobar el acceso a un
+    pedido sin recorrer sus líneas y productos.
+    """
+    class Role(models.TextChoices):
+        buyer = 'buyer'
+        vendor = 'vendor'
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_participations')
+    role = models.CharField(max_length=10, choices=Role.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Participante de Orden'
+        verbose_name_plural = 'Participantes de Orden'
+        unique_together = ('order', 'user', 'role')
+        indexes = [
+            models.Index(fields=['user', 'role']),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.user_id} ({self.role})"
+
+
 def chat_image_upload_path(instance, filename):
     return f"order-chats/images/{instance.order.transaction_id}/{filename}"
 
@@ -101,3 +156,115 @@ class OrderChatMessage(models.Model):
 
     def __str__(self):
         return f"Mensaje {self.id} - {self.order.transaction_id}"
+
+
+class OrderChatThread(models.Model):
+    """Totales del chat de un pedido: mensajes enviados y aún sin leer."""
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, primary_key=True, related_name='chat_thread'
+    )
+    message_count = models.PositiveIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Chat de Orden'
+        verbose_name_plural = 'Chats de Orden'
+
+    def __str__(self):
+        return f"{self.order_id}: {self.unread_count}/{self.message_count}"
+
+
+class OrderChatUnread(models.Model):
+    """Mensajes del chat de un pedido que ``user`` aún no ha leído."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='chat_unread')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_chat_unread')
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Chat sin leer'
+        verbose_name_plural = 'Chats sin leer'
+        unique_together = ('order', 'user')
+
+    def __str__(self):
+        return f"{self.order_id}: {self.user_id} ({self.count})"
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_status(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk)
+        .values_list('status', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Suma o resta las unidades del pedido cuando entra o sale de los estados
+    que cuentan como venta (p. ej. al cancelarse).
+    """
+    if raw or created:
+        return
+    from .utils import COUNTED_STATUSES, record_order_sales
+    was_counted = getattr(instance, '_previous_status', instance.status) in COUNTED_STATUSES
+    is_counted = instance.status in COUNTED_STATUSES
+    if was_counted != is_counted:
+        record_order_sales(instance, sign=1 if is_counted else -1)
+    instance._previous_status = instance.status
+
+
+def _record_item_sales(item, sign):
+    from .utils import COUNTED_STATUSES, record_product_sales
+    status = Order.objects.filter(pk=item.order_id).values_list('status', flat=True).first()
+    if status in COUNTED_STATUSES:
+        record_product_sales([(item.product_id, item.count)], sign=sign)
+
+
+@receiver(post_save, sender=OrderItem)
+def add_item_sales(sender, instance, created, raw=False, **kwargs):
+    """
+    Solo aplica a artículos agregados a pedidos ya confirmados; en el checkout
+    el pedido nace sin procesar y sus unidades cuentan al cambiar de estado.
+    """
+    if raw or not created:
+        return
+    _record_item_sales(instance, sign=1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_item_sales(sender, instance, **kwargs):
+    _record_item_sales(instance, sign=-1)
+
+
+@receiver(post_save, sender=Order)
+def add_buyer_participant(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    from .utils import add_order_participants
+    add_order_participants(instance.pk, buyer_id=instance.user_id)
+
+
+@receiver(post_save, sender=OrderItem)
+def add_vendor_participant(sender, instance, created, raw=False, **kwargs):
+    """
+    Líneas agregadas fuera del checkout (p. ej. desde el admin); el checkout
+    usa bulk_create y registra a los vendedores él mismo.
+    """
+    if raw or not created:
+        return
+    from .utils import add_order_participants
+    vendor_id = Product.objects.filter(pk=instance.product_id).values_list('vendor_id', flat=True).first()
+    add_order_participants(instance.order_id, vendor_ids=[vendor_id])
+
+
+@receiver(post_save, sender=OrderChatMessage)
+def count_unread_chat_message(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    from .utils import record_chat_message
+    record_chat_message(instance.order_id, instance.sender_id)
@@ -0,0 +1,56 @@
+"""
+orders/realtime.py
+──────────────────
+Entrega en tiempo real de los mensajes del chat de pedidos.
+
+Cada pedido tiene un grupo de Channels (``chat_group``). ``OrderChatView``
+publica el mensaje recién creado tras el commit y ``OrderChatConsumer``
+(``consumers.py``) lo reenvía a los WebSocket conectados a ese pedido.
+
+El pub/sub es la capa de Channels configurada en ``CHANNEL_LAYERS``:
+
+  - Sin ``REDIS_URL``: ``InMemoryChannelLayer``, dentro del proceso. Sirve
+    cuando un único proceso ASGI (``uvicorn core.asgi:application``)
+    atiende tanto la API como los WebSocket.
+  - Con ``REDIS_URL``: ``channels_redis`` como broker, para varios procesos
+    o máquinas.
+
+Si el broker falla el mensaje ya está guardado: el cliente lo recupera con
+``GET /api/orders/chat/<transaction_id>/?after=<cursor>``.
+"""
+
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def chat_group(order_id) -> str:
+    return f"order-chat.{order_id}"
+
+
+def _send(group, event):
+    from channels.layers import get_channel_layer
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(group, event)
+    except Exception:
+        logger.exception("No se pudo publicar en %s", group)
+
+
+def publish_chat_message(order_id, data):
+    """
+    Publica ``data`` (el mensaje ya serializado) a los suscriptores del
+    pedido cuando la transacción actual se confirma.
+    """
+    # Tipos JSON puros: el broker serializa con msgpack
+    payload = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    transaction.on_commit(
+        lambda: _send(chat_group(order_id), {"type": "chat.message", "message": payload})
+    )
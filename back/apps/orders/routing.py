@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .consumers import OrderChatConsumer
+
+websocket_urlpatterns = [
+    path('ws/orders/chat/<str:transaction_id>/', OrderChatConsumer.as_asgi()),
+]
@@ -0,0 +1,294 @@
+from collections import defaultdict
+from typing import Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+
+from .models import (
+    Order, OrderChatMessage, OrderChatThread, OrderChatUnread, OrderItem, OrderParticipant,
+    ProductSales,
+)
+
+# Estados en los que un pedido cuenta como venta para los rankings
+COUNTED_STATUSES = (
+    Order.OrderStatus.processed,
+    Order.OrderStatus.shipping,
+    Order.OrderStatus.delivered,
+)
+
+
+def record_product_sales(rows: Iterable[Tuple[str, int]], sign: int = 1):
+    """
+    Aplica (product_id, unidades) al ranking con incrementos atómicos.
+    Las filas faltantes se crean primero en 0 para que dos ventas simultáneas
+    del mismo producto no se pisen.
+    """
+    totals = defaultdict(int)
+    for product_id, count in rows:
+        totals[product_id] += int(count or 0) * sign
+    totals = {product_id: delta for product_id, delta in totals.items() if delta}
+    if not totals:
+        return
+    ProductSales.objects.bulk_create(
+        [ProductSales(product_id=product_id) for product_id in totals],
+        ignore_conflicts=True,
+    )
+    for product_id, delta in totals.items():
+        ProductSales.objects.filter(product_id=product_id).update(
+            units_sold=F('units_sold') + delta
+        )
+
+
+def record_order_sales(order: Order, sign: int = 1):
+    record_product_sales(
+        OrderItem.objects.filter(order=order).values_list('product_id', 'count'),
+        sign=sign,
+    )
+
+
+@transaction.atomic
+def rebuild_sales_ranking() -> int:
+    """
+    Recalcula el ranking completo desde el historial de pedidos.
+    Corrige cualquier desvío de las actualizaciones incrementales.
+    """
+    rows = (
+        OrderItem.objects.filter(order__status__in=COUNTED_STATUSES)
+        .values('product_id')
+        .annotate(total=Sum('count'))
+        .values_list('product_id', 'total')
+    )
+    ProductSales.objects.all().delete()
+    ProductSales.objects.bulk_create(
+        [ProductSales(product_id=product_id, units_sold=total) for product_id, total in rows],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return ProductSales.objects.count()
+
+
+def _ranked_sales(category_ids=None):
+    """
+    Filas del ranking con ventas de productos disponibles y con stock,
+    opcionalmente limitadas a la rama de ``category_ids``.
+    """
+    from apps.category.utils import subtree_ids
+    sales = ProductSales.objects.filter(
+        units_sold__gt=0,
+        product__is_available=True,
+        product__stock__gt=0,
+    )
+    if category_ids:
+        sales = sales.filter(product__category_id__in=subtree_ids(category_ids))
+    return sales
+
+
+def top_selling_product_ids(limit: int, category_ids=None) -> list:
+    return list(
+        _ranked_sales(category_ids)
+        .order_by('-units_sold')
+        .values_list('product_id', flat=True)[:limit]
+    )
+
+
+def top_selling_categories(limit: int, category_ids=None) -> list:
+    """
+    [{'id', 'name', 'sold_count'}] de las categorías con más unidades vendidas.
+    """
+    rows = (
+        _ranked_sales(category_ids)
+        .values('product__category_id', 'product__category__name')
+        .annotate(total_sold=Sum('units_sold'))
+        .order_by('-total_sold')[:limit]
+    )
+    return [
+        {
+            'id': str(row['product__category_id']),
+            'name': row['product__category__name'],
+            'sold_count': row['total_sold'],
+        }
+        for row in rows
+    ]
+
+
+def add_order_participants(order_id, buyer_id=None, vendor_ids=()):
+    """Registra al comprador y a los vendedores del pedido; ignora repetidos."""
+    rows = [
+        OrderParticipant(order_id=order_id, user_id=vendor_id, role=OrderParticipant.Role.vendor)
+        for vendor_id in set(vendor_ids)
+        if vendor_id is not None
+    ]
+    if buyer_id is not None:
+        rows.append(OrderParticipant(order_id=order_id, user_id=buyer_id,
+                                     role=OrderParticipant.Role.buyer))
+    if rows:
+        OrderParticipant.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+@transaction.atomic
+def rebuild_order_participants() -> int:
+    """Reconstruye la tabla de participantes desde los pedidos y sus líneas."""
+    OrderParticipant.objects.all().delete()
+    buyers = [
+        OrderParticipant(order_id=order_id, user_id=user_id, role=OrderParticipant.Role.buyer)
+        for order_id, user_id in Order.objects.values_list('id', 'user_id').iterator()
+    ]
+    vendors = [
+        OrderParticipant(order_id=order_id, user_id=vendor_id, role=OrderParticipant.Role.vendor)
+        for order_id, vendor_id in (
+            OrderItem.objects.exclude(product__vendor_id=None)
+            .values_list('order_id', 'product__vendor_id')
+            .order_by()
+            .distinct()
+            .iterator()
+        )
+    ]
+    OrderParticipant.objects.bulk_create(buyers + vendors, batch_size=1000, ignore_conflicts=True)
+    return len(buyers) + len(vendors)
+
+
+def order_roles(user, order_id) -> frozenset:
+    """
+    Roles de ``user`` en el pedido. Se guardan en la propia instancia del
+    usuario, que vive lo que dura la petición (o la conexión WebSocket):
+    comprobar el mismo pedido varias veces cuesta una sola consulta.
+    """
+    cache = user.__dict__.setdefault('_order_roles', {})
+    key = str(order_id)
+    if key not in cache:
+        cache[key] = frozenset(
+            OrderParticipant.objects.filter(order_id=order_id, user_id=user.pk)
+            .values_list('role', flat=True)
+        )
+    return cache[key]
+
+
+def is_order_vendor(user, order_id) -> bool:
+    return OrderParticipant.Role.vendor in order_roles(user, order_id)
+
+
+def has_order_access(user, order) -> bool:
+    """Staff, el comprador o un vendedor con productos en el pedido."""
+    if user.is_staff or user.is_superuser:
+        return True
+    if order.user_id == user.id:
+        return True
+    return is_order_vendor(user, order.pk)
+
+
+def order_vendor_ids(order_id, exclude=None) -> list:
+    vendors = OrderParticipant.objects.filter(order_id=order_id, role=OrderParticipant.Role.vendor)
+    if exclude is not None:
+        vendors = vendors.exclude(user_id=getattr(exclude, 'pk', exclude))
+    return list(vendors.values_list('user_id', flat=True))
+
+
+def record_chat_message(order_id, sender_id):
+    """
+    Cuenta un mensaje nuevo en el hilo del pedido (total y sin leer) y en los
+    pendientes de cada destinatario.
+    """
+    OrderChatThread.objects.bulk_create([OrderChatThread(order_id=order_id)], ignore_conflicts=True)
+    OrderChatThread.objects.filter(order_id=order_id).update(
+        message_count=F('message_count') + 1, unread_count=F('unread_count') + 1
+    )
+    add_chat_unread(order_id, sender_id)
+
+
+def discount_thread_unread(order_id, amount: int):
+    """Resta del hilo los mensajes que se acaban de marcar como leídos."""
+    if amount > 0:
+        OrderChatThread.objects.filter(order_id=order_id).update(
+            unread_count=Greatest(F('unread_count') - amount, 0)
+        )
+
+
+def add_chat_unread(order_id, sender_id):
+    """Un mensaje nuevo queda sin leer para los demás participantes."""
+    from apps.user.utils.unread import add_unread
+    recipients = set(
+        OrderParticipant.objects.filter(order_id=order_id)
+        .exclude(user_id=sender_id)
+        .values_list('user_id', flat=True)
+    )
+    if not recipients:
+        return
+    OrderChatUnread.objects.bulk_create(
+        [OrderChatUnread(order_id=order_id, user_id=user_id) for user_id in recipients],
+        ignore_conflicts=True,
+    )
+    OrderChatUnread.objects.filter(order_id=order_id, user_id__in=recipients).update(
+        count=F('count') + 1
+    )
+    add_unread(recipients, 'order_chat')
+
+
+@transaction.atomic
+def clear_chat_unread(order_id, user) -> int:
+    """Pone en cero los pendientes de ``user`` en el pedido; devuelve cuántos eran."""
+    from apps.user.utils.unread import remove_unread
+    row = (
+        OrderChatUnread.objects.select_for_update()
+        .filter(order_id=order_id, user_id=user.pk, count__gt=0)
+        .first()
+    )
+    if row is None:
+        return 0
+    OrderChatUnread.objects.filter(pk=row.pk).update(count=0)
+    remove_unread(user.pk, 'order_chat', row.count)
+    return row.count
+
+
+@transaction.atomic
+def rebuild_chat_unread() -> int:
+    """
+    Recalcula los totales de cada hilo y los pendientes por (pedido, usuario)
+    desde los mensajes.
+    """
+    OrderChatThread.objects.all().delete()
+    OrderChatThread.objects.bulk_create(
+        [
+            OrderChatThread(order_id=order_id, message_count=total, unread_count=unread)
+            for order_id, total, unread in (
+                OrderChatMessage.objects.order_by()
+                .values('order_id')
+                .annotate(total=Count('id'), unread=Count('id', filter=Q(read=False)))
+                .values_list('order_id', 'total', 'unread')
+            )
+        ],
+        batch_size=1000,
+    )
+
+    unread_by_sender = {}
+    for order_id, sender_id, count in (
+        OrderChatMessage.objects.filter(read=False)
+        .order_by()
+        .values('order_id', 'sender_id')
+        .annotate(count=Count('id'))
+        .values_list('order_id', 'sender_id', 'count')
+    ):
+        unread_by_sender.setdefault(order_id, {})[sender_id] = count
+
+    rows = []
+    participants = (
+        OrderParticipant.objects.filter(order_id__in=unread_by_sender.keys())
+        .order_by()
+        .values_list('order_id', 'user_id')
+        .distinct()
+    )
+    for order_id, user_id in participants:
+        senders = unread_by_sender[order_id]
+        count = sum(senders.values()) - senders.get(user_id, 0)
+        if count:
+            rows.append(OrderChatUnread(order_id=order_id, user_id=user_id, count=count))
+
+    OrderChatUnread.objects.filter(count__gt=0).update(count=0)
+    OrderChatUnread.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['order', 'user'],
+        update_fields=['count'],
+    )
+    return len(rows)
@@ -8,17 +8,23 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 from decimal import Decimal
 
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from django.utils import timezone
 import uuid
 
-from .models import Order, OrderItem, OrderChatMessage
+from .models import Order, OrderItem, OrderChatMessage, OrderParticipant
+from .realtime import publish_chat_message
 from .serializers import OrderSerializer, OrderChatMessageSerializer
-from apps.utils.pagination import MediumSetPagination
-from apps.user.utils.push import send_push
-from apps.user.models import Notification
+from .utils import (
+    clear_chat_unread, discount_thread_unread, has_order_access, is_order_vendor, order_vendor_ids,
+)
+from apps.utils.pagination import KeysetPagination, MediumSetPagination, cursor_requested
+from apps.user.utils.outbox import notify_users
 from apps.payment.models import VendorPayout
 from apps.payment.utils import add_business_days
+from apps.reviews.models import Review
 
 logger = logging.getLogger(__name__)
 
@@ -54,15 +60,7 @@ class OrderView(APIView):
             raise Http404
 
     def _has_order_access(self, user, order):
-        if user.is_staff or user.is_superuser:
-            return True
-        if order.user_id == user.id:
-            return True
-        # Verificar si el usuario tiene productos en esta orden (es vendedor activo)
-        return OrderItem.objects.filter(
-            order=order,
-            product__vendor=user,
-        ).exists()
+        return has_order_access(user, order)
 
     def _can_edit_order(self, user):
         return user.is_staff or user.is_superuser
@@ -83,14 +81,7 @@ class OrderView(APIView):
                 orders = Order.objects.all()
             else:
                 # Obtener órdenes como comprador y como vendedor (si tiene productos)
-                from django.db.models import Q
-                orders = (
-                    Order.objects
-                    .filter(
-                        Q(user=user) | Q(orderitem__product__vendor=user)
-                    )
-                    .distinct()
-                )
+                orders = Order.objects.filter(participants__user=user).distinct()
             paginator = MediumSetPagination()
             result_page = paginator.paginate_queryset(orders, request)
             serializer = OrderSerializer(result_page, many=True)
@@ -111,59 +102,72 @@ class OrderView(APIView):
         
     
 class ListOrdersView(APIView):
+    """
+    GET /api/orders/get-orders[?cursor=&page_size=]
+    Historial del comprador, del más reciente al más antiguo. Solo se leen
+    las columnas que se devuelven. Con ``?cursor=`` (vacío para la primera
+    página) se pagina sobre ``(date_issued, id)`` y se incluye
+    ``next_cursor``; sin él, la lista completa de siempre.
+    """
     permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+    fields = (
+        'id', 'status', 'transaction_id', 'amount', 'shipping_price', 'date_issued',
+        'address_line_1', 'address_line_2', 'city', 'state_province_region',
+    )
 
     def get(self, request, format=None):
-        user = self.request.user
-        try:
-            orders = Order.objects.order_by('-date_issued').filter(user=user)
-            result = []
-
-            for order in orders:
-                item = {}
-                item['status'] = order.status
-                item['transaction_id'] = order.transaction_id
-                item['amount'] = order.amount
-                item['shipping_price'] = order.shipping_price
-                item['date_issued'] = order.date_issued
-                item['address_line_1'] = order.address_line_1
-                item['address_line_2'] = order.address_line_2
-                item['city'] = order.city
-                item['state_province_region'] = order.state_province_region
-
-                result.append(item)
-            
-            return Response(
-                {'orders': result},
-                status=status.HTTP_200_OK
-            )
-        except:
-            return Response(
-                {'error': 'Something went wrong when retrieving orders'},
-                status=status.HTTP_404_NOT_FOUND
+        orders = Order.objects.filter(user=request.user).values(*self.fields)
+        paginator = None
+        if cursor_requested(request):
+            paginator = KeysetPagination(
+                page_size=self.page_size,
+                max_page_size=self.max_page_size,
+                ordering=('date_issued', 'id'),
             )
+            orders = paginator.paginate_queryset(orders, request, view=self)
+        else:
+            orders = orders.order_by('-date_issued', '-id')
+        # ``id`` solo sirve de desempate para el cursor
+        result = [
+            {field: order[field] for field in self.fields if field != 'id'}
+            for order in orders
+        ]
+        payload = {'orders': result}
+        if paginator is not None:
+            payload['next_cursor'] = paginator.get_next_cursor()
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class ListOrderDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    order_fields = (
+        'status', 'transaction_id', 'amount', 'buyer_confirmed_at', 'shipped_at',
+        'completed_at', 'full_name', 'address_line_1', 'address_line_2', 'city',
+        'state_province_region', 'postal_zip_code', 'country_region',
+        'telephone_number', 'shipping_name', 'shipping_time', 'shipping_price',
+        'date_issued',
+    )
 
     def get(self, request, transactionId, format=None):
         user = self.request.user
-        try:
-            order = Order.objects.get(transaction_id=transactionId)
-        except Order.DoesNotExist:
+        order = (
+            Order.objects
+            .filter(transaction_id=transactionId)
+            .values('id', 'user_id', *self.order_fields)
+            .first()
+        )
+        if order is None:
             return Response(
                 {'error': 'Order with this transaction ID does not exist'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
         is_staff = user.is_staff or user.is_superuser
-        is_buyer = order.user_id == user.id
+        is_buyer = order['user_id'] == user.id
         # Verificar si el usuario es vendedor de algún producto en esta orden
-        is_vendor = OrderItem.objects.filter(
-            order=order,
-            product__vendor=user
-        ).exists()
+        is_vendor = not (is_staff or is_buyer) and is_order_vendor(user, order['id'])
 
         if not any([is_staff, is_buyer, is_vendor]):
             return Response(
@@ -172,121 +176,152 @@ class ListOrderDetailView(APIView):
             )
 
         order_items = (
-            OrderItem.objects.select_related('product')
+            OrderItem.objects
+            .filter(order_id=order['id'])
+            .annotate(has_review=Exists(Review.objects.filter(order_item=OuterRef('pk'))))
             .order_by('-date_added')
-            .filter(order=order)
+            .values(
+                'id', 'name', 'price', 'count', 'product_id', 'has_review',
+                'platform_fee', 'vendor_earnings',
+            )
         )
 
         # Si solo es vendedor (no comprador), limitar a sus productos
-        if is_vendor and not (is_staff or is_buyer):
+        if is_vendor:
             order_items = order_items.filter(product__vendor=user)
 
-        result = {
-            'status': order.status,
-            'transaction_id': order.transaction_id,
-            'amount': order.amount,
-            'buyer_confirmed_at': order.buyer_confirmed_at,
-            'shipped_at': order.shipped_at,
-            'completed_at': order.completed_at,
-            'full_name': order.full_name,
-            'address_line_1': order.address_line_1,
-            'address_line_2': order.address_line_2,
-            'city': order.city,
-            'state_province_region': order.state_province_region,
-            'postal_zip_code': order.postal_zip_code,
-            'country_region': order.country_region,
-            'telephone_number': order.telephone_number,
-            'shipping_name': order.shipping_name,
-            'shipping_time': order.shipping_time,
-            'shipping_price': order.shipping_price,
-            'date_issued': order.date_issued,
-            'order_items': [],
-        }
-
-        for order_item in order_items:
-                    result['order_items'].append(
-                        {
-                            'name': order_item.name,
-                            'price': order_item.price,
-                            'count': order_item.count,
-                            'product_id': str(order_item.product.id),
-                            'order_item_id': order_item.id,
-                            'has_review': hasattr(order_item, 'review'),
-                            'platform_fee': order_item.platform_fee,
-                            'vendor_earnings': order_item.vendor_earnings,
-                        }
-                    )
+        result = {field: order[field] for field in self.order_fields}
+        result['order_items'] = [
+            {
+                'name': order_item['name'],
+                'price': order_item['price'],
+                'count': order_item['count'],
+                'product_id': str(order_item['product_id']),
+                'order_item_id': order_item['id'],
+                'has_review': order_item['has_review'],
+                'platform_fee': order_item['platform_fee'],
+                'vendor_earnings': order_item['vendor_earnings'],
+            }
+            for order_item in order_items
+        ]
 
         return Response({'order': result}, status=status.HTTP_200_OK)
 
 
 class VendorOrdersView(APIView):
+    """
+    GET /api/orders/vendor/orders?status=[&cursor=&page_size=]
+    Pedidos en los que el usuario participa como vendedor, del más reciente
+    al más antiguo, paginados sobre ``(date_issued, id)``. Sin ``?cursor=``
+    se devuelven los ``max_page_size`` más recientes; con él (vacío para la
+    primera página) páginas de ``page_size``. ``next_cursor`` pide la
+    siguiente y es ``None`` en la última.
+
+    Los totales del vendedor y el número de líneas salen de un GROUP BY en
+    la base de datos; totales, líneas y payouts se consultan solo para los
+    pedidos de la página.
+    """
     permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
 
-    def get(self, request):
-        user = request.user
-        status_filter = request.query_params.get('status')
-
-        items_qs = (
+    def get_queryset(self, user, status_filter=None):
+        orders = Order.objects.filter(
+            participants__user=user, participants__role=OrderParticipant.Role.vendor
+        )
+        if status_filter:
+            orders = orders.filter(status=status_filter)
+        return orders.select_related('user')
+
+    def get_totals(self, user, order_ids):
+        """
+        Totales del vendedor por pedido, con un GROUP BY sobre sus líneas.
+        ``order_ids`` es una lista de ids o una subconsulta de pedidos.
+        """
+        vendor_amount = Case(
+            When(vendor_earnings__gt=0, then=F('vendor_earnings')),
+            default=F('price') * F('count'),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+        rows = (
             OrderItem.objects
-            .select_related('order', 'product', 'order__user')
-            .filter(product__vendor=user)
-            .order_by('-order__date_issued', '-date_added')
+            .filter(order_id__in=order_ids, product__vendor=user)
+            .order_by()
+            .values('order_id')
+            .annotate(
+                vendor_total=Coalesce(Sum(vendor_amount), Value(Decimal('0.00'))),
+                platform_fee_total=Coalesce(Sum('platform_fee'), Value(Decimal('0.00'))),
+                items_count=Count('id'),
+            )
         )
+        return {row['order_id']: row for row in rows}
 
-        if status_filter:
-            items_qs = items_qs.filter(order__status=status_filter)
-
-        orders_map = {}
-
-        for order_item in items_qs:
-            order = order_item.order
-            if order.id not in orders_map:
-                orders_map[order.id] = {
-                    'order_id': str(order.id),
-                    'transaction_id': str(order.transaction_id),
-                    'status': order.status,
-                    'date_issued': order.date_issued.isoformat(),
-                    'customer_name': order.full_name,
-                    'customer_email': getattr(order.user, 'email', ''),
-                    'customer_phone': order.telephone_number,
-                    'delivery_address': order.address_line_1,
-                    'delivery_city': order.city,
-                    'delivery_notes': order.address_line_2,
-                    'order_total': format(order.amount, '.2f'),
-                    'shipping_price': format(order.shipping_price, '.2f'),
-                    'items': [],
-                    'vendor_total': Decimal('0.00'),
-                    'platform_fee_total': Decimal('0.00'),
-                }
+    def get(self, request):
+        user = request.user
+        queryset = self.get_queryset(user, request.query_params.get('status'))
+        # Sin cursor, los clientes de siempre reciben la primera página más
+        # grande posible en lugar del historial completo.
+        paginator = KeysetPagination(
+            page_size=self.page_size if cursor_requested(request) else self.max_page_size,
+            max_page_size=self.max_page_size,
+            ordering=('date_issued', 'id'),
+        )
+        orders = paginator.paginate_queryset(queryset, request, view=self)
+        order_ids = [order.id for order in orders]
+        totals_map = self.get_totals(user, order_ids)
 
-            entry = orders_map[order.id]
+        items_map = {order.id: [] for order in orders}
+        for order_item in (
+            OrderItem.objects
+            .filter(order_id__in=order_ids, product__vendor=user)
+            .only('id', 'order_id', 'product_id', 'name', 'price', 'count',
+                  'vendor_earnings', 'platform_fee')
+            .order_by('-date_added')
+        ):
             vendor_amount = Decimal(order_item.vendor_earnings or 0)
             if vendor_amount <= 0:
                 vendor_amount = Decimal(order_item.price) * order_item.count
-            platform_fee = Decimal(order_item.platform_fee or 0)
-            entry['vendor_total'] += vendor_amount
-            entry['platform_fee_total'] += platform_fee
-            entry['items'].append({
+            items_map[order_item.order_id].append({
                 'order_item_id': str(order_item.id),
-                'product_id': str(order_item.product.id) if order_item.product_id else None,
+                'product_id': str(order_item.product_id) if order_item.product_id else None,
                 'name': order_item.name,
                 'price': format(order_item.price, '.2f'),
                 'count': order_item.count,
                 'subtotal': format(vendor_amount, '.2f'),
-                'platform_fee': format(platform_fee, '.2f'),
+                'platform_fee': format(Decimal(order_item.platform_fee or 0), '.2f'),
             })
 
         payout_map = {
             payout.order_id: payout
-            for payout in VendorPayout.objects.filter(
-                order_id__in=orders_map.keys(), vendor=user
-            )
+            for payout in VendorPayout.objects.filter(order_id__in=order_ids, vendor=user)
         }
 
         orders_list = []
-        for entry in orders_map.values():
-            payout = payout_map.get(uuid.UUID(entry['order_id']))
+        empty_totals = {
+            'vendor_total': Decimal('0.00'), 'platform_fee_total': Decimal('0.00'), 'items_count': 0,
+        }
+        for order in orders:
+            totals = totals_map.get(order.id, empty_totals)
+            entry = {
+                'order_id': str(order.id),
+                'transaction_id': str(order.transaction_id),
+                'status': order.status,
+                'date_issued': order.date_issued.isoformat(),
+                'customer_name': order.full_name,
+                'customer_email': getattr(order.user, 'email', ''),
+                'customer_phone': order.telephone_number,
+                'delivery_address': order.address_line_1,
+                'delivery_city': order.city,
+                'delivery_notes': order.address_line_2,
+                'order_total': format(order.amount, '.2f'),
+                'shipping_price': format(order.shipping_price, '.2f'),
+                'items': items_map[order.id],
+                'vendor_total': format(totals['vendor_total'], '.2f'),
+                'platform_fee_total': format(totals['platform_fee_total'], '.2f'),
+                'items_count': totals['items_count'],
+                'payout': None,
+            }
+            payout = payout_map.get(order.id)
             if payout:
                 entry['payout'] = {
                     'id': str(payout.id),
@@ -299,18 +334,12 @@ class VendorOrdersView(APIView):
                 }
                 entry['vendor_total'] = format(payout.net_amount, '.2f')
                 entry['platform_fee_total'] = format(payout.platform_fee, '.2f')
-            else:
-                entry['payout'] = None
-                entry['vendor_total'] = format(entry['vendor_total'], '.2f')
-                entry['platform_fee_total'] = format(
-                    entry['platform_fee_total'], '.2f'
-                )
-            entry['items_count'] = len(entry['items'])
             orders_list.append(entry)
 
-        orders_list.sort(key=lambda o: o['date_issued'], reverse=True)
-
-        return Response({'orders': orders_list}, status=status.HTTP_200_OK)
+        return Response(
+            {'orders': orders_list, 'next_cursor': paginator.get_next_cursor()},
+            status=status.HTTP_200_OK,
+        )
 
 
 class VendorOrderStatusView(APIView):
@@ -321,8 +350,11 @@ class VendorOrderStatusView(APIView):
         try:
             order = (
                 Order.objects
-                .filter(id=pk, orderitem__product__vendor=user)
-                .distinct()
+                .filter(
+                    id=pk,
+                    participants__user=user,
+                    participants__role=OrderParticipant.Role.vendor,
+                )
                 .get()
             )
         except Order.DoesNotExist:
@@ -400,36 +432,19 @@ class VendorOrderStatusView(APIView):
             "cancelled": order.status == Order.OrderStatus.cancelled,
         }
 
-        try:
-            # Guardar notificación en la base de datos
-            Notification.objects.create(
-                user=order.user,
-                title=message[0],
-                body=message[1],
-                data={
-                    "type": "order_status",
-                    "transaction_id": str(order.transaction_id),
-                    "order_id": str(order.id),
-                    "status": order.status,
-                    "process": process_info,
-                },
-            )
-            
-            # Enviar notificación push
-            send_push(
-                title=message[0],
-                body=message[1],
-                data={
-                    "type": "order_status",
-                    "transaction_id": str(order.transaction_id),
-                    "order_id": str(order.id),
-                    "status": order.status,
-                    "process": process_info,
-                },
-                user=order.user,
-            )
-        except Exception as exc:
-            logger.warning("No se pudo enviar push: %s", exc)
+        # Notificación en la app y push (el push sale por el outbox)
+        notify_users(
+            [order.user_id],
+            title=message[0],
+            body=message[1],
+            data={
+                "type": "order_status",
+                "transaction_id": str(order.transaction_id),
+                "order_id": str(order.id),
+                "status": order.status,
+                "process": process_info,
+            },
+        )
 
         return Response(
             {
@@ -443,6 +458,14 @@ class VendorOrderStatusView(APIView):
         )
 
 
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
 class OrderChatView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
@@ -454,29 +477,43 @@ class OrderChatView(APIView):
             raise Http404
 
     def has_access(self, user, order):
-        if user.is_staff or user.is_superuser:
-            return True
-        if order.user_id == user.id:
-            return True
-        return OrderItem.objects.filter(
-            order=order,
-            product__vendor=user,
-        ).exists()
+        return has_order_access(user, order)
 
     def get(self, request, transaction_id):
+        """
+        Historial del chat. Con ``?after=<id>`` devuelve solo los mensajes
+        posteriores a ese mensaje: es el respaldo del WebSocket para
+        sincronizar tras una reconexión. ``cursor`` es el id del último
+        mensaje devuelto, listo para la siguiente llamada.
+        """
         order = self.get_order(transaction_id)
         if not self.has_access(request.user, order):
             return Response(
                 {"detail": "No tienes permiso para ver este chat."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        messages = (
-            order.chat_messages.select_related("sender").order_by("created_at")
-        )
+        after = request.query_params.get("after")
+        messages = order.chat_messages.select_related("sender")
+        if after:
+            anchor = (
+                order.chat_messages.filter(pk=after).values("created_at", "id").first()
+                if _is_uuid(after) else None
+            )
+            if anchor is None:
+                return Response(
+                    {"detail": "Cursor inválido."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            messages = messages.filter(
+                Q(created_at__gt=anchor["created_at"])
+                | Q(created_at=anchor["created_at"], id__gt=anchor["id"])
+            )
+        messages = list(messages.order_by("created_at", "id"))
         serializer = OrderChatMessageSerializer(
             messages, many=True, context={"request": request}
         )
-        return Response({"messages": serializer.data})
+        cursor = str(messages[-1].id) if messages else (after or None)
+        return Response({"messages": serializer.data, "cursor": cursor})
 
     def post(self, request, transaction_id):
         order = self.get_order(transaction_id)
@@ -519,12 +556,7 @@ class OrderChatView(APIView):
         is_buyer = order.user_id == request.user.id
         if is_buyer:
             # El comprador envió el mensaje, notificar a los vendedores
-            vendor_ids = set(
-                OrderItem.objects.filter(order=order)
-                .values_list('product__vendor_id', flat=True)
-                .distinct()
-            )
-            recipients = list(User.objects.filter(id__in=vendor_ids))
+            recipients = order_vendor_ids(order.id)
         else:
             # Un vendedor envió el mensaje, notificar al comprador
             recipients = [order.user]
@@ -533,39 +565,23 @@ class OrderChatView(APIView):
         preview = text if text else ("📷 Imagen" if image else "🎤 Audio")
         preview_short = preview[:50] + "..." if len(preview) > 50 else preview
         
-        for recipient in recipients:
-            try:
-                # Guardar notificación en BD
-                Notification.objects.create(
-                    user=recipient,
-                    title=f"Mensaje de {request.user.full_name}",
-                    body=preview_short,
-                    data={
-                        "type": "order_chat",
-                        "transaction_id": str(order.transaction_id),
-                        "order_id": str(order.id),
-                        "message_id": str(message.id),
-                    },
-                )
-                
-                # Enviar push
-                send_push(
-                    title=f"💬 {request.user.full_name}",
-                    body=preview_short,
-                    data={
-                        "type": "order_chat",
-                        "transaction_id": str(order.transaction_id),
-                        "order_id": str(order.id),
-                        "message_id": str(message.id),
-                    },
-                    user=recipient,
-                )
-            except Exception as exc:
-                logger.warning(f"No se pudo notificar a {recipient.id}: {exc}")
+        notify_users(
+            recipients,
+            title=f"Mensaje de {request.user.full_name}",
+            body=preview_short,
+            push_title=f"💬 {request.user.full_name}",
+            data={
+                "type": "order_chat",
+                "transaction_id": str(order.transaction_id),
+                "order_id": str(order.id),
+                "message_id": str(message.id),
+            },
+        )
 
         serializer = OrderChatMessageSerializer(
             message, context={"request": request}
         )
+        publish_chat_message(order.id, serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -586,13 +602,7 @@ class MarkChatMessagesReadView(APIView):
 
         # Verificar acceso
         user = request.user
-        is_staff = user.is_staff or user.is_superuser
-        is_buyer = order.user_id == user.id
-        is_vendor = OrderItem.objects.filter(
-            order=order, product__vendor=user
-        ).exists()
-
-        if not any([is_staff, is_buyer, is_vendor]):
+        if not has_order_access(user, order):
             return Response(
                 {"detail": "No tienes permiso para ver este chat."},
                 status=status.HTTP_403_FORBIDDEN,
@@ -606,6 +616,8 @@ class MarkChatMessagesReadView(APIView):
             read=True,
             read_at=timezone.now(),
         )
+        discount_thread_unread(order.id, updated)
+        clear_chat_unread(order.id, user)
 
         return Response(
             {"success": f"{updated} mensajes marcados como leídos."},
@@ -668,34 +680,21 @@ class ConfirmDeliveryView(APIView):
         )
 
         # Notificar a los vendedores que el cliente confirmó la entrega
-        vendor_ids = set(
-            OrderItem.objects.filter(order=order)
-            .exclude(product__vendor=user)
-            .values_list('product__vendor_id', flat=True)
-        )
+        vendor_ids = order_vendor_ids(order.id, exclude=user)
         
-        for vendor_id in vendor_ids:
-            try:
-                send_push(
-                    user_id=vendor_id,
-                    title="✅ Cliente confirmó la entrega",
-                    body=f"¡Excelente! Tu pago será liberado el {release_date.strftime('%d/%m/%Y')}",
-                    data={
-                        "type": "order_confirmed",
-                        "transaction_id": str(order.transaction_id),
-                        "order_id": str(order.id),
-                        "release_date": release_date.isoformat(),
-                    }
-                )
-                
-                Notification.objects.create(
-                    user_id=vendor_id,
-                    title="Cliente confirmó la entrega",
-                    message=f"Tu pago será liberado el {release_date.strftime('%d de %B')}",
-                    type="order_confirmed",
-                )
-            except Exception as e:
-                logger.error(f"Error notificando al vendedor {vendor_id}: {e}")
+        notify_users(
+            vendor_ids,
+            title="Cliente confirmó la entrega",
+            body=f"Tu pago será liberado el {release_date.strftime('%d/%m/%Y')}",
+            push_title="✅ Cliente confirmó la entrega",
+            push_body=f"¡Excelente! Tu pago será liberado el {release_date.strftime('%d/%m/%Y')}",
+            data={
+                "type": "order_confirmed",
+                "transaction_id": str(order.transaction_id),
+                "order_id": str(order.id),
+                "release_date": release_date.isoformat(),
+            },
+        )
 
         return Response(
             {
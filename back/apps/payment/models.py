@@ -110,3 +110,35 @@ class VendorPayout(models.Model):
             if commit:
                 self.save(update_fields=["status", "updated_at"])
         return self
+
+
+class CheckoutIdempotencyKey(models.Model):
+    """
+    Respuesta de un checkout ya completado. La clave es la PaymentIntent de
+    Stripe (``pi:<id>``) o la que envía el cliente en ``Idempotency-Key``
+    (``client:<user_id>:<clave>``); un reintento con la misma clave recibe la
+    respuesta guardada en vez de crear otro pedido.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="checkout_keys",
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="idempotency_keys",
+    )
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,155 @@
+"""
+payment/stripe_client.py
+────────────────────────
+Única puerta hacia Stripe para las vistas de pago.
+
+  - ``StripeClient`` envuelve el SDK oficial (Customer, EphemeralKey y
+    PaymentIntent) con la API key de ``STRIPE_SECRET_KEY``.
+  - ``FakeStripe`` guarda las PaymentIntent en memoria: permite probar el
+    checkout completo sin red ni claves. Con ``STRIPE_FAKE`` (solo con
+    ``DEBUG`` o en pruebas) se usa también en desarrollo, y entonces las
+    PaymentIntent nacen ya cobradas.
+
+En pruebas::
+
+    fake = FakeStripe()
+    set_stripe(fake)
+    intent = fake.create_payment_intent(amount=500000, currency="cop")
+    fake.succeed(intent.id)
+"""
+
+import itertools
+import logging
+import threading
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import stripe
+    StripeError = stripe.error.StripeError
+except ImportError:  # pragma: no cover - entorno sin Stripe instalado
+    stripe = None
+
+    class StripeError(Exception):
+        """
+        Fallback para entornos donde la librería de Stripe no está instalada.
+        """
+
+        pass
+
+logger = logging.getLogger(__name__)
+
+
+class StripeClient:
+    """SDK de Stripe con la API key del proyecto."""
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+        if api_key:
+            stripe.api_key = api_key
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def create_customer(self, **params):
+        return stripe.Customer.create(**params)
+
+    def create_ephemeral_key(self, **params):
+        return stripe.EphemeralKey.create(**params)
+
+    def create_payment_intent(self, **params):
+        return stripe.PaymentIntent.create(**params)
+
+    def retrieve_payment_intent(self, intent_id: str):
+        return stripe.PaymentIntent.retrieve(intent_id)
+
+
+class FakeStripe:
+    """
+    Stripe en memoria. Registra cada llamada en ``calls`` para comprobar,
+    por ejemplo, que un reintento del checkout no vuelve a consultar Stripe.
+    """
+
+    configured = True
+
+    def __init__(self, auto_succeed: bool = False):
+        self.auto_succeed = auto_succeed
+        self.intents = {}
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}_fake_{next(self._ids)}"
+
+    def create_customer(self, **params):
+        self.calls.append(("customer.create", params))
+        return SimpleNamespace(id=self._next_id("cus"), **params)
+
+    def create_ephemeral_key(self, **params):
+        self.calls.append(("ephemeral_key.create", params))
+        return SimpleNamespace(id=self._next_id("ephkey"), secret=self._next_id("ek_secret"))
+
+    def create_payment_intent(self, **params):
+        self.calls.append(("payment_intent.create", params))
+        intent_id = self._next_id("pi")
+        intent = SimpleNamespace(
+            id=intent_id,
+            client_secret=f"{intent_id}_secret",
+            amount=params.get("amount"),
+            currency=params.get("currency"),
+            metadata=dict(params.get("metadata") or {}),
+            status="succeeded" if self.auto_succeed else "requires_payment_method",
+        )
+        self.intents[intent_id] = intent
+        return intent
+
+    def retrieve_payment_intent(self, intent_id: str):
+        self.calls.append(("payment_intent.retrieve", intent_id))
+        try:
+            return self.intents[intent_id]
+        except KeyError:
+            raise StripeError(f"No such payment_intent: '{intent_id}'")
+
+    def succeed(self, intent_id: str):
+        """Simula que el cliente confirmó el pago en la app."""
+        self.intents[intent_id].status = "succeeded"
+        return self.intents[intent_id]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def build_stripe():
+    if getattr(settings, "STRIPE_FAKE", False):
+        # core/settings.py ya lo rechaza fuera de DEBUG; se vuelve a comprobar
+        # por si la configuración se cambia en tiempo de ejecución
+        if not (settings.DEBUG or getattr(settings, "TESTING", False)):
+            raise ImproperlyConfigured("STRIPE_FAKE solo se permite con DEBUG activo o en pruebas.")
+        logger.warning("Usando FakeStripe: los pagos con tarjeta no son reales")
+        return FakeStripe(auto_succeed=True)
+    if stripe is None:
+        logger.warning("Stripe SDK no está instalado. Los pagos con tarjeta no estarán disponibles.")
+        return None
+    return StripeClient(api_key=getattr(settings, "STRIPE_SECRET_KEY", ""))
+
+
+def get_stripe():
+    """Cliente compartido por el proceso; ``None`` si no hay SDK de Stripe."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_stripe()
+    return _client
+
+
+def set_stripe(client=None):
+    """Reemplaza el cliente del proceso (pruebas); ``None`` lo reinicia."""
+    global _client
+    _client = client
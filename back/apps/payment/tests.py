@@ -1,3 +1,124 @@
+from unittest import mock
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.category.models import Category
+from apps.orders.models import Order
+from apps.payment import views as payment_views
+from apps.payment.models import CheckoutIdempotencyKey
+from apps.payment.stripe_client import FakeStripe, set_stripe
+from apps.product.models import Product
+from apps.user.models import UserAccount
+
+CHECKOUT_URL = "/api/payment/checkout/complete/"
+
+ADDRESS = {
+    "full_name": "Compradora Prueba",
+    "telephone_number": "3001234567",
+    "address_line_1": "Calle 1 # 2-3",
+    "city": "Bogotá",
+    "state_province_region": "Cundinamarca",
+}
+
+
+class CheckoutIdempotencyTests(TestCase):
+    """
+    Reintentos del checkout: misma PaymentIntent o misma ``Idempotency-Key``
+    devuelven el pedido ya creado sin cobrar, descontar stock ni consultar
+    Stripe otra vez.
+    """
+
+    def setUp(self):
+        self.stripe = FakeStripe()
+        set_stripe(self.stripe)
+        self.addCleanup(set_stripe, None)
+
+        self.vendor = UserAccount.objects.create_user(
+            email="vendedora@yuancity.com", password="x", first_name="Ven", last_name="Dedora"
+        )
+        self.buyer = UserAccount.objects.create_user(
+            email="compradora@yuancity.com", password="x", first_name="Com", last_name="Pradora"
+        )
+        category = Category.objects.create(name="Ropa")
+        self.product = Product.objects.create(
+            vendor=self.vendor, category=category, name="Camisa", price=10000, stock=5
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def add_to_cart(self, count=1):
+        response = self.client.post(
+            "/api/cart/add-item", {"product_id": str(self.product.id)}, format="json"
+        )
+        self.assertIn(response.status_code, (200, 201))
+        if count > 1:
+            self.client.put(
+                "/api/cart/update-item",
+                {"product_id": str(self.product.id), "count": count},
+                format="json",
+            )
+
+    def checkout(self, body, **headers):
+        return self.client.post(CHECKOUT_URL, {**ADDRESS, **body}, format="json", **headers)
+
+    def test_payment_intent_replay_returns_stored_order(self):
+        self.add_to_cart(2)
+        intent = self.stripe.create_payment_intent(
+            amount=2000000, currency="cop", metadata={"platform": "yuancity"}
+        )
+        self.stripe.succeed(intent.id)
+        body = {"payment_method": "card", "stripe_payment_intent_id": intent.id}
+
+        first = self.checkout(body)
+        self.assertEqual(first.status_code, 201, first.data)
+        stripe_calls = len(self.stripe.calls)
+
+        # El carrito vuelve a tener artículos: el reintento no debe comprarlos
+        self.add_to_cart()
+        replay = self.checkout(body)
+
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(len(self.stripe.calls), stripe_calls)
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_client_idempotency_key_creates_one_order(self):
+        self.add_to_cart()
+        first = self.checkout({"payment_method": "cash"}, HTTP_IDEMPOTENCY_KEY="pedido-1")
+        self.add_to_cart()
+        second = self.checkout({"payment_method": "cash"}, HTTP_IDEMPOTENCY_KEY="pedido-1")
+
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.data["order_id"], first.data["order_id"])
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+        self.assertEqual(CheckoutIdempotencyKey.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+    def test_insufficient_stock_rolls_back_idempotency_key(self):
+        self.add_to_cart(2)
+        decrement_stock = payment_views.decrement_stock
+
+        def sold_out_meanwhile(quantities):
+            # Otra compra se llevó las unidades tras la validación temprana
+            Product.objects.filter(pk=self.product.pk).update(stock=1)
+            return decrement_stock(quantities)
+
+        with mock.patch.object(payment_views, "decrement_stock", sold_out_meanwhile):
+            response = self.checkout({"payment_method": "cash"}, HTTP_IDEMPOTENCY_KEY="pedido-2")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CheckoutIdempotencyKey.objects.exists())
+        self.assertFalse(Order.objects.exists())
 
-# Create your tests here.
+        # La clave quedó libre: el reintento con stock suficiente crea el pedido
+        retry = self.checkout({"payment_method": "cash"}, HTTP_IDEMPOTENCY_KEY="pedido-2")
+        self.assertEqual(retry.status_code, 201, retry.data)
+        self.assertNotIn("Idempotent-Replayed", retry)
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
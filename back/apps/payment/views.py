@@ -1,35 +1,28 @@
-try:
-    import stripe
-    StripeError = stripe.error.StripeError
-except ImportError:  # pragma: no cover - entorno sin Stripe instalado
-    stripe = None
-
-    class StripeError(Exception):
-        """
-        Fallback para entornos donde la librería de Stripe no está instalada.
-        """
-
-        pass
-
 from collections import defaultdict
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from django.conf import settings
+from django.core import signing
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.cart.models import Cart, CartItem
-from apps.coupons.models import FixedPriceCoupon, PercentageCoupon
-from apps.orders.models import Order, OrderItem, OrderChatMessage, Countries
+from apps.cart.utils import active_cart_items, bump_cart, release as release_reservations
+from apps.coupons.utils import apply_coupon
+from apps.orders.models import Order, OrderItem, OrderChatMessage, OrderChatThread, Countries
+from apps.orders.utils import add_order_participants
 from apps.category.models import Category
 from apps.product.models import Product
 from apps.product.serializers import ProductSerializer
+from apps.product.utils.stock import InsufficientStock, decrement_stock
 from apps.reviews.models import Review
-from apps.user.utils.push import send_push
+from apps.user.utils.outbox import enqueue_email, notify_users
 from apps.user.utils.jwt import build_tokens
 from apps.user.utils.password import strong_random_password
-from apps.user.models import Notification, UserAccount as User
-from apps.payment.models import VendorPayout, VendorBankAccount
+from apps.user.models import UserAccount as User
+from apps.payment.models import CheckoutIdempotencyKey, VendorPayout, VendorBankAccount
+from apps.payment.stripe_client import StripeError, get_stripe
+from apps.utils.pagination import KeysetPagination, cursor_requested
 from apps.payment.serializers import (
     VendorBankAccountSerializer,
     VendorPayoutSerializer,
@@ -44,10 +37,10 @@ from apps.payment.utils import (
     summarize_amount,
 )
 
-from django.core.mail import send_mail
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q, Sum
 from django.db.models.functions import TruncMonth
+import hashlib
 import uuid
 import logging
 from django.utils import timezone
@@ -56,13 +49,8 @@ from django.shortcuts import get_object_or_404
 logger = logging.getLogger(__name__)
 
 # Validar que la clave de Stripe esté configurada
-if not settings.STRIPE_SECRET_KEY:
+if not settings.STRIPE_SECRET_KEY and not getattr(settings, "STRIPE_FAKE", False):
     logger.critical("STRIPE_SECRET_KEY no está configurada en las variables de entorno")
-elif stripe is None:
-    logger.warning("Stripe SDK no está instalado. Los pagos con tarjeta no estarán disponibles.")
-else:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    logger.info("Stripe API key configurada correctamente")
 
 CURRENCY = "COP"
 BUYER_TAX_RATE = Decimal("0.15")
@@ -158,30 +146,6 @@ def _calculate_subtotals(cart_items, include_breakdown=False):
     return original, discounted
 
 
-def _apply_coupon(total: Decimal, coupon_name: str):
-    applied = ""
-    normalized = coupon_name.strip() if coupon_name else ""
-
-    if normalized:
-        if FixedPriceCoupon.objects.filter(name__iexact=normalized).exists():
-            coupon = FixedPriceCoupon.objects.get(name__iexact=normalized)
-            discount_amount = Decimal(coupon.discount_price)
-            if discount_amount < total:
-                total -= discount_amount
-                applied = coupon.name
-        elif PercentageCoupon.objects.filter(name__iexact=normalized).exists():
-            coupon = PercentageCoupon.objects.get(name__iexact=normalized)
-            percentage = Decimal(coupon.discount_percentage)
-            if Decimal("1") < percentage < Decimal("100"):
-                total -= total * (percentage / Decimal("100"))
-                applied = coupon.name
-
-    if total < Decimal("0.00"):
-        total = Decimal("0.00")
-
-    return total, applied
-
-
 def _resolve_shipping_address(user, data):
     profile = getattr(user, "social_profile", None)
 
@@ -235,12 +199,180 @@ def _resolve_shipping_address(user, data):
     }
 
 
+class DuplicateCheckout(Exception):
+    """Otra petición con la misma clave de idempotencia creó el pedido."""
+
+
+def _checkout_idempotency_key(request, user, payment_method, payment_intent_id):
+    """
+    Clave del checkout: la PaymentIntent en pagos con tarjeta (un cobro, un
+    pedido) o la cabecera ``Idempotency-Key`` / ``idempotency_key`` del cliente.
+    """
+    if payment_method == "card" and payment_intent_id:
+        return f"pi:{payment_intent_id}"[:255]
+    client_key = str(
+        request.headers.get("Idempotency-Key") or request.data.get("idempotency_key") or ""
+    ).strip()
+    if client_key:
+        return f"client:{user.id}:{client_key}"[:255]
+    return None
+
+
+def _replay_checkout(key, user):
+    """Respuesta guardada para ``key`` o ``None`` si aún no se usó."""
+    record = (
+        CheckoutIdempotencyKey.objects.filter(key=key)
+        .only("user_id", "response_status", "response_body")
+        .first()
+    )
+    if record is None:
+        return None
+    if record.user_id != user.id:
+        return Response(
+            {"error": "Este pago ya fue usado en otro pedido"},
+            status=status.HTTP_409_CONFLICT,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
 def _get_cart_with_items(user):
     cart, _ = Cart.objects.get_or_create(user=user)
-    cart_items = CartItem.objects.filter(cart=cart).select_related("product")
+    cart_items = active_cart_items(cart).select_related("product__vendor")
     return cart, cart_items
 
 
+# ─────────────────────────────────────────────────────────────
+#  Cotización del checkout
+# ─────────────────────────────────────────────────────────────
+# El resumen calcula los montos una vez y los firma con una huella del
+# carrito; payment-sheet, stripe-intent y complete verifican la firma en
+# lugar de recargar el carrito y volver a resolver el cupón.
+
+QUOTE_SALT = "payment.checkout.quote"
+QUOTE_AMOUNTS = (
+    "original_total",
+    "discounted_subtotal",
+    "total_after_coupon",
+    "estimated_tax",
+    "final_total",
+    "savings",
+)
+
+
+class QuoteError(Exception):
+    """Cotización inválida, vencida o de un carrito que ya cambió."""
+
+
+def _lines_fingerprint(price_breakdown, coupon: str) -> str:
+    """Huella de las líneas (producto, unidades, precio final) y el cupón."""
+    digest = hashlib.sha256()
+    for entry in sorted(price_breakdown, key=lambda entry: str(entry["cart_item"].product_id)):
+        digest.update(
+            f'{entry["cart_item"].product_id}:{entry["count"]}:{entry["final_unit_price"]};'.encode()
+        )
+    digest.update(coupon.encode())
+    return digest.hexdigest()[:32]
+
+
+def _quote_amounts(original_total, discounted_subtotal, coupon_name):
+    total_after_coupon, applied_coupon = apply_coupon(discounted_subtotal, coupon_name)
+    estimated_tax = _quantize(total_after_coupon * BUYER_TAX_RATE)
+    return {
+        "original_total": original_total,
+        "discounted_subtotal": discounted_subtotal,
+        "total_after_coupon": total_after_coupon,
+        "estimated_tax": estimated_tax,
+        "final_total": _quantize(total_after_coupon + estimated_tax + DELIVERY_PRICE),
+        "savings": max(original_total - discounted_subtotal, Decimal("0.00")),
+        "coupon": applied_coupon,
+    }
+
+
+def _build_quote(user, coupon_name: str = "") -> dict:
+    """
+    Carga el carrito (una consulta con productos), valida stock y calcula
+    los montos. Lanza ``QuoteError`` con el mensaje para el cliente.
+    """
+    cart, cart_items = _get_cart_with_items(user)
+    cart_items = list(cart_items)
+    if not cart_items:
+        raise QuoteError("Necesitas tener artículos en el carrito")
+    for cart_item in cart_items:
+        if int(cart_item.count) > int(cart_item.product.stock):
+            raise QuoteError(f"No hay suficiente stock para {cart_item.product.name}")
+
+    original_total, discounted_subtotal, breakdown = _calculate_subtotals(
+        cart_items, include_breakdown=True
+    )
+    quote = _quote_amounts(original_total, discounted_subtotal, coupon_name)
+    quote.update({
+        "cart": cart,
+        "cart_version": cart.version,
+        "breakdown": breakdown,
+        "fingerprint": _lines_fingerprint(breakdown, quote["coupon"]),
+    })
+    return quote
+
+
+def _sign_quote(user, quote: dict) -> str:
+    payload = {key: str(quote[key]) for key in QUOTE_AMOUNTS}
+    payload.update({
+        "user": str(user.id),
+        "cart": str(quote["cart"].id),
+        "version": quote["cart_version"],
+        "fingerprint": quote["fingerprint"],
+        "coupon": quote["coupon"],
+    })
+    return signing.dumps(payload, salt=QUOTE_SALT, compress=True)
+
+
+def _load_quote(token: str, user, cart_version: int = None) -> dict:
+    """
+    Verifica firma, usuario, caducidad (``CHECKOUT_QUOTE_TTL``) y versión del
+    carrito. Sin ``cart_version`` la consulta (una fila por clave primaria).
+    """
+    try:
+        payload = signing.loads(
+            token,
+            salt=QUOTE_SALT,
+            max_age=getattr(settings, "CHECKOUT_QUOTE_TTL", 900),
+        )
+    except signing.SignatureExpired:
+        raise QuoteError("La cotización venció; vuelve a revisar tu carrito")
+    except signing.BadSignature:
+        raise QuoteError("Cotización inválida")
+    if payload.get("user") != str(user.id):
+        raise QuoteError("Cotización inválida")
+    if cart_version is None:
+        cart_version = (
+            Cart.objects.filter(pk=payload["cart"], user=user)
+            .values_list("version", flat=True)
+            .first()
+        )
+    if cart_version != payload["version"]:
+        raise QuoteError("Tu carrito cambió; vuelve a revisar el total")
+    quote = {key: Decimal(payload[key]) for key in QUOTE_AMOUNTS}
+    quote.update({
+        "cart_version": payload["version"],
+        "fingerprint": payload["fingerprint"],
+        "coupon": payload["coupon"],
+    })
+    return quote
+
+
+def _quote_summary(quote: dict, currency: str = CURRENCY) -> dict:
+    return {
+        "currency": currency,
+        "discounted_subtotal": _format_money(quote["discounted_subtotal"]),
+        "total_amount": _format_money(quote["final_total"]),
+        "estimated_tax": _format_money(quote["estimated_tax"]),
+        "savings_from_discounts": _format_money(quote["savings"]),
+        "coupon_name": quote["coupon"],
+    }
+
+
 def _is_admin_user(user):
     # Check if user email is in the allowed list from settings
     if user.email and user.email.strip().lower() in settings.WEB_ALLOWED_EMAILS:
@@ -253,6 +385,21 @@ def _is_admin_user(user):
     )
 
 
+def _admin_listing(request, queryset, limit_value, key_field):
+    """
+    Primeros ``limit_value`` registros, o una página por cursor sobre
+    ``(key_field, id)`` si el cliente envía ``?cursor=``.
+    Retorna (filas, next_cursor).
+    """
+    if not cursor_requested(request):
+        return queryset[:limit_value], None
+    paginator = KeysetPagination(
+        page_size=limit_value, max_page_size=500, ordering=(key_field, "id")
+    )
+    rows = paginator.paginate_queryset(queryset, request)
+    return rows, paginator.get_next_cursor()
+
+
 def _month_start(value):
     return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
@@ -267,7 +414,8 @@ def _add_months(value, months):
 class CheckoutSummaryView(APIView):
     """
     GET /api/payment/checkout/summary/?coupon=<nombre>
-    Devuelve totales, impuestos, ahorros (sin crear orden aún).
+    Devuelve totales, impuestos, ahorros (sin crear orden aún) y la
+    cotización firmada ``quote`` que usan los pasos siguientes.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -276,50 +424,19 @@ class CheckoutSummaryView(APIView):
         coupon_name = str(request.query_params.get("coupon", "")).strip()
 
         try:
-            cart, cart_items = _get_cart_with_items(user)
-
-            if not cart_items.exists():
-                return Response(
-                    {"error": "Necesitas tener artículos en el carrito"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            for cart_item in cart_items:
-                product = cart_item.product
-                if not Product.objects.filter(id=product.id).exists():
-                    return Response(
-                        {"error": "Un producto del carrito ya no está disponible"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                if int(cart_item.count) > int(getattr(product, "stock", 0)):
-                    return Response(
-                        {"error": f"No hay suficiente stock para {product.name}"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-            original_total, discounted_subtotal = _calculate_subtotals(cart_items)
-            total_after_coupon, applied_coupon = _apply_coupon(
-                discounted_subtotal, coupon_name
-            )
-
-            estimated_tax = _quantize(total_after_coupon * BUYER_TAX_RATE)
-            total_amount = _quantize(total_after_coupon + estimated_tax + DELIVERY_PRICE)
-            savings_from_discounts = original_total - discounted_subtotal
-            if savings_from_discounts < Decimal("0.00"):
-                savings_from_discounts = Decimal("0.00")
-
+            quote = _build_quote(user, coupon_name)
             return Response(
                 {
-                    "currency": CURRENCY,
-                    "discounted_subtotal": _format_money(discounted_subtotal),
-                    "total_amount": _format_money(total_amount),
-                    "estimated_tax": _format_money(estimated_tax),
-                    "savings_from_discounts": _format_money(savings_from_discounts),
-                    "coupon_name": applied_coupon,
+                    **_quote_summary(quote),
+                    # Se envía tal cual a payment-sheet, stripe-intent y complete
+                    "quote": _sign_quote(user, quote),
+                    "quote_expires_in": getattr(settings, "CHECKOUT_QUOTE_TTL", 900),
                 },
                 status=status.HTTP_200_OK,
             )
 
+        except QuoteError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except InvalidOperation:
             return Response(
                 {"error": "Error al calcular los totales"}, 
@@ -336,24 +453,25 @@ class CheckoutSummaryView(APIView):
 class PaymentSheetView(APIView):
     """
     POST /api/payment/checkout/payment-sheet/
-    Body: { amount, checkout }
+    Body: { quote, checkout } (o { amount, checkout } sin cotización)
     Crea un Payment Intent en Stripe para usar con Payment Sheet nativo.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        # Validar que Stripe esté configurado
-        if not settings.STRIPE_SECRET_KEY:
-            logger.error("STRIPE_SECRET_KEY no configurada")
+        stripe_client = get_stripe()
+        if stripe_client is None:
+            logger.error("Stripe SDK no disponible en el entorno actual")
             return Response(
-                {"error": "Stripe no está configurado correctamente en el servidor"},
+                {"error": "Stripe no está disponible en este entorno"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        if stripe is None:
-            logger.error("Stripe SDK no disponible en el entorno actual")
+        # Validar que Stripe esté configurado
+        if not stripe_client.configured:
+            logger.error("STRIPE_SECRET_KEY no configurada")
             return Response(
-                {"error": "Stripe no está disponible en este entorno"},
+                {"error": "Stripe no está configurado correctamente en el servidor"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
         
@@ -363,6 +481,22 @@ class PaymentSheetView(APIView):
 
         amount = data.get("amount")
         checkout = data.get("checkout", {})
+        coupon_name = checkout.get("coupon_name", "")
+        quote_fingerprint = ""
+
+        # Con cotización firmada el monto sale de ella, no del cliente
+        quote_token = data.get("quote")
+        if quote_token:
+            try:
+                quote = _load_quote(quote_token, user)
+            except QuoteError as exc:
+                return Response(
+                    {"error": str(exc), "quote_expired": True},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            amount = quote["final_total"]
+            coupon_name = quote["coupon"]
+            quote_fingerprint = quote["fingerprint"]
 
         # Validar monto
         try:
@@ -402,7 +536,7 @@ class PaymentSheetView(APIView):
 
         try:
             # Crear customer en Stripe
-            customer = stripe.Customer.create(
+            customer = stripe_client.create_customer(
                 name=full_name,
                 phone=telephone,
                 address={
@@ -416,19 +550,19 @@ class PaymentSheetView(APIView):
                 metadata={
                     **metadata_base,
                     "user_id": str(user.id),
-                    "coupon": checkout.get("coupon_name", ""),
+                    "coupon": coupon_name,
                     "notes": checkout.get("pickup_notes", ""),
                 },
             )
 
             # Crear Ephemeral Key
-            ephemeral_key = stripe.EphemeralKey.create(
+            ephemeral_key = stripe_client.create_ephemeral_key(
                 customer=customer.id,
                 stripe_version="2025-11-17.clover",
             )
 
             # Crear Payment Intent
-            payment_intent = stripe.PaymentIntent.create(
+            payment_intent = stripe_client.create_payment_intent(
                 amount=amount_in_cents,
                 currency="cop",
                 customer=customer.id,
@@ -437,6 +571,7 @@ class PaymentSheetView(APIView):
                     **metadata_base,
                     "user_id": str(user.id),
                     "checkout_data": str(checkout),
+                    "quote": quote_fingerprint,
                 },
                 description=f"Pedido Yuan City - {full_name}",
             )
@@ -462,7 +597,7 @@ class PaymentSheetView(APIView):
 class StripeIntentView(APIView):
     """
     POST /api/payment/checkout/stripe-intent/
-    Body: { amount, currency, items, coupon_name, checkout }
+    Body: { quote, currency, items, checkout } (o amount y coupon_name sin cotización)
     Crea una PaymentIntent en Stripe y retorna client_secret.
     """
     permission_classes = [permissions.IsAuthenticated]
@@ -472,7 +607,8 @@ class StripeIntentView(APIView):
         payload = request.data
         metadata_base = _stripe_metadata_base()
 
-        if stripe is None:
+        stripe_client = get_stripe()
+        if stripe_client is None:
             logger.error("Stripe SDK no disponible en el entorno actual")
             return Response(
                 {"error": "Stripe no está disponible en este entorno"},
@@ -514,56 +650,25 @@ class StripeIntentView(APIView):
         except ValueError as exc:
             return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if amount <= 0:
+        quote_token = payload.get("quote")
+        if not quote_token and amount <= 0:
             return Response({"detail": "Monto inválido"}, status=400)
 
-        # Recalcular el total en el backend usando items del carrito
+        # El total sale de la cotización firmada del resumen; sin ella se
+        # calcula en el backend con los ítems del carrito
         try:
-            cart, cart_items = _get_cart_with_items(user)
-            if not cart_items.exists():
-                return Response(
-                    {"error": "Carrito vacío"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            for cart_item in cart_items:
-                product = cart_item.product
-                if not Product.objects.filter(id=product.id).exists():
-                    return Response(
-                        {"error": "Un producto del carrito ya no está disponible"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                if int(cart_item.count) > int(getattr(product, "stock", 0)):
-                    return Response(
-                        {"error": f"No hay suficiente stock para {product.name}"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-            original_total, discounted_subtotal = _calculate_subtotals(cart_items)
-            total_after_coupon, applied_coupon = _apply_coupon(
-                discounted_subtotal, coupon_name
-            )
-            
-            estimated_tax = _quantize(total_after_coupon * BUYER_TAX_RATE)
-            final_total = _quantize(total_after_coupon + estimated_tax + DELIVERY_PRICE)
-            savings_from_discounts = original_total - discounted_subtotal
-            if savings_from_discounts < Decimal("0.00"):
-                savings_from_discounts = Decimal("0.00")
-            
-            # Para COP: Stripe maneja centavos internamente
-            # Multiplicar por 100 para todas las monedas (Stripe divide internamente)
-            if currency == 'cop':
-                amount_in_minor = int(final_total * 100)
+            if quote_token:
+                quote = _load_quote(quote_token, user)
             else:
-                amount_in_minor = int(final_total * 100)
-            
-            # Validar monto mínimo de Stripe para COP (2000 pesos = 200000 centavos)
-            if currency == 'cop' and amount_in_minor < 200000:
+                quote = _build_quote(user, coupon_name)
+                quote_token = _sign_quote(user, quote)
+        except QuoteError as exc:
+            if payload.get("quote"):
                 return Response(
-                    {"error": "El monto mínimo es de $2,000 COP"},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"error": str(exc), "quote_expired": True},
+                    status=status.HTTP_409_CONFLICT,
                 )
-
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error recalculando total: {e}")
             return Response(
@@ -571,15 +676,27 @@ class StripeIntentView(APIView):
                 status=400
             )
 
+        # Para COP: Stripe maneja centavos internamente
+        # Multiplicar por 100 para todas las monedas (Stripe divide internamente)
+        amount_in_minor = int(quote["final_total"] * 100)
+
+        # Validar monto mínimo de Stripe para COP (2000 pesos = 200000 centavos)
+        if currency == 'cop' and amount_in_minor < 200000:
+            return Response(
+                {"error": "El monto mínimo es de $2,000 COP"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = stripe_client.create_payment_intent(
                 amount=amount_in_minor,
                 currency=currency,
                 automatic_payment_methods={"enabled": True},
                 metadata={
                     **metadata_base,
                     "user_id": str(user.id),
-                    "coupon": applied_coupon or "",
+                    "coupon": quote["coupon"] or "",
+                    "quote": quote["fingerprint"],
                     "items": ",".join([str(i.get("product_id")) for i in items]),
                     "full_name": full_name,
                     "phone": telephone_number,
@@ -596,20 +713,14 @@ class StripeIntentView(APIView):
             logger.error(f"Stripe error: {exc}")
             return Response({"detail": str(exc)}, status=400)
 
-        summary_payload = {
-            "currency": (raw_currency or CURRENCY).upper(),
-            "discounted_subtotal": _format_money(discounted_subtotal),
-            "total_amount": _format_money(final_total),
-            "estimated_tax": _format_money(estimated_tax),
-            "savings_from_discounts": _format_money(savings_from_discounts),
-            "coupon_name": applied_coupon,
-        }
+        summary_payload = _quote_summary(quote, (raw_currency or CURRENCY).upper())
 
         return Response(
             {
                 "client_secret": intent.client_secret,
                 "payment_intent_id": intent.id,
                 "summary": summary_payload,
+                "quote": quote_token,
             },
             status=status.HTTP_200_OK,
             )
@@ -620,8 +731,11 @@ class CheckoutCompleteView(APIView):
     POST /api/payment/checkout/complete/
     Body: { payment_method, stripe_payment_intent_id, full_name, telephone_number,
             address_line_1, city, state_province_region, postal_zip_code, 
-            country_region, coupon_name, pickup_notes }
-    Valida la PaymentIntent en Stripe y crea la orden.
+            country_region, coupon_name, pickup_notes, quote, idempotency_key }
+    Valida la PaymentIntent en Stripe y crea la orden con los montos de la
+    cotización ``quote`` si sigue vigente. Es idempotente por
+    PaymentIntent (o por la cabecera ``Idempotency-Key``): repetir la petición
+    devuelve la misma orden con la cabecera ``Idempotent-Replayed``.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -641,15 +755,26 @@ class CheckoutCompleteView(APIView):
                 status=400
             )
 
+        # Un reintento (timeout, red móvil) devuelve el pedido ya creado sin
+        # volver a consultar Stripe ni tocar el stock
+        idempotency_key = _checkout_idempotency_key(
+            request, user, payment_method, stripe_payment_intent_id
+        )
+        if idempotency_key:
+            replay = _replay_checkout(idempotency_key, user)
+            if replay is not None:
+                return replay
+
         # Validar PaymentIntent en Stripe
         if payment_method == "card":
-            if stripe is None:
+            stripe_client = get_stripe()
+            if stripe_client is None:
                 return Response(
                     {"error": "Stripe no está disponible en este entorno"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
             try:
-                intent = stripe.PaymentIntent.retrieve(stripe_payment_intent_id)
+                intent = stripe_client.retrieve_payment_intent(stripe_payment_intent_id)
                 if intent.status != "succeeded":
                     return Response(
                         {"error": "El pago no ha sido completado en Stripe"}, 
@@ -683,20 +808,18 @@ class CheckoutCompleteView(APIView):
             )
 
         cart, cart_items = _get_cart_with_items(user)
+        cart_items = list(cart_items)
 
-        if not cart_items.exists():
+        if not cart_items:
             return Response(
                 {"error": "Necesitas tener artículos en el carrito"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Validación temprana con los datos ya cargados; la definitiva es el
+        # UPDATE condicional de decrement_stock dentro de la transacción.
         for cart_item in cart_items:
             product = cart_item.product
-            if not Product.objects.filter(id=product.id).exists():
-                return Response(
-                    {"error": "Un producto del carrito ya no está disponible"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
             available_stock = int(getattr(product, "stock", 0))
             if cart_item.count > available_stock:
                 return Response(
@@ -704,18 +827,26 @@ class CheckoutCompleteView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-        cart_items = list(cart_items)
-
         original_total, discounted_subtotal, price_breakdown = _calculate_subtotals(
             cart_items, include_breakdown=True
         )
-        total_after_coupon, applied_coupon = _apply_coupon(
-            discounted_subtotal, coupon_name
-        )
+
+        # Si la cotización sigue vigente y describe exactamente estas líneas
+        # se usan sus montos; si no (el pago ya pudo cobrarse), se recalcula.
+        quote = None
+        if data.get("quote"):
+            try:
+                quote = _load_quote(data["quote"], user, cart_version=cart.version)
+                if quote["fingerprint"] != _lines_fingerprint(price_breakdown, quote["coupon"]):
+                    raise QuoteError("Las líneas del carrito no coinciden con la cotización")
+            except QuoteError as exc:
+                logger.info("Checkout sin cotización válida (%s); se recalcula", exc)
+                quote = None
 
         try:
-            estimated_tax = _quantize(total_after_coupon * BUYER_TAX_RATE)
-            final_total = _quantize(total_after_coupon + estimated_tax + DELIVERY_PRICE)
+            if quote is None:
+                quote = _quote_amounts(original_total, discounted_subtotal, coupon_name)
+            final_total = quote["final_total"]
         except InvalidOperation:
             return Response(
                 {"error": "Error al calcular el total del pago"},
@@ -751,6 +882,26 @@ class CheckoutCompleteView(APIView):
                     shipping_time=DELIVERY_TIME,
                     shipping_price=DELIVERY_PRICE,
                 )
+                response_body = {
+                    "order_id": str(order_instance.id),
+                    "status": "confirmed",
+                    "transaction_id": str(order_instance.transaction_id),
+                    "amount": _format_money(final_total),
+                }
+                if idempotency_key:
+                    # Antes de tocar el stock: una petición duplicada en paralelo
+                    # espera aquí al índice único y luego recibe la respuesta guardada
+                    try:
+                        with transaction.atomic():
+                            CheckoutIdempotencyKey.objects.create(
+                                key=idempotency_key,
+                                user=user,
+                                order=order_instance,
+                                response_status=status.HTTP_201_CREATED,
+                                response_body=response_body,
+                            )
+                    except IntegrityError:
+                        raise DuplicateCheckout(idempotency_key)
 
                 vendor_totals = defaultdict(
                     lambda: {
@@ -761,6 +912,15 @@ class CheckoutCompleteView(APIView):
                     }
                 )
 
+                # Todas las líneas en un solo UPDATE condicional: si alguna ya
+                # no tiene stock se deshace el pedido completo.
+                decrement_stock(
+                    {entry["cart_item"].product_id: entry["count"] for entry in price_breakdown}
+                )
+
+                # bulk_create no emite post_save; no afecta al ranking de ventas
+                # porque el pedido nace como not_processed.
+                order_items = []
                 for entry in price_breakdown:
                     cart_item = entry["cart_item"]
                     product = cart_item.product
@@ -770,19 +930,16 @@ class CheckoutCompleteView(APIView):
                     platform_fee = _quantize(line_total * SELLER_FEE_RATE)
                     vendor_net = _quantize(line_total - platform_fee)
 
-                    new_stock = max(int(product.stock) - int(count), 0)
-                    Product.objects.filter(id=product.id).update(
-                        stock=new_stock, is_available=new_stock > 0
-                    )
-
-                    OrderItem.objects.create(
-                        product=product,
-                        order=order_instance,
-                        name=product.name,
-                        price=final_unit_price,
-                        count=count,
-                        platform_fee=platform_fee,
-                        vendor_earnings=vendor_net,
+                    order_items.append(
+                        OrderItem(
+                            product=product,
+                            order=order_instance,
+                            name=product.name,
+                            price=final_unit_price,
+                            count=count,
+                            platform_fee=platform_fee,
+                            vendor_earnings=vendor_net,
+                        )
                     )
 
                     if product.vendor_id:
@@ -792,9 +949,12 @@ class CheckoutCompleteView(APIView):
                         vendor_data["net"] += vendor_net
                         vendor_data["items"] += count
 
-                if vendor_totals:
-                    for vendor_id, totals in vendor_totals.items():
-                        VendorPayout.objects.create(
+                OrderItem.objects.bulk_create(order_items)
+                # El comprador queda registrado al crear el pedido
+                add_order_participants(order_instance.pk, vendor_ids=vendor_totals.keys())
+                VendorPayout.objects.bulk_create(
+                    [
+                        VendorPayout(
                             vendor_id=vendor_id,
                             order=order_instance,
                             gross_amount=_quantize(totals["gross"]),
@@ -802,70 +962,62 @@ class CheckoutCompleteView(APIView):
                             net_amount=_quantize(totals["net"]),
                             items_count=totals["items"],
                         )
+                        for vendor_id, totals in vendor_totals.items()
+                    ]
+                )
 
                 CartItem.objects.filter(cart=cart).delete()
-                Cart.objects.filter(pk=cart.pk).update(total_items=0)
-
-                # Notificar al comprador
-                try:
-                    Notification.objects.create(
-                        user=user,
-                        title="¡Pedido confirmado! 🎉",
-                        body=f"Tu pedido #{order_instance.transaction_id} ha sido recibido y está siendo procesado.",
-                        data={
-                            "type": "order_created",
-                            "order_id": str(order_instance.id),
-                            "transaction_id": str(order_instance.transaction_id),
-                            "amount": str(final_total),
-                        },
-                    )
-                    send_push(
-                        title="¡Pedido confirmado! 🎉",
-                        body=f"Tu pedido ha sido recibido. Total: ${final_total:,.0f}",
+                release_reservations(cart)
+                bump_cart(cart, reset=True)
+
+                # Notificaciones y correo viajan en el outbox: se envían solo
+                # si el pedido se confirma, y nunca retrasan la respuesta
+                notify_users(
+                    [user],
+                    title="¡Pedido confirmado! 🎉",
+                    body=f"Tu pedido #{order_instance.transaction_id} ha sido recibido y está siendo procesado.",
+                    push_body=f"Tu pedido ha sido recibido. Total: ${final_total:,.0f}",
+                    data={
+                        "type": "order_created",
+                        "order_id": str(order_instance.id),
+                        "transaction_id": str(order_instance.transaction_id),
+                        "amount": str(final_total),
+                    },
+                )
+                for vendor_id, totals in vendor_totals.items():
+                    notify_users(
+                        [vendor_id],
+                        title="¡Nueva venta! 🛍️",
+                        body=(
+                            f"Tienes {totals['items']} producto(s) vendido(s). "
+                            "Contacta a la compradora para coordinar la entrega mientras activamos los envíos desde la app."
+                        ),
+                        push_body="Escríbele a la compradora para coordinar la entrega o envío.",
                         data={
-                            "type": "order_created",
+                            "type": "new_sale",
                             "order_id": str(order_instance.id),
-                            "transaction_id": str(order_instance.transaction_id),
+                            "items_count": totals["items"],
                         },
-                        user=user,
                     )
-                except Exception as e:
-                    logger.warning(f"Error enviando notificación al comprador: {e}")
-
-                # Notificar a vendedores
-                vendors_notified = set()
-                for cart_item in cart_items:
-                    vendor = cart_item.product.vendor
-                    if vendor and vendor.id not in vendors_notified:
-                        vendors_notified.add(vendor.id)
-                        try:
-                            items_count = vendor_totals.get(vendor.id, {}).get("items", 0)
-                            
-                            Notification.objects.create(
-                                user=vendor,
-                                title="¡Nueva venta! 🛍️",
-                                body=(
-                                    f"Tienes {items_count} producto(s) vendido(s). "
-                                    "Contacta a la compradora para coordinar la entrega mientras activamos los envíos desde la app."
-                                ),
-                                data={
-                                    "type": "new_sale",
-                                    "order_id": str(order_instance.id),
-                                    "items_count": items_count,
-                                },
-                            )
-                            send_push(
-                                title="¡Nueva venta! 🛍️",
-                                body="Escríbele a la compradora para coordinar la entrega o envío.",
-                                data={
-                                    "type": "new_sale",
-                                    "order_id": str(order_instance.id),
-                                },
-                                user=vendor,
-                            )
-                        except Exception as e:
-                            logger.warning(f"Error notificando al vendedor {vendor.id}: {e}")
+                enqueue_email(
+                    "Detalles de tu Orden",
+                    f"Hola {full_name},\n\n¡Hemos recibido tu orden!\n\n"
+                    f"Te avisaremos cuando salga a entrega hacia tu dirección.\n\n"
+                    f"Puedes revisar el estado desde tu cuenta.\n\nEquipo YuanCity",
+                    "no-reply@yuancity.com",
+                    [user.email],
+                )
 
+        except InsufficientStock as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except DuplicateCheckout:
+            replay = _replay_checkout(idempotency_key, user)
+            if replay is not None:
+                return replay
+            return Response(
+                {"error": "Este pedido ya se está procesando"},
+                status=status.HTTP_409_CONFLICT,
+            )
         except Exception as exc:
             logger.error(f"Error processing payment: {exc}")
             return Response(
@@ -873,29 +1025,7 @@ class CheckoutCompleteView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Enviar email
-        try:
-            send_mail(
-                "Detalles de tu Orden",
-                f"Hola {full_name},\n\n¡Hemos recibido tu orden!\n\n"
-                f"Te avisaremos cuando salga a entrega hacia tu dirección.\n\n"
-                f"Puedes revisar el estado desde tu cuenta.\n\nEquipo YuanCity",
-                "no-reply@yuancity.com",
-                [user.email],
-                fail_silently=True,
-            )
-        except Exception as exc:
-            logger.warning(f"Email send error: {exc}")
-
-        return Response(
-            {
-                "order_id": str(order_instance.id),
-                "status": "confirmed",
-                "transaction_id": str(order_instance.transaction_id),
-                "amount": _format_money(final_total),
-            },
-            status=status.HTTP_201_CREATED,
-        )
+        return Response(response_body, status=status.HTTP_201_CREATED)
 
 
 class VendorBankAccountView(APIView):
@@ -1088,10 +1218,11 @@ class AdminDashboardSummaryView(APIView):
         products_total = Product.objects.count()
         products_available = Product.objects.filter(is_available=True).count()
 
-        support_unread = OrderChatMessage.objects.filter(read=False).count()
-        support_threads = (
-            OrderChatMessage.objects.values("order_id").distinct().count()
+        # Una fila por hilo con sus totales, en lugar de recorrer los mensajes
+        support_unread = (
+            OrderChatThread.objects.aggregate(total=Sum("unread_count"))["total"] or 0
         )
+        support_threads = OrderChatThread.objects.count()
 
         waiting_qs = VendorPayout.objects.filter(
             status=VendorPayout.Status.waiting_confirmation
@@ -1222,8 +1353,9 @@ class AdminDashboardOrdersView(APIView):
         queryset = (
             Order.objects.select_related("user")
             .annotate(items_count=Count("orderitem"))
-            .order_by("-date_issued")[:limit_value]
+            .order_by("-date_issued")
         )
+        queryset, next_cursor = _admin_listing(request, queryset, limit_value, "date_issued")
 
         orders = []
         for order in queryset:
@@ -1243,7 +1375,10 @@ class AdminDashboardOrdersView(APIView):
                 }
             )
 
-        return Response({"orders": orders}, status=status.HTTP_200_OK)
+        payload = {"orders": orders}
+        if cursor_requested(request):
+            payload["next_cursor"] = next_cursor
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminDashboardOrderDetailView(APIView):
@@ -1356,31 +1491,17 @@ class AdminDashboardOrderStatusView(APIView):
             ("Actualización de pedido", f"El estado ahora es {order.status}"),
         )
 
-        try:
-            Notification.objects.create(
-                user=order.user,
-                title=message[0],
-                body=message[1],
-                data={
-                    "type": "order_status",
-                    "transaction_id": str(order.transaction_id),
-                    "order_id": str(order.id),
-                    "status": order.status,
-                },
-            )
-            send_push(
-                title=message[0],
-                body=message[1],
-                data={
-                    "type": "order_status",
-                    "transaction_id": str(order.transaction_id),
-                    "order_id": str(order.id),
-                    "status": order.status,
-                },
-                user=order.user,
-            )
-        except Exception as exc:
-            logger.warning("No se pudo enviar push: %s", exc)
+        notify_users(
+            [order.user_id],
+            title=message[0],
+            body=message[1],
+            data={
+                "type": "order_status",
+                "transaction_id": str(order.transaction_id),
+                "order_id": str(order.id),
+                "status": order.status,
+            },
+        )
 
         return Response(
             {
@@ -1410,13 +1531,17 @@ class AdminDashboardProductsView(APIView):
                 "vendor", "vendor__social_profile", "category"
             )
             .prefetch_related("images")
-            .order_by("-created_at")[:limit_value]
+            .order_by("-created_at")
         )
+        queryset, next_cursor = _admin_listing(request, queryset, limit_value, "created_at")
 
         serializer = ProductSerializer(
             queryset, many=True, context={"request": request}
         )
-        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+        payload = {"results": serializer.data}
+        if cursor_requested(request):
+            payload["next_cursor"] = next_cursor
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminDashboardReviewsView(APIView):
@@ -1433,8 +1558,9 @@ class AdminDashboardReviewsView(APIView):
 
         queryset = (
             Review.objects.select_related("product", "user", "order_item__order")
-            .order_by("-date_created")[:limit_value]
+            .order_by("-date_created")
         )
+        queryset, next_cursor = _admin_listing(request, queryset, limit_value, "date_created")
 
         data = []
         for review in queryset:
@@ -1460,7 +1586,10 @@ class AdminDashboardReviewsView(APIView):
                 }
             )
 
-        return Response({"reviews": data}, status=status.HTTP_200_OK)
+        payload = {"reviews": data}
+        if cursor_requested(request):
+            payload["next_cursor"] = next_cursor
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminDashboardVendorsView(APIView):
@@ -1479,8 +1608,9 @@ class AdminDashboardVendorsView(APIView):
         queryset = (
             User.objects.annotate(products_count=Count("products"))
             .select_related("bank_account")
-            .order_by("-created_at")[:limit_value]
+            .order_by("-created_at")
         )
+        queryset, next_cursor = _admin_listing(request, queryset, limit_value, "created_at")
 
         data = []
         for user in queryset:
@@ -1510,7 +1640,10 @@ class AdminDashboardVendorsView(APIView):
                 }
             )
 
-        return Response({"vendors": data}, status=status.HTTP_200_OK)
+        payload = {"vendors": data}
+        if cursor_requested(request):
+            payload["next_cursor"] = next_cursor
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminDashboardVendorDetailView(APIView):
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def sync_product_search_index(sender, using="default", **kwargs):
+    from .utils.search import rebuild_search_index
+    rebuild_search_index(only_missing=True, using=using)
 
 
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.product'
+
+    def ready(self):
+        post_migrate.connect(sync_product_search_index, sender=self)
@@ -0,0 +1,31 @@
+"""
+Comando de Django para reconstruir el índice de búsqueda de productos.
+Uso: python manage.py rebuild_search_index [--only-missing]
+"""
+from django.core.management.base import BaseCommand
+
+from apps.product.utils.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de texto completo del catálogo de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Indexa solo los productos que aún no tienen entrada',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Cantidad de productos por lote',
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(
+            batch_size=options['batch_size'],
+            only_missing=options['only_missing'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos indexados'))
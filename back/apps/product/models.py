@@ -5,7 +5,7 @@ import os
 from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
-from django.db.models.signals import pre_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from apps.category.models import Category
 
@@ -63,6 +63,8 @@ class Product(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['slug']),
+            # Paginación por cursor (created_at, id)
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def save(self, *args, **kwargs):
@@ -104,6 +106,39 @@ class ProductImage(models.Model):
         return f"Image for {self.product.name} (order {self.display_order})"
 
 
+class ProductSearchEntry(models.Model):
+    """
+    Documento normalizado (sin tildes y con raíces en español) de un producto.
+    Lo indexa FTS5 en SQLite o un índice GIN en PostgreSQL
+    (ver apps/product/utils/search.py).
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry'
+    )
+    name_terms = models.TextField(blank=True)
+    body_terms = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search entry for {self.product_id}"
+
+
+class AICatalogVersion(models.Model):
+    """
+    Fila única con la versión del catálogo que usa la búsqueda con IA en sus
+    claves de caché. Vive en la base de datos para que todos los procesos
+    dejen de usar el contexto viejo aunque la caché sea local.
+    """
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.version)
+
+
 # Señales para limpiar archivos huérfanos
 @receiver(post_delete, sender=ProductImage)
 def delete_product_image_file(sender, instance, **kwargs):
@@ -131,3 +166,67 @@ def delete_old_product_image_on_update(sender, instance, **kwargs):
     if old_image.image and old_image.image != instance.image:
         if os.path.isfile(old_image.image.path):
             os.remove(old_image.image.path)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Mantiene el índice de búsqueda al crear o editar un producto.
+    La fila de ProductSearchEntry se elimina en cascada al borrar el producto.
+    """
+    if raw:
+        return
+    if update_fields and not {'name', 'description', 'category'} & set(update_fields):
+        return
+    from .utils.search import index_products
+    index_products([instance])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    """
+    Las categorías forman parte del documento de búsqueda: al renombrar una
+    categoría se reindexan los productos de su rama.
+    """
+    if raw or created:
+        return
+    from apps.category.utils import subtree_ids
+    from .utils.search import index_products
+    products = (
+        Product.objects.filter(category_id__in=subtree_ids(instance.pk))
+        .select_related('category', 'category__parent', 'category__parent__parent')
+    )
+    index_products(products.iterator())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_tree_counts(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    El árbol de categorías muestra productos disponibles por rama; solo se
+    invalida si pudo cambiar la categoría o la disponibilidad.
+    """
+    if raw:
+        return
+    if update_fields and not {'is_available', 'category'} & set(update_fields):
+        return
+    from apps.category.utils import bump_category_tree_version
+    bump_category_tree_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_ai_search_context(sender, raw=False, update_fields=None, **kwargs):
+    """
+    Invalida el índice del catálogo, las categorías y las interpretaciones
+    que la búsqueda con IA guarda en caché.
+    """
+    if raw:
+        return
+    relevant = {'name', 'description', 'category', 'is_available', 'stock', 'parent'}
+    if update_fields and not relevant & set(update_fields):
+        return
+    from .utils.ai_search import bump_ai_catalog_version
+    bump_ai_catalog_version()
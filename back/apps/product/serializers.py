@@ -1,5 +1,7 @@
 # products/serializers.py
 
+from django.db import models
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from .models import Product, ProductImage
 from apps.category.models import Category
@@ -7,7 +9,45 @@ from apps.category.serializers import CategorySerializer
 from apps.user.models import UserAccount, UserProfile
 from apps.cart.utils import seconds_until
 from django.utils import timezone
-from apps.cart.models import CartItem
+from apps.cart.models import ProductReservation
+
+
+def attach_reservations(products):
+    """
+    Resuelve en una sola consulta la reserva activa de cada producto y la
+    asigna como si viniera de ``annotate_reservations``.
+    """
+    pending = [p for p in products if not hasattr(p, "reservation_expires_at")]
+    if not pending:
+        return
+    active = {
+        product_id: (reserved_until, user_id)
+        for product_id, reserved_until, user_id in ProductReservation.objects.filter(
+            product_id__in={p.pk for p in pending},
+            reserved_until__gt=timezone.now(),
+        ).values_list("product_id", "reserved_until", "cart__user_id")
+    }
+    for product in pending:
+        product.reservation_expires_at, product.reservation_user_id = active.get(
+            product.pk, (None, None)
+        )
+
+
+def prefetch_product_listing(products):
+    """
+    Precarga imágenes, vendedor, categoría y reservas de una página de
+    productos. Respeta lo que ya venga con select/prefetch_related.
+    """
+    if not products:
+        return products
+    prefetch_related_objects(
+        products,
+        "images",
+        "vendor__social_profile",
+        "category__parent__parent",
+    )
+    attach_reservations(products)
+    return products
 
 
 def build_reservation_payload(obj, request):
@@ -17,19 +57,20 @@ def build_reservation_payload(obj, request):
         "reserved_until": None,
         "seconds_left": None,
     }
-    expires_at = getattr(obj, "reservation_expires_at", None)
-    reserved_user_id = getattr(obj, "reservation_user_id", None)
-    if not expires_at:
-        active_item = (
-            CartItem.objects.select_related("cart__user")
-            .filter(product=obj, reserved_until__gt=timezone.now())
-            .order_by("-reserved_until")
+    if hasattr(obj, "reservation_expires_at"):
+        expires_at = obj.reservation_expires_at
+        reserved_user_id = getattr(obj, "reservation_user_id", None)
+    else:
+        active = (
+            ProductReservation.objects.filter(product=obj, reserved_until__gt=timezone.now())
+            .values_list("reserved_until", "cart__user_id")
             .first()
         )
-        if not active_item:
+        if not active:
             return default_payload
-        expires_at = active_item.reserved_until
-        reserved_user_id = active_item.cart.user_id
+        expires_at, reserved_user_id = active
+    if not expires_at:
+        return default_payload
     seconds_left = seconds_until(expires_at)
     user = getattr(request, "user", None)
     is_authenticated = bool(user and getattr(user, "is_authenticated", False))
@@ -119,12 +160,26 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
 
 
+class ProductBatchListSerializer(serializers.ListSerializer):
+    """
+    Serializa una lista de productos en un número fijo de consultas
+    (ver ``prefetch_product_listing``), sin importar el tamaño de la página.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        products = prefetch_product_listing(list(iterable))
+        # Detalle de categoría ya serializado, compartido entre productos de la lista.
+        self.category_details = {}
+        return [self.child.to_representation(item) for item in products]
+
+
 class ProductSerializer(serializers.ModelSerializer):
     # write-only uploads
     image = serializers.ImageField(write_only=True, required=False)
     # relaciones
     images          = ProductImageSerializer(many=True, read_only=True)
-    category_detail = CategorySerializer(source='category', read_only=True)
+    category_detail = serializers.SerializerMethodField()
     vendor_detail   = VendorSerializer(source='vendor', read_only=True)
     reservation = serializers.SerializerMethodField()
 
@@ -148,6 +203,15 @@ class ProductSerializer(serializers.ModelSerializer):
             'availability', 'reservation',
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at', 'vendor']
+        list_serializer_class = ProductBatchListSerializer
+
+    def get_category_detail(self, obj):
+        cache = getattr(self.parent, "category_details", None)
+        if cache is None:
+            return CategorySerializer(obj.category, context=self.context).data
+        if obj.category_id not in cache:
+            cache[obj.category_id] = CategorySerializer(obj.category, context=self.context).data
+        return cache[obj.category_id]
 
     def get_availability(self, obj):
         return obj.is_available and obj.stock > 0
@@ -251,24 +315,21 @@ class ProductMinimalSerializer(serializers.ModelSerializer):
       'first_image', 'category_detail', 'availability',
       'vendor_detail', 'reservation',
     ]
+    list_serializer_class = ProductBatchListSerializer
 
   def get_first_image(self, obj):
-    # Buscar imagen principal
-    primary_image = obj.images.filter(is_primary=True).first()
-    if primary_image:
-      request = self.context.get('request')
-      if request:
-        return request.build_absolute_uri(primary_image.image.url)
-      return primary_image.image.url
-    
-    # Fallback: primera imagen disponible
-    image = obj.images.first()
+    # Se usa obj.images.all() para aprovechar el prefetch de la página
+    images = list(obj.images.all())
+    # Buscar imagen principal; fallback: primera imagen disponible
+    image = next((img for img in images if img.is_primary), None)
+    if image is None and images:
+      image = images[0]
     if image:
       request = self.context.get('request')
       if request:
         return request.build_absolute_uri(image.image.url)
       return image.image.url
-    
+
     return None
 
   def get_category_detail(self, obj):
@@ -9,60 +9,35 @@ Funciones exportadas:
   - product_catalog_index_for_ai(max_desc_chars, max_products)
   - call_openai_product_search_interpreter(user_prompt, categories, catalog_index)
   - call_openai_product_result_filter(user_prompt, candidates)
+  - cached_ai_categories() / cached_catalog_index()
+  - iter_ai_product_search(prompt, per_limit, request, preview)
 """
 
+import hashlib
 import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from uuid import UUID
 
-from openai import OpenAI
-
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, When
 
-from apps.product.models import Product
+from apps.AI.utils.llm_gateway.service import chat_content, get_gateway
+from apps.category.models import Category
+from apps.category.utils import subtree_ids
+from apps.product.models import AICatalogVersion, Product
 from apps.product.serializers import ProductMinimalSerializer
+from apps.product.utils.search import fold_accents, search_products
+
+logger = logging.getLogger(__name__)
 
 
 # ─────────────────────────────────────────────────────────────
 #  Búsqueda estándar
 # ─────────────────────────────────────────────────────────────
 
-def _simplify_word(word: str) -> list:
-    """
-    Devuelve variaciones de una palabra para búsqueda flexible.
-    - Quita 's' final: camisas → camisa
-    - Quita 'es' final: pantalones → pantalon
-    """
-    word = word.strip().lower()
-    if len(word) < 3:
-        return [word]
-    variants = [word]
-    if word.endswith("s") and len(word) > 3:
-        variants.append(word[:-1])
-    if word.endswith("es") and len(word) > 4:
-        variants.append(word[:-2])
-    return list(set(variants))
-
-
-def _build_product_criteria(query: str) -> Q:
-    """
-    Filtro Q tokenizado sobre nombre y descripción del producto.
-    Busca frase completa y cada palabra con variantes singular/plural.
-    """
-    query = query.strip()
-    if not query:
-        return Q()
-
-    base = Q(name__icontains=query) | Q(description__icontains=query)
-
-    words = [w.strip() for w in query.split() if len(w.strip()) >= 2]
-    for word in words:
-        for variant in _simplify_word(word):
-            base |= Q(name__icontains=variant) | Q(description__icontains=variant)
-
-    return base
-
-
 def execute_product_search(
     query: str,
     category_ids: list = None,
@@ -70,7 +45,8 @@ def execute_product_search(
     request=None,
 ) -> dict:
     """
-    Busca productos disponibles por nombre y descripción.
+    Busca productos disponibles por nombre, descripción y categoría usando el
+    índice de texto completo (ver ``utils/search.py``), ordenados por relevancia.
 
     Returns::
 
@@ -87,20 +63,12 @@ def execute_product_search(
         .prefetch_related("images")
     )
 
-    if query:
-        qs = qs.filter(_build_product_criteria(query))
-
     if category_ids:
-        cat_filter = Q()
-        for cid in category_ids:
-            cat_filter |= (
-                Q(category__id=cid)
-                | Q(category__parent__id=cid)
-                | Q(category__parent__parent__id=cid)
-            )
-        qs = qs.filter(cat_filter)
-
-    qs = qs.distinct().order_by("-created_at")
+        qs = qs.filter(category_id__in=subtree_ids(category_ids))
+
+    qs = qs.order_by("-created_at")
+    if query:
+        qs = search_products(qs, query)
     items = list(qs[:per_limit])
     serialized = ProductMinimalSerializer(items, many=True, context={"request": request}).data
 
@@ -183,8 +151,6 @@ def call_openai_product_search_interpreter(
     if not getattr(settings, "OPENAI_API_KEY", None):
         raise RuntimeError("OPENAI_API_KEY no configurada")
 
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
     category_lines = "\n".join(
         f'- id="{c["id"]}" name="{c["name"]}"' for c in categories[:100]
     )
@@ -236,13 +202,15 @@ def call_openai_product_search_interpreter(
     ]
 
     try:
-        completion = client.chat.completions.create(
-            model=getattr(settings, "OPENAI_SEARCH_MODEL", "gpt-3.5-turbo"),
-            temperature=0.3,
-            messages=messages,
-            timeout=20,
+        completion = get_gateway().chat(
+            {
+                "model": getattr(settings, "OPENAI_SEARCH_MODEL", "gpt-3.5-turbo"),
+                "temperature": 0.3,
+                "messages": messages,
+            },
+            feature="ai_search.interpret",
         )
-        parsed = json.loads(completion.choices[0].message.content)
+        parsed = json.loads(chat_content(completion))
     except Exception as exc:
         raise RuntimeError(f"Error llamando a OpenAI: {exc}")
 
@@ -306,8 +274,6 @@ def call_openai_product_result_filter(
             "reasoning": "Sin candidatos",
         }
 
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
     candidate_lines = []
     for p in candidates[:40]:
         cat_detail = p.get("category_detail") or {}
@@ -353,13 +319,15 @@ def call_openai_product_result_filter(
     ]
 
     try:
-        completion = client.chat.completions.create(
-            model=getattr(settings, "OPENAI_SEARCH_MODEL", "gpt-3.5-turbo"),
-            temperature=0.2,
-            messages=messages,
-            timeout=20,
+        completion = get_gateway().chat(
+            {
+                "model": getattr(settings, "OPENAI_SEARCH_MODEL", "gpt-3.5-turbo"),
+                "temperature": 0.2,
+                "messages": messages,
+            },
+            feature="ai_search.filter",
         )
-        parsed = json.loads(completion.choices[0].message.content)
+        parsed = json.loads(chat_content(completion))
     except Exception as exc:
         raise RuntimeError(f"Error en filtrado OpenAI: {exc}")
 
@@ -380,3 +348,238 @@ def call_openai_product_result_filter(
         "answer": str(parsed.get("answer", "Aquí tienes los productos")).strip(),
         "reasoning": str(parsed.get("reasoning", "")).strip(),
     }
+
+
+# ─────────────────────────────────────────────────────────────
+#  Caché del contexto y de las respuestas de la IA
+# ─────────────────────────────────────────────────────────────
+
+AI_CATALOG_VERSION_PK = 1
+
+# Las llamadas a OpenAI corren en estos hilos mientras el hilo de la
+# petición consulta la BD.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "AI_SEARCH_MAX_WORKERS", 4),
+    thread_name_prefix="ai-search",
+)
+
+
+def _catalog_version() -> int:
+    """
+    Versión del catálogo, leída de la base de datos: con caché local por
+    proceso todos los workers siguen viendo la misma.
+    """
+    version = (
+        AICatalogVersion.objects.filter(pk=AI_CATALOG_VERSION_PK)
+        .values_list("version", flat=True)
+        .first()
+    )
+    if version is None:
+        AICatalogVersion.objects.bulk_create(
+            [AICatalogVersion(pk=AI_CATALOG_VERSION_PK)], ignore_conflicts=True
+        )
+        version = AICatalogVersion.objects.get(pk=AI_CATALOG_VERSION_PK).version
+    return version
+
+
+def bump_ai_catalog_version():
+    """
+    Invalida categorías, índice del catálogo e interpretaciones cacheadas.
+    Se llama desde las señales de Product y Category; el UPDATE va en la
+    misma transacción que el cambio.
+    """
+    updated = AICatalogVersion.objects.filter(pk=AI_CATALOG_VERSION_PK).update(
+        version=F("version") + 1
+    )
+    if not updated:
+        _catalog_version()
+
+
+def _cache_timeout() -> int:
+    return getattr(settings, "AI_SEARCH_CACHE_TIMEOUT", 60 * 15)
+
+
+def _cached(key: str, builder, timeout: int):
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cached_ai_categories() -> list:
+    """
+    Lista ``[{"id", "name"}]`` de categorías que recibe el intérprete.
+    """
+    def build():
+        return [
+            {"id": str(c["id"]), "name": c["name"]}
+            for c in Category.objects.values("id", "name").order_by("name")
+        ]
+    return _cached(f"ai_search:categories:{_catalog_version()}", build, _cache_timeout())
+
+
+def cached_catalog_index(max_desc_chars: int = 150, max_products: int = 100) -> dict:
+    """
+    ``product_catalog_index_for_ai`` cacheado. Los cambios de stock hechos con
+    ``update()`` no disparan señales, por eso la entrada también expira.
+    """
+    key = f"ai_search:index:{_catalog_version()}:{max_desc_chars}:{max_products}"
+    return _cached(
+        key,
+        lambda: product_catalog_index_for_ai(max_desc_chars, max_products),
+        _cache_timeout(),
+    )
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    "  Camisas   de HOMBRE " y "camisas de hombre" comparten interpretación.
+    """
+    return re.sub(r"\s+", " ", fold_accents(prompt)).strip()
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def interpret_prompt(prompt: str, categories: list, catalog_index: dict, version: int = None) -> dict:
+    """
+    ``call_openai_product_search_interpreter`` memorizado por prompt normalizado.
+    La caché (TTL + desalojo LRU del backend) evita consultar al modelo dos
+    veces por la misma búsqueda popular. ``version`` evita leer la versión
+    del catálogo desde el hilo del executor.
+    """
+    if version is None:
+        version = _catalog_version()
+    key = f"ai_search:interpret:{version}:{_digest(normalize_prompt(prompt))}"
+    cached = cache.get(key)
+    if cached is not None:
+        return {**cached, "raw_prompt": prompt}
+    result = call_openai_product_search_interpreter(
+        user_prompt=prompt,
+        categories=categories,
+        catalog_index=catalog_index,
+    )
+    cache.set(key, result, getattr(settings, "AI_SEARCH_INTERPRETATION_TTL", 60 * 60))
+    return result
+
+
+def filter_candidates(prompt: str, candidates: list) -> dict:
+    """
+    ``call_openai_product_result_filter`` memorizado por prompt y candidatos.
+    """
+    candidate_ids = [str(p.get("id")) for p in candidates[:40]]
+    key = f"ai_search:filter:{_digest(normalize_prompt(prompt), *candidate_ids)}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = call_openai_product_result_filter(user_prompt=prompt, candidates=candidates)
+    cache.set(key, result, getattr(settings, "AI_SEARCH_INTERPRETATION_TTL", 60 * 60))
+    return result
+
+
+# ─────────────────────────────────────────────────────────────
+#  Pipeline completo
+# ─────────────────────────────────────────────────────────────
+
+def _selected_products(selected_ids: list, per_limit: int, request) -> list:
+    preserved = Case(
+        *[When(id=pk, then=pos) for pos, pk in enumerate(selected_ids)],
+        output_field=IntegerField(),
+    )
+    items = list(
+        Product.objects.filter(id__in=selected_ids, is_available=True, stock__gt=0)
+        .select_related("vendor", "vendor__social_profile", "category", "category__parent")
+        .order_by(preserved)[:per_limit]
+    )
+    return list(ProductMinimalSerializer(items, many=True, context={"request": request}).data)
+
+
+def iter_ai_product_search(prompt: str, per_limit: int = 20, request=None, preview: bool = False):
+    """
+    Ejecuta la búsqueda con IA y produce eventos:
+
+      {"stage": "candidates", ...}  (solo con ``preview``) resultados de BD
+                                    para el prompt tal cual, mientras la IA
+                                    interpreta en otro hilo.
+      {"stage": "final", ...}       resultado refinado por la IA (mismo
+                                    formato que la respuesta clásica).
+    """
+    categories = cached_ai_categories()
+    catalog_index = cached_catalog_index(max_desc_chars=150, max_products=100)
+    interpretation = _executor.submit(
+        interpret_prompt, prompt, categories, catalog_index, _catalog_version()
+    )
+
+    preview_products = None
+    if preview:
+        preview_payload = execute_product_search(
+            query=prompt, per_limit=50, request=request
+        )
+        preview_products = preview_payload["results"]["products"]
+        yield {
+            "stage": "candidates",
+            "query": prompt,
+            "limit": per_limit,
+            "total": min(len(preview_products), per_limit),
+            "results": {"products": preview_products[:per_limit]},
+        }
+
+    ai_error = None
+    try:
+        ai_filters = interpretation.result(
+            timeout=getattr(settings, "AI_SEARCH_INTERPRETATION_TIMEOUT", 15)
+        )
+    except FutureTimeoutError:
+        # El hilo sigue y cachea la interpretación para la próxima vez
+        ai_error = "La interpretación de la IA tardó demasiado"
+    except Exception as exc:
+        ai_error = str(exc)
+    if ai_error is not None:
+        ai_filters = {
+            "query": prompt,
+            "category_ids": [],
+            "suggestions": [],
+            "answer": f"Buscando: {prompt}",
+        }
+
+    category_ids = ai_filters.get("category_ids") or []
+    if preview_products is not None and ai_filters["query"] == prompt and not category_ids:
+        # La IA no cambió nada: se reutilizan los candidatos ya enviados
+        candidates = preview_products
+    else:
+        candidates = execute_product_search(
+            query=ai_filters["query"],
+            category_ids=category_ids,
+            per_limit=50,
+            request=request,
+        )["results"]["products"]
+
+    filter_result = None
+    try:
+        filter_result = filter_candidates(prompt, list(candidates))
+    except Exception as exc:
+        ai_error = str(exc) if not ai_error else f"{ai_error}; {exc}"
+
+    if filter_result and filter_result.get("selected_ids"):
+        products = _selected_products(filter_result["selected_ids"], per_limit, request)
+        answer = filter_result.get("answer") or ai_filters.get("answer") or ""
+    else:
+        # Fallback: usar candidatos originales limitados
+        products = list(candidates)[:per_limit]
+        answer = ai_filters.get("answer") or ""
+
+    payload = {
+        "query": ai_filters["query"],
+        "limit": per_limit,
+        "total": len(products),
+        "results": {"products": products},
+        "ai": {
+            "answer": answer,
+            "suggestions": ai_filters.get("suggestions", []),
+        },
+    }
+    if ai_error:
+        payload["ai"]["error"] = ai_error
+    yield {"stage": "final", **payload}
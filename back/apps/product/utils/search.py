@@ -0,0 +1,396 @@
+"""
+utils/search.py
+───────────────
+Índice de texto completo del catálogo de productos.
+
+Cada producto tiene una fila ``ProductSearchEntry`` con su nombre y su
+descripción/categorías ya normalizados (minúsculas, sin tildes, sin
+palabras vacías y reducidos a una raíz en español). Sobre esa tabla:
+
+  - SQLite:      tabla virtual FTS5 de contenido externo + triggers, rank bm25.
+  - PostgreSQL:  índice GIN sobre ``to_tsvector('simple', ...)``, rank ts_rank
+                 (cuando ``USE_POSTGRES`` está activo).
+
+Como la normalización ocurre en Python, ambos motores indexan exactamente
+los mismos términos. Si el motor no está disponible se vuelve al filtro
+``icontains`` de siempre.
+
+Funciones exportadas:
+  - search_terms(text)
+  - search_products(queryset, query)
+  - search_products_capped(queryset, query)
+  - index_products(products)
+  - rebuild_search_index()
+  - ensure_search_schema(using)
+"""
+
+import logging
+import re
+import unicodedata
+from uuid import UUID
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, IntegerField, Q, When
+
+from apps.product.models import Product, ProductSearchEntry
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "product_search_fts"
+GIN_INDEX = "product_search_entry_gin"
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "mi", "mis", "para", "por", "que", "se", "sin", "su", "sus", "tu",
+    "un", "una", "unas", "unos", "y", "o", "e",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+
+# Esquema verificado por alias de conexión (una vez por proceso).
+_schema_ready = {}
+
+
+# ─────────────────────────────────────────────────────────────
+#  Normalización
+# ─────────────────────────────────────────────────────────────
+
+def fold_accents(text: str) -> str:
+    """
+    Minúsculas y sin tildes: "Pantalón Niño" → "pantalon nino".
+    """
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem_es(word: str) -> str:
+    """
+    Raíz ligera en español. No pretende ser un stemmer completo: solo unifica
+    plurales y género para que "camisas", "camisa" y "camiso" compartan raíz.
+    - pantalones → pantalon,  luces → luz,  colores → color
+    - camisas → camis,  deportivos → deportiv,  blanca → blanc
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ones") and len(word) > 5:
+        word = word[:-2]
+    elif word.endswith("ces") and len(word) > 4:
+        word = word[:-3] + "z"
+    elif word.endswith("es") and len(word) > 4 and word[-3] in "lrndzj":
+        word = word[:-2]
+    elif word.endswith("s") and len(word) > 3:
+        word = word[:-1]
+    if len(word) >= 5 and word[-1] in "aoe":
+        word = word[:-1]
+    return word
+
+
+def search_terms(text: str) -> list:
+    """
+    Tokeniza un texto en términos de búsqueda normalizados.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(fold_accents(text)):
+        if token in STOPWORDS:
+            continue
+        terms.append(stem_es(token))
+    return terms
+
+
+def _category_names(category) -> list:
+    names = []
+    while category is not None:
+        names.append(category.name)
+        category = category.parent
+    return names
+
+
+def _build_entry(product) -> ProductSearchEntry:
+    body = [product.description or ""]
+    if product.category_id:
+        body.extend(_category_names(product.category))
+    return ProductSearchEntry(
+        product_id=product.pk,
+        name_terms=" ".join(search_terms(product.name)),
+        body_terms=" ".join(search_terms(" ".join(body))),
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+#  Motores
+# ─────────────────────────────────────────────────────────────
+
+class SQLiteSearchBackend:
+    vendor = "sqlite"
+
+    def schema_sql(self, table):
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"name_terms, body_terms, content='{table}', content_rowid='rowid')",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, name_terms, body_terms) "
+            f"VALUES (new.rowid, new.name_terms, new.body_terms); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_terms, body_terms) "
+            f"VALUES ('delete', old.rowid, old.name_terms, old.body_terms); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_terms, body_terms) "
+            f"VALUES ('delete', old.rowid, old.name_terms, old.body_terms); "
+            f"INSERT INTO {FTS_TABLE}(rowid, name_terms, body_terms) "
+            f"VALUES (new.rowid, new.name_terms, new.body_terms); END",
+        ]
+
+    def rebuild_sql(self, table):
+        return [f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"]
+
+    def match_expression(self, terms):
+        return " OR ".join(f'"{term}"*' for term in terms)
+
+    def ranked_sql(self, table, candidates_sql=None):
+        # bm25: menor es mejor; el nombre pesa 10 veces más que el cuerpo.
+        restrict = f"AND e.product_id IN ({candidates_sql}) " if candidates_sql else ""
+        return (
+            f"SELECT e.product_id FROM {FTS_TABLE} "
+            f"JOIN {table} e ON e.rowid = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s {restrict}"
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s"
+        )
+
+
+class PostgresSearchBackend:
+    vendor = "postgresql"
+
+    vector_sql = (
+        "(setweight(to_tsvector('simple', name_terms), 'A') || "
+        "setweight(to_tsvector('simple', body_terms), 'B'))"
+    )
+
+    def schema_sql(self, table):
+        return [
+            f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} ON {table} "
+            f"USING gin ({self.vector_sql})",
+        ]
+
+    def rebuild_sql(self, table):
+        return []
+
+    def match_expression(self, terms):
+        return " | ".join(f"{term}:*" for term in terms)
+
+    def ranked_sql(self, table, candidates_sql=None):
+        restrict = f"AND product_id IN ({candidates_sql}) " if candidates_sql else ""
+        return (
+            f"SELECT product_id FROM {table}, to_tsquery('simple', %s) query "
+            f"WHERE {self.vector_sql} @@ query {restrict}"
+            f"ORDER BY ts_rank({self.vector_sql}, query) DESC LIMIT %s"
+        )
+
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (SQLiteSearchBackend(), PostgresSearchBackend())
+}
+
+
+def _backend(using="default"):
+    return BACKENDS.get(connections[using].vendor)
+
+
+def ensure_search_schema(using="default") -> bool:
+    """
+    Crea (si falta) la tabla FTS5 o el índice GIN. Es idempotente; se ejecuta
+    tras ``migrate`` y, por si acaso, la primera vez que se busca.
+    """
+    if _schema_ready.get(using):
+        return True
+    backend = _backend(using)
+    if backend is None:
+        return False
+    table = ProductSearchEntry._meta.db_table
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                for statement in backend.schema_sql(table):
+                    cursor.execute(statement)
+    except DatabaseError as exc:
+        logger.warning("Índice de búsqueda no disponible (%s): %s", backend.vendor, exc)
+        return False
+    _schema_ready[using] = True
+    return True
+
+
+# ─────────────────────────────────────────────────────────────
+#  Mantenimiento del índice
+# ─────────────────────────────────────────────────────────────
+
+def index_products(products) -> int:
+    """
+    Inserta o actualiza la entrada de búsqueda de cada producto.
+    """
+    count = 0
+    for product in products:
+        entry = _build_entry(product)
+        ProductSearchEntry.objects.update_or_create(
+            product_id=entry.product_id,
+            defaults={
+                "name_terms": entry.name_terms,
+                "body_terms": entry.body_terms,
+            },
+        )
+        count += 1
+    return count
+
+
+def rebuild_search_index(
+    batch_size: int = 500, only_missing: bool = False, using: str = "default"
+) -> int:
+    """
+    Reconstruye el índice completo o, con ``only_missing``, indexa solo los
+    productos que aún no tienen entrada (catálogos existentes tras migrar).
+    """
+    ensure_search_schema(using)
+    products = (
+        Product.objects.using(using)
+        .select_related("category", "category__parent", "category__parent__parent")
+        .only("id", "name", "description", "category")
+        .order_by()
+    )
+    if only_missing:
+        products = products.filter(search_entry__isnull=True)
+    else:
+        ProductSearchEntry.objects.using(using).all().delete()
+
+    batch = []
+    total = 0
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(_build_entry(product))
+        if len(batch) >= batch_size:
+            ProductSearchEntry.objects.using(using).bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        ProductSearchEntry.objects.using(using).bulk_create(batch)
+        total += len(batch)
+
+    backend = _backend(using)
+    if backend is not None:
+        with connections[using].cursor() as cursor:
+            for statement in backend.rebuild_sql(ProductSearchEntry._meta.db_table):
+                cursor.execute(statement)
+    return total
+
+
+# ─────────────────────────────────────────────────────────────
+#  Consulta
+# ─────────────────────────────────────────────────────────────
+
+def ranked_product_ids(query: str, limit: int = None, using: str = "default", queryset=None):
+    """
+    IDs de productos ordenados por relevancia, o ``None`` si no se puede usar
+    el índice (motor no disponible o consulta solo con palabras vacías); en
+    ese caso el llamador debe usar el filtro clásico.
+
+    Con ``queryset`` solo se consideran sus productos: los filtros del
+    llamador se aplican en la misma consulta, antes del ``LIMIT``.
+    """
+    terms = list(dict.fromkeys(search_terms(query)))
+    if not terms:
+        return None
+    if limit is None:
+        limit = getattr(settings, "PRODUCT_SEARCH_MAX_RESULTS", 500)
+    if not ensure_search_schema(using):
+        return None
+
+    backend = _backend(using)
+    field = ProductSearchEntry._meta.pk
+    candidates_sql, candidates_params = None, ()
+    if queryset is not None:
+        candidates_sql, candidates_params = (
+            queryset.order_by().values("pk").query.get_compiler(using).as_sql()
+        )
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    backend.ranked_sql(ProductSearchEntry._meta.db_table, candidates_sql),
+                    [backend.match_expression(terms), *candidates_params, limit],
+                )
+                rows = cursor.fetchall()
+    except DatabaseError as exc:
+        logger.warning("Fallo en búsqueda de texto completo: %s", exc)
+        return None
+    return [
+        row[0] if isinstance(row[0], UUID) else field.to_python(row[0])
+        for row in rows
+    ]
+
+
+def _simplify_word(word: str) -> list:
+    """
+    Devuelve variaciones de una palabra para búsqueda flexible.
+    - Quita 's' final: camisas → camisa
+    - Quita 'es' final: pantalones → pantalon
+    """
+    word = word.strip().lower()
+    if len(word) < 3:
+        return [word]
+    variants = [word]
+    if word.endswith("s") and len(word) > 3:
+        variants.append(word[:-1])
+    if word.endswith("es") and len(word) > 4:
+        variants.append(word[:-2])
+    return list(set(variants))
+
+
+def _build_product_criteria(query: str) -> Q:
+    """
+    Filtro Q tokenizado sobre nombre y descripción del producto.
+    Respaldo cuando el índice de texto completo no está disponible.
+    """
+    base = Q(name__icontains=query) | Q(description__icontains=query)
+
+    words = [w.strip() for w in query.split() if len(w.strip()) >= 2]
+    for word in words:
+        for variant in _simplify_word(word):
+            base |= Q(name__icontains=variant) | Q(description__icontains=variant)
+
+    return base
+
+
+def search_products(queryset, query: str):
+    """
+    Filtra ``queryset`` por ``query`` y lo ordena por relevancia. Aplicar
+    antes los demás filtros: el tope de resultados se toma entre los
+    productos de ``queryset``.
+    """
+    return search_products_capped(queryset, query)[0]
+
+
+def search_products_capped(queryset, query: str):
+    """
+    Como ``search_products`` pero devuelve ``(queryset, truncated)``:
+    ``truncated`` indica que había más de ``PRODUCT_SEARCH_MAX_RESULTS``
+    coincidencias y solo se conservan las más relevantes.
+    """
+    query = (query or "").strip()
+    if not query:
+        return queryset, False
+
+    limit = getattr(settings, "PRODUCT_SEARCH_MAX_RESULTS", 500)
+    # Una fila de más basta para saber si el tope recortó resultados
+    ranked_ids = ranked_product_ids(
+        query, limit=limit + 1, using=queryset.db, queryset=queryset
+    )
+    if ranked_ids is None:
+        return queryset.filter(_build_product_criteria(query)).distinct(), False
+    if not ranked_ids:
+        return queryset.none(), False
+
+    truncated = len(ranked_ids) > limit
+    ranked_ids = ranked_ids[:limit]
+    relevance = Case(
+        *[When(id=pk, then=pos) for pos, pk in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ranked_ids).order_by(relevance), truncated
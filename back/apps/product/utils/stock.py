@@ -0,0 +1,78 @@
+"""
+utils/stock.py
+──────────────
+Descuento de inventario a prueba de sobreventa.
+
+Todas las líneas de un pedido se descuentan con un único UPDATE condicional::
+
+    UPDATE product SET stock = stock - CASE id WHEN … END
+    WHERE id IN (…) AND stock >= CASE id WHEN … END
+
+Si alguna fila no cumple la condición (otro comprador se llevó las últimas
+unidades) el número de filas afectadas no coincide y se lanza
+``InsufficientStock`` tras deshacer el descuento; dentro del
+``transaction.atomic()`` del checkout eso deshace también el pedido. Como
+``update()`` no envía señales, si algún producto se agota se sube a mano la
+versión del árbol de categorías y del catálogo de la búsqueda con IA. En
+PostgreSQL la condición se vuelve a evaluar tras esperar el bloqueo de la
+fila, así que dos compras simultáneas nunca dejan stock negativo.
+"""
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, ExpressionWrapper, F, Q, Value, When
+
+from apps.product.models import Product
+
+
+class InsufficientStock(Exception):
+    """Alguna línea pide más unidades de las disponibles."""
+
+    def __init__(self, products):
+        self.products = list(products)
+        names = ", ".join(product.name for product in self.products)
+        super().__init__(f"No hay suficiente stock para {names}")
+
+
+def bump_catalog_versions():
+    """Invalida lo que depende de ``is_available`` fuera de las señales."""
+    from apps.category.utils import bump_category_tree_version
+    from apps.product.utils.ai_search import bump_ai_catalog_version
+    bump_category_tree_version()
+    bump_ai_catalog_version()
+
+
+def decrement_stock(quantities: dict) -> int:
+    """
+    Descuenta ``{product_id: unidades}`` en una sola sentencia y marca como
+    no disponibles los productos que se agotan. Todo o nada.
+    """
+    quantities = {pk: int(count) for pk, count in quantities.items() if int(count) > 0}
+    if not quantities:
+        return 0
+
+    requested = Case(
+        *[When(pk=pk, then=Value(count)) for pk, count in quantities.items()],
+        default=Value(0),
+    )
+    try:
+        with transaction.atomic():
+            updated = (
+                Product.objects.filter(pk__in=quantities.keys(), stock__gte=requested)
+                .update(
+                    stock=F("stock") - requested,
+                    # Se evalúa con el stock anterior a la resta
+                    is_available=ExpressionWrapper(
+                        Q(stock__gt=requested), output_field=BooleanField()
+                    ),
+                )
+            )
+            if updated != len(quantities):
+                raise InsufficientStock([])
+            # update() no envía señales: los agotados se invalidan a mano
+            if Product.objects.filter(pk__in=quantities.keys(), stock=0).exists():
+                bump_catalog_versions()
+    except InsufficientStock:
+        # Ya sin el descuento parcial: qué productos no alcanzan
+        short = Product.objects.filter(pk__in=quantities.keys(), stock__lt=requested)
+        raise InsufficientStock(short.only("id", "name"))
+    return updated
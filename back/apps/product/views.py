@@ -1,5 +1,6 @@
 # products/views.py
 
+import json
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,30 +9,24 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from .models import Product
 from .serializers import ProductSerializer, ProductMinimalSerializer
-from ..utils.pagination import LargeSetPagination
-from django.http import Http404
-from django.db.models import Case, IntegerField, OuterRef, Q, Subquery, Sum, When
+from ..utils.pagination import LargeSetPagination, get_paginator
+from ..utils.sampling import random_sample
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.db.models import Case, IntegerField, OuterRef, Subquery, When
 from django.utils import timezone
-from apps.cart.models import CartItem
-from apps.orders.models import OrderItem, Order
-from apps.category.models import Category
-from .utils.ai_search import (
-    execute_product_search,
-    product_catalog_index_for_ai,
-    call_openai_product_search_interpreter,
-    call_openai_product_result_filter,
-)
+from apps.cart.models import ProductReservation
+from apps.orders.utils import top_selling_categories, top_selling_product_ids
+from apps.category.utils import subtree_ids
+from .utils.ai_search import iter_ai_product_search
+from .utils.search import search_products_capped
 
 
 def annotate_reservations(queryset):
     now = timezone.now()
-    active_reservations = (
-        CartItem.objects.filter(
-            product=OuterRef("pk"),
-            reserved_until__isnull=False,
-            reserved_until__gt=now,
-        )
-        .order_by("-reserved_until")
+    active_reservations = ProductReservation.objects.filter(
+        product=OuterRef("pk"),
+        reserved_until__gt=now,
     )
     return queryset.annotate(
         reservation_expires_at=Subquery(
@@ -64,28 +59,9 @@ def apply_product_category_filter(queryset, category_ids):
     category_ids = _normalize_category_ids(category_ids)
     if not category_ids:
         return queryset
-    category_filter = Q()
-    for category_id in category_ids:
-        category_filter |= (
-            Q(category__id=category_id)
-            | Q(category__parent__id=category_id)
-            | Q(category__parent__parent__id=category_id)
-        )
-    return queryset.filter(category_filter)
+    return queryset.filter(category_id__in=subtree_ids(category_ids))
 
 
-def apply_orderitem_category_filter(queryset, category_ids):
-    category_ids = _normalize_category_ids(category_ids)
-    if not category_ids:
-        return queryset
-    category_filter = Q()
-    for category_id in category_ids:
-        category_filter |= (
-            Q(product__category__id=category_id)
-            | Q(product__category__parent__id=category_id)
-            | Q(product__category__parent__parent__id=category_id)
-        )
-    return queryset.filter(category_filter)
 class ProductAPIView(APIView):
     """
     GET  /api/products/           -> list own products + total
@@ -127,7 +103,7 @@ class ProductAPIView(APIView):
         # List view - filter to user's own products
         qs = self.get_queryset().filter(vendor=user)
 
-        paginator = LargeSetPagination()
+        paginator = get_paginator(request, LargeSetPagination)
         page = paginator.paginate_queryset(qs, request, view=self)
         serializer = ProductSerializer(page, many=True, context={'request': request})
         return paginator.get_paginated_response(serializer.data)
@@ -217,16 +193,25 @@ class ProductListAPIView(APIView):
       category_ids = request.query_params.getlist('category')
       vendor_id = request.query_params.get('vendor')
       qs = self.get_objects()
-      if search:
-        qs = qs.filter(name__icontains=search)
       if category_ids:
         qs = apply_product_category_filter(qs, category_ids)
       if vendor_id:
         qs = qs.filter(vendor__id=vendor_id)
-      paginator = LargeSetPagination()
+      truncated = None
+      if search:
+        # La búsqueda va al final: el tope de relevancia se aplica ya filtrado.
+        # Se conserva el orden por relevancia con páginas numeradas; ``count``
+        # no pasa de PRODUCT_SEARCH_MAX_RESULTS y ``truncated`` avisa si hubo más.
+        qs, truncated = search_products_capped(qs, search)
+        paginator = LargeSetPagination()
+      else:
+        paginator = get_paginator(request, LargeSetPagination)
       page = paginator.paginate_queryset(qs, request, view=self)
       serializer = ProductMinimalSerializer(page, many=True, context={'request': request})
-      return paginator.get_paginated_response(serializer.data)
+      response = paginator.get_paginated_response(serializer.data)
+      if truncated is not None:
+        response.data['truncated'] = truncated
+      return response
 
 
 class ProductHighlightsAPIView(APIView):
@@ -249,23 +234,9 @@ class ProductHighlightsAPIView(APIView):
     base_qs = annotate_reservations(base_qs)
     base_qs = apply_product_category_filter(base_qs, category_id)
 
-    sold_items = OrderItem.objects.filter(
-      order__status__in=[
-        Order.OrderStatus.processed,
-        Order.OrderStatus.shipping,
-        Order.OrderStatus.delivered,
-      ],
-      product__is_available=True,
-      product__stock__gt=0,
-    )
-    sold_items = apply_orderitem_category_filter(sold_items, category_id)
-
-    top_ids = list(
-      sold_items.values('product')
-      .annotate(total_sold=Sum('count'))
-      .order_by('-total_sold')
-      .values_list('product', flat=True)[:top_limit]
-    )
+    # Ranking precalculado (ver apps/orders/utils.py)
+    category_ids = _normalize_category_ids(category_id)
+    top_ids = top_selling_product_ids(top_limit, category_ids)
 
     random_fallback_products = None
     if top_ids:
@@ -279,29 +250,16 @@ class ProductHighlightsAPIView(APIView):
       ).data
     else:
       # Si no hay ventas, mostrar productos al azar
-      random_fallback_products = base_qs.order_by('?')[:top_limit]
+      random_fallback_products = random_sample(base_qs, top_limit)
       top_products = ProductMinimalSerializer(
         random_fallback_products, many=True, context={'request': request}
       ).data
 
     if top_ids:
-      top_categories = [
-        {
-          'id': str(row['product__category__id']),
-          'name': row['product__category__name'],
-          'sold_count': row['total_sold'],
-        }
-        for row in sold_items.values(
-          'product__category__id',
-          'product__category__name',
-        )
-        .annotate(total_sold=Sum('count'))
-        .order_by('-total_sold')[:categories_limit]
-        if row.get('product__category__id')
-      ]
+      top_categories = top_selling_categories(categories_limit, category_ids)
     else:
       # Sin ventas: categorías al azar (derivadas de productos al azar)
-      fallback_qs = random_fallback_products or base_qs.order_by('?')[:top_limit]
+      fallback_qs = random_fallback_products or random_sample(base_qs, top_limit)
       seen = set()
       top_categories = []
       for product in fallback_qs:
@@ -337,7 +295,9 @@ class AIProductSearchAPIView(APIView):
 
     FLUJO:
     1. Usuario envía texto natural (?q=...).
-    2. OpenAI interpreta el prompt y devuelve query optimizado + categorías.
+    2. OpenAI interpreta el prompt y devuelve query optimizado + categorías
+       (en otro hilo; categorías, índice del catálogo e interpretaciones
+       salen de caché cuando es posible).
     3. Se buscan CANDIDATOS amplios en la BD (nombre y descripción).
     4. OpenAI valida los candidatos y devuelve los UUIDs más relevantes.
     5. Se consultan esos UUIDs en la BD → resultados finales.
@@ -345,6 +305,9 @@ class AIProductSearchAPIView(APIView):
     Parámetros:
       ?q=<prompt>   texto libre (mín. 2 caracteres)
       &limit=<int>  máx resultados (1-50, default 20)
+      &stream=1     respuesta NDJSON: primero los candidatos de la BD
+                    (``stage: candidates``) y luego el orden refinado por la
+                    IA (``stage: final``)
 
     Respuesta incluye objeto ``ai`` con:
       - answer:      mensaje breve para mostrar al usuario
@@ -366,103 +329,19 @@ class AIProductSearchAPIView(APIView):
             except (TypeError, ValueError):
                 raise ValidationError({"limit": "Debe ser un entero positivo."})
 
-        # ── PASO 1: Preparar categorías y contexto para la IA ───────────
-        categories = list(
-            Category.objects.values("id", "name").order_by("name")
-        )
-        # Serializar IDs como strings
-        categories = [{"id": str(c["id"]), "name": c["name"]} for c in categories]
-
-        catalog_index = product_catalog_index_for_ai(
-            max_desc_chars=150,
-            max_products=100,
-        )
-
-        # ── PASO 2: OpenAI interpreta el prompt ─────────────────────────
-        ai_error = None
-        try:
-            ai_filters = call_openai_product_search_interpreter(
-                user_prompt=prompt,
-                categories=categories,
-                catalog_index=catalog_index,
-            )
-        except Exception as exc:
-            ai_error = str(exc)
-            ai_filters = {
-                "query": prompt,
-                "category_ids": [],
-                "suggestions": [],
-                "answer": f"Buscando: {prompt}",
-            }
-
-        # ── PASO 3: Búsqueda amplia en BD para obtener candidatos ────────
-        candidates_payload = execute_product_search(
-            query=ai_filters["query"],
-            category_ids=ai_filters.get("category_ids") or [],
-            per_limit=50,
-            request=request,
+        stream = request.query_params.get("stream") in ("1", "true", "yes")
+        events = iter_ai_product_search(
+            prompt, per_limit=per_limit, request=request, preview=stream
         )
-        candidates = candidates_payload["results"]["products"]
 
-        # ── PASO 4: OpenAI filtra candidatos y devuelve UUIDs ────────────
-        filter_result = None
-        try:
-            filter_result = call_openai_product_result_filter(
-                user_prompt=prompt,
-                candidates=list(candidates),
-            )
-        except Exception as exc:
-            ai_error = str(exc) if not ai_error else f"{ai_error}; {exc}"
-
-        # ── PASO 5: Resultados finales por UUIDs seleccionados ───────────
-        if filter_result and filter_result.get("selected_ids"):
-            selected_ids = filter_result["selected_ids"]
-            qs = (
-                Product.objects.filter(
-                    id__in=selected_ids,
-                    is_available=True,
-                    stock__gt=0,
-                )
-                .select_related("vendor", "vendor__social_profile", "category", "category__parent")
-                .prefetch_related("images")
-            )
-            # Preservar orden de relevancia decidido por la IA
-            from django.db.models import Case as DbCase, When as DbWhen, IntegerField as DbInt
-            preserved = DbCase(
-                *[DbWhen(id=pk, then=pos) for pos, pk in enumerate(selected_ids)],
-                output_field=DbInt(),
+        if stream:
+            return StreamingHttpResponse(
+                (json.dumps(event, cls=DjangoJSONEncoder) + "\n" for event in events),
+                content_type="application/x-ndjson",
             )
-            qs = qs.order_by(preserved)
-            items = list(qs[:per_limit])
-            serialized = ProductMinimalSerializer(
-                items, many=True, context={"request": request}
-            ).data
-
-            payload = {
-                "query": ai_filters["query"],
-                "limit": per_limit,
-                "total": len(serialized),
-                "results": {"products": list(serialized)},
-                "ai": {
-                    "answer": filter_result.get("answer") or ai_filters.get("answer") or "",
-                    "suggestions": ai_filters.get("suggestions", []),
-                },
-            }
-        else:
-            # Fallback: usar candidatos originales limitados
-            fallback = list(candidates)[:per_limit]
-            payload = {
-                "query": ai_filters["query"],
-                "limit": per_limit,
-                "total": len(fallback),
-                "results": {"products": fallback},
-                "ai": {
-                    "answer": ai_filters.get("answer") or "",
-                    "suggestions": ai_filters.get("suggestions", []),
-                },
-            }
-
-        if ai_error:
-            payload["ai"]["error"] = ai_error
 
+        payload = None
+        for event in events:
+            payload = event
+        payload.pop("stage", None)
         return Response(payload)
@@ -5,8 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
 from .models import SupportTicket, ChatMessage
 from .serializers import SupportTicketSerializer, ChatMessageSerializer
-import requests
-import json
+from apps.AI.utils.llm_gateway.service import LLMGatewayError, chat_content, get_gateway
 
 class SupportTicketCreateView(generics.CreateAPIView):
     serializer_class = SupportTicketSerializer
@@ -52,11 +51,6 @@ def chat_with_assistant(request):
     if not settings.OPENAI_API_KEY:
         return Response({'error': 'OpenAI API key not configured'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-    headers = {
-        "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     # Construct conversation history (last 5 messages for context)
     # This is a basic implementation. For production, you might want to summarize or limit tokens more strictly.
     previous_messages = ChatMessage.objects.filter(user=request.user, session_id=session_id).order_by('-timestamp')[:10]
@@ -79,11 +73,8 @@ def chat_with_assistant(request):
     }
 
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
-        response.raise_for_status()
-        
-        result = response.json()
-        ai_message = result['choices'][0]['message']['content']
+        result = get_gateway().chat(data, feature="support")
+        ai_message = chat_content(result)
 
         # Save AI response
         ChatMessage.objects.create(
@@ -95,7 +86,7 @@ def chat_with_assistant(request):
 
         return Response({'response': ai_message})
 
-    except requests.exceptions.RequestException as e:
+    except LLMGatewayError as e:
         # Log error
         print(f"OpenAI API Error: {e}")
         return Response({'error': 'Error communicating with AI service'}, status=status.HTTP_502_BAD_GATEWAY)
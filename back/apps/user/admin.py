@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import UserAccount, UserProfile, UserFollow, ExpoPushToken, Notification
+from .models import UserAccount, UserProfile, UserFollow, ExpoPushToken, Notification, OutboxMessage
 from unfold.forms import AdminPasswordChangeForm, UserChangeForm, UserCreationForm
 from django.utils.translation import gettext_lazy as _
 from unfold.admin import ModelAdmin
@@ -101,3 +101,11 @@ class NotificationAdmin(ModelAdmin):
         'style': 'width: 100%;'
       })
     return form
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(ModelAdmin):
+  list_display = ('id', 'kind', 'status', 'attempts', 'available_at', 'created_at', 'sent_at')
+  list_filter = ('kind', 'status')
+  readonly_fields = ('created_at', 'sent_at', 'claim_token', 'last_error')
+  ordering = ('-created_at',)
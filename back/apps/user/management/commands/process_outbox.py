@@ -0,0 +1,50 @@
+"""
+Comando de Django para entregar los push y correos pendientes del outbox.
+Uso: python manage.py process_outbox [--interval 5] [--batch-size 100] [--workers 8]
+
+Sin ``--interval`` vacía lo disponible y termina (cron); con él se queda en bucle.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.user.utils.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Entrega los mensajes pendientes del outbox con reintentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Segundos entre pasadas; 0 ejecuta una sola vez',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Cantidad de mensajes por lote (OUTBOX_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Envíos en paralelo por lote (OUTBOX_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            close_old_connections()
+            stats = drain_outbox(batch_size=options['batch_size'], workers=options['workers'])
+            if stats['sent'] or stats['retried'] or stats['failed'] or interval <= 0:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {stats['sent']} enviados, {stats['retried']} a reintentar, "
+                    f"{stats['failed']} fallidos"
+                ))
+            if interval <= 0:
+                break
+            time.sleep(interval)
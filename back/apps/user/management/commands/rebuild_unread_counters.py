@@ -0,0 +1,19 @@
+"""
+Comando de Django para recalcular los contadores de no leídos.
+Uso: python manage.py rebuild_unread_counters
+
+Los contadores se actualizan de forma incremental al crear y leer
+notificaciones y mensajes de chat; este comando los recalcula desde las
+tablas si alguna vez se desincronizan.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.user.utils.unread import rebuild_unread_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las notificaciones y mensajes de chat sin leer de cada usuario'
+
+    def handle(self, *args, **options):
+        total = rebuild_unread_counters()
+        self.stdout.write(self.style.SUCCESS(f'✅ Contadores actualizados: {total} usuarios con pendientes'))
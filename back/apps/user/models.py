@@ -8,7 +8,7 @@ from django.contrib.auth.models import (
 )
 from apps.cart.models import Cart
 from apps.wishlist.models import WishList
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils import timezone
@@ -302,9 +302,90 @@ class Notification(models.Model):
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Notificación de {self.title} - {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Efecto externo (push de Expo, correo) pendiente de enviar. Se escribe en
+    la misma transacción que el cambio que lo origina y lo entrega el worker
+    ``manage.py process_outbox`` (ver apps/user/utils/outbox.py).
+    """
+    class Kind(models.TextChoices):
+        push = "push", "Push"
+        email = "email", "Correo"
+
+    class Status(models.TextChoices):
+        pending = "pending", "Pendiente"
+        sent = "sent", "Enviado"
+        failed = "failed", "Fallido"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.pending)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Próximo intento; mientras un worker lo procesa, fin de su turno (lease)
+    available_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Mensaje pendiente'
+        verbose_name_plural = 'Mensajes pendientes'
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class UnreadCounter(models.Model):
+    """
+    Pendientes por leer de cada usuario, mantenidos con incrementos atómicos
+    para que el badge de la app sea una sola lectura por clave primaria
+    (ver apps/user/utils/unread.py).
+    """
+    user = models.OneToOneField(
+        UserAccount, on_delete=models.CASCADE, primary_key=True, related_name="unread_counter"
+    )
+    notifications = models.PositiveIntegerField(default=0)
+    order_chat = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Contador de no leídos'
+        verbose_name_plural = 'Contadores de no leídos'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.notifications} / {self.order_chat}"
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, raw=False, **kwargs):
+    """
+    Notificaciones creadas una a una; ``notify_users`` usa bulk_create y
+    actualiza los contadores él mismo.
+    """
+    if raw or not created or instance.read or instance.user_id is None:
+        return
+    from apps.user.utils.unread import add_unread
+    add_unread([instance.user_id], "notifications")
+
+
+@receiver(post_delete, sender=Notification)
+def discount_deleted_notification(sender, instance, **kwargs):
+    if instance.read or instance.user_id is None:
+        return
+    from apps.user.utils.unread import remove_unread
+    remove_unread(instance.user_id, "notifications")
       
 
 
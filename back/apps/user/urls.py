@@ -16,6 +16,7 @@ from .views import (
     NotificationDetailView,
     NotificationMarkReadView,
     NotificationMarkAllView,
+    UnreadBadgeView,
     AccountDeleteView,
     N8NUserStageListView,
     N8NUserAdvanceView,
@@ -48,4 +49,5 @@ urlpatterns = [
     path("notifications/mark-all-read/", NotificationMarkAllView.as_view(), name="notifications-mark-all"),
     path("notifications/<int:notification_id>/", NotificationDetailView.as_view(), name="notifications-detail"),
     path("notifications/<int:notification_id>/read/", NotificationMarkReadView.as_view(), name="notifications-read"),
+    path("badges/", UnreadBadgeView.as_view(), name="unread-badges"),
 ]
@@ -0,0 +1,267 @@
+"""
+utils/outbox.py
+───────────────
+Outbox transaccional para los efectos externos de los pedidos.
+
+Las vistas no llaman a Expo ni al SMTP: escriben un ``OutboxMessage`` en la
+misma transacción que el pedido (``enqueue_push`` / ``enqueue_email`` /
+``notify_users``). Si la transacción se deshace, el mensaje desaparece con
+ella; si se confirma, se entrega después:
+
+  - ``manage.py process_outbox`` reclama lotes, los envía con un pool de
+    hilos y reintenta con backoff exponencial los que fallan.
+  - Con ``OUTBOX_DISPATCH_ON_COMMIT`` (por defecto activo) el proceso web
+    además intenta entregar en segundo plano justo tras el commit, para no
+    depender del worker en desarrollo. El worker sigue siendo quien reintenta.
+
+Un lote se reclama con un UPDATE condicional que marca ``claim_token`` y
+alarga ``available_at`` (lease): dos workers nunca toman el mismo mensaje y
+si uno muere, el mensaje vuelve a estar disponible al vencer el lease.
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.user.models import Notification, OutboxMessage
+from apps.user.utils.unread import add_unread
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+#  Encolar
+# ─────────────────────────────────────────────────────────────
+
+def _user_id(user):
+    return str(getattr(user, "pk", user)) if user is not None else None
+
+
+def _schedule_dispatch():
+    if getattr(settings, "OUTBOX_DISPATCH_ON_COMMIT", True):
+        transaction.on_commit(_dispatch_in_background)
+
+
+def enqueue_push(title, body, data=None, *, user=None, badge=None) -> OutboxMessage:
+    """Push a los tokens de ``user`` (usuario o id); sin usuario, a todos."""
+    message = OutboxMessage.objects.create(
+        kind=OutboxMessage.Kind.push,
+        payload={
+            "title": title,
+            "body": body,
+            "data": data or {},
+            "user_id": _user_id(user),
+            "badge": badge,
+        },
+    )
+    _schedule_dispatch()
+    return message
+
+
+def enqueue_email(subject, message, from_email, recipient_list) -> OutboxMessage:
+    outbox_message = OutboxMessage.objects.create(
+        kind=OutboxMessage.Kind.email,
+        payload={
+            "subject": subject,
+            "message": message,
+            "from_email": from_email,
+            "recipient_list": list(recipient_list),
+        },
+    )
+    _schedule_dispatch()
+    return outbox_message
+
+
+def notify_users(users, title, body, data=None, *, push_title=None, push_body=None):
+    """
+    Notificación en la app más push para varios usuarios con dos INSERT:
+    las ``Notification`` y un único ``OutboxMessage`` con todos los usuarios.
+    """
+    user_ids = list(dict.fromkeys(_user_id(user) for user in users if user is not None))
+    if not user_ids:
+        return
+    Notification.objects.bulk_create([
+        Notification(user_id=user_id, title=title, body=body, data=data)
+        for user_id in user_ids
+    ])
+    # bulk_create no emite post_save: el badge se actualiza aquí
+    add_unread(user_ids, "notifications")
+    # Un solo mensaje para todos: el servicio push agrupa sus tokens en lotes
+    OutboxMessage.objects.create(
+        kind=OutboxMessage.Kind.push,
+        payload={
+            "title": push_title or title,
+            "body": push_body or body,
+            "data": data or {},
+            "user_ids": user_ids,
+            "badge": None,
+        },
+    )
+    _schedule_dispatch()
+
+
+# ─────────────────────────────────────────────────────────────
+#  Entregar
+# ─────────────────────────────────────────────────────────────
+
+def _deliver_push(payload):
+    from apps.user.utils.push import PushDeliveryError, send_push
+    users = payload.get("user_ids")
+    if users is None and payload.get("user_id"):
+        users = [payload["user_id"]]
+    try:
+        send_push(
+            title=payload["title"],
+            body=payload["body"],
+            data=payload.get("data") or {},
+            users=users,
+            tokens=payload.get("tokens"),
+            badge=payload.get("badge"),
+            raise_errors=True,
+        )
+    except PushDeliveryError as exc:
+        # El reintento va solo a los tokens de los lotes fallidos: quien ya
+        # recibió el push no lo recibe dos veces
+        payload["tokens"] = exc.tokens
+        raise
+
+
+def _deliver_email(payload):
+    send_mail(
+        payload["subject"],
+        payload["message"],
+        payload["from_email"],
+        payload["recipient_list"],
+        fail_silently=False,
+    )
+
+
+HANDLERS = {
+    OutboxMessage.Kind.push: _deliver_push,
+    OutboxMessage.Kind.email: _deliver_email,
+}
+
+
+def claim_batch(batch_size: int = 100, lease_seconds: float = 300) -> list:
+    """Reclama hasta ``batch_size`` mensajes disponibles para este worker."""
+    now = timezone.now()
+    token = uuid.uuid4()
+    candidates = list(
+        OutboxMessage.objects.filter(
+            status=OutboxMessage.Status.pending, available_at__lte=now
+        )
+        .order_by("available_at", "id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+    OutboxMessage.objects.filter(
+        id__in=candidates,
+        status=OutboxMessage.Status.pending,
+        available_at__lte=now,
+    ).update(claim_token=token, available_at=now + timedelta(seconds=lease_seconds))
+    return list(OutboxMessage.objects.filter(claim_token=token).order_by("id"))
+
+
+def _deliver(message):
+    try:
+        HANDLERS[message.kind](message.payload)
+        return None
+    except Exception as exc:
+        return exc
+    finally:
+        # Cada hilo del pool abre su propia conexión
+        close_old_connections()
+
+
+def process_batch(batch_size: int = None, workers: int = None) -> dict:
+    """
+    Reclama un lote, lo entrega en paralelo y registra el resultado.
+    Devuelve ``{"sent": n, "retried": n, "failed": n}``.
+    """
+    batch_size = batch_size or getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+    workers = workers or getattr(settings, "OUTBOX_WORKERS", 8)
+    max_attempts = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+    backoff = getattr(settings, "OUTBOX_RETRY_BACKOFF", 30)
+    lease = getattr(settings, "OUTBOX_LEASE_SECONDS", 300)
+
+    messages = claim_batch(batch_size, lease)
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    if not messages:
+        return stats
+
+    if workers > 1 and len(messages) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(messages))) as pool:
+            errors = list(pool.map(_deliver, messages))
+    else:
+        errors = [_deliver(message) for message in messages]
+
+    now = timezone.now()
+    sent_ids = []
+    for message, error in zip(messages, errors):
+        if error is None:
+            sent_ids.append(message.id)
+            continue
+        message.attempts += 1
+        message.last_error = str(error)[:2000]
+        message.claim_token = None
+        if message.attempts >= max_attempts:
+            message.status = OutboxMessage.Status.failed
+            stats["failed"] += 1
+        else:
+            message.available_at = now + timedelta(seconds=backoff * 2 ** (message.attempts - 1))
+            stats["retried"] += 1
+        logger.warning("Outbox %s #%s falló (%s): %s", message.kind, message.id, message.attempts, error)
+
+    if sent_ids:
+        OutboxMessage.objects.filter(id__in=sent_ids).update(
+            status=OutboxMessage.Status.sent, sent_at=now, claim_token=None
+        )
+        stats["sent"] = len(sent_ids)
+    retry = [message for message in messages if message.id not in set(sent_ids)]
+    if retry:
+        OutboxMessage.objects.bulk_update(
+            retry, ["attempts", "last_error", "claim_token", "status", "available_at", "payload"]
+        )
+    return stats
+
+
+def drain_outbox(batch_size: int = None, workers: int = None) -> dict:
+    """Procesa lotes hasta que no quede nada disponible."""
+    totals = {"sent": 0, "retried": 0, "failed": 0}
+    while True:
+        stats = process_batch(batch_size, workers)
+        for key, value in stats.items():
+            totals[key] += value
+        if not any(stats.values()):
+            return totals
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def _dispatch_in_background():
+    """Tras el commit: entrega en un hilo aparte, fuera de la respuesta."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+    _dispatcher.submit(_safe_drain)
+
+
+def _safe_drain():
+    try:
+        drain_outbox()
+    except Exception:
+        logger.exception("Error entregando el outbox")
+    finally:
+        close_old_connections()
@@ -1,18 +1,400 @@
+"""
+utils/push.py
+─────────────
+Envío de notificaciones push por Expo.
+
+  - Un envío acepta uno o varios usuarios (o ninguno: difusión a todos los
+    tokens activos). Los tokens se leen con ``iterator()`` y se agrupan en
+    lotes de ``CHUNK``; nunca se cargan todos en memoria.
+  - Los lotes salen en paralelo (``PUSH_MAX_WORKERS``) por una sesión HTTP
+    con pool de conexiones compartida por el proceso.
+  - Los tokens que Expo reporta como ``DeviceNotRegistered`` se desactivan
+    con un único UPDATE al final del envío.
+  - Los tickets aceptados se guardan en memoria y un hilo en segundo plano
+    consulta sus recibos pasados ``PUSH_RECEIPT_DELAY`` segundos; los recibos
+    con ``DeviceNotRegistered`` también desactivan el token.
+
+En pruebas se reemplaza Expo por ``StubPushTransport``::
+
+    stub = StubPushTransport(dead_tokens={"ExponentPushToken[x]"})
+    set_push_service(PushService(transport=stub, background=False))
+    send_push("Hola", "Mensaje", users=[user_id])
+"""
+
+import itertools
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Any, Dict, Iterable, List, Optional
 
+import requests
+from django.conf import settings
+from django.db import connections
 from exponent_server_sdk import PushClient, PushMessage, PushServerError
+from requests.adapters import HTTPAdapter
 
 from apps.user.models import ExpoPushToken, UserAccount
 
 logger = logging.getLogger(__name__)
 
 CHUNK = 95  # Expo recomienda < 100 por batch
+RECEIPT_CHUNK = 1000  # máximo de ids por consulta de recibos
+DEVICE_NOT_REGISTERED = "DeviceNotRegistered"
+
+
+def _chunks(iterable: Iterable[str], size: int) -> Iterable[List[str]]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def deactivate_tokens(tokens) -> int:
+    """Desactiva tokens muertos con un UPDATE por cada mil."""
+    tokens = list(dict.fromkeys(tokens))
+    updated = 0
+    for batch in _chunks(tokens, 1000):
+        updated += ExpoPushToken.objects.filter(token__in=batch, active=True).update(active=False)
+    if updated:
+        logger.info("%s tokens push desactivados", updated)
+    return updated
+
+
+# ─────────────────────────────────────────────────────────────
+#  Transportes
+# ─────────────────────────────────────────────────────────────
+
+class PushReceiptRef:
+    """Lo único que el SDK lee de un ticket para pedir su recibo."""
+
+    __slots__ = ("id",)
+
+    def __init__(self, ticket_id):
+        self.id = ticket_id
+
+
+class ExpoTransport:
+    """
+    Cliente del SDK de Expo sobre una ``requests.Session`` con pool de
+    conexiones, compartida por todos los hilos de envío.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 10):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "accept": "application/json",
+            "accept-encoding": "gzip, deflate",
+            "content-type": "application/json",
+        })
+        self.client = PushClient(session=session, timeout=timeout)
+
+    def send(self, messages: List[dict]) -> List[dict]:
+        tickets = self.client.publish_multiple([PushMessage(**message) for message in messages])
+        return [
+            {"status": ticket.status, "id": ticket.id, "details": ticket.details or {}}
+            for ticket in tickets
+        ]
+
+    def receipts(self, ticket_ids: List[str]) -> Dict[str, dict]:
+        tickets = [PushReceiptRef(ticket_id) for ticket_id in ticket_ids]
+        return {
+            receipt.id: {"status": receipt.status, "details": receipt.details or {}}
+            for receipt in self.client.check_receipts_multiple(tickets)
+        }
+
+
+class StubPushTransport:
+    """
+    Expo en memoria para pruebas sin red. Registra cada lote en ``calls``;
+    los tokens de ``dead_tokens`` reciben un ticket ``DeviceNotRegistered`` y
+    los de ``dead_receipts`` un recibo con ese error.
+    """
+
+    def __init__(self, dead_tokens=(), dead_receipts=(), fail_with: Exception = None):
+        self.dead_tokens = set(dead_tokens)
+        self.dead_receipts = set(dead_receipts)
+        self.fail_with = fail_with
+        self.calls = []
+        self.receipt_calls = []
+        self._tickets = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def send(self, messages: List[dict]) -> List[dict]:
+        with self._lock:
+            self.calls.append(messages)
+        if self.fail_with is not None:
+            raise self.fail_with
+        tickets = []
+        for message in messages:
+            if message["to"] in self.dead_tokens:
+                tickets.append({"status": "error", "id": "", "details": {"error": DEVICE_NOT_REGISTERED}})
+                continue
+            ticket_id = f"ticket-{next(self._ids)}"
+            self._tickets[ticket_id] = message["to"]
+            tickets.append({"status": "ok", "id": ticket_id, "details": {}})
+        return tickets
+
+    def receipts(self, ticket_ids: List[str]) -> Dict[str, dict]:
+        self.receipt_calls.append(list(ticket_ids))
+        result = {}
+        for ticket_id in ticket_ids:
+            if self._tickets.get(ticket_id) in self.dead_receipts:
+                result[ticket_id] = {"status": "error", "details": {"error": DEVICE_NOT_REGISTERED}}
+            else:
+                result[ticket_id] = {"status": "ok", "details": {}}
+        return result
+
+    @property
+    def sent_tokens(self) -> List[str]:
+        return [message["to"] for batch in self.calls for message in batch]
+
+
+# ─────────────────────────────────────────────────────────────
+#  Recibos
+# ─────────────────────────────────────────────────────────────
+
+class ReceiptPoller:
+    """
+    Tickets pendientes de recibo (``ticket_id → token``), acotados a
+    ``max_pending``. ``poll()`` consulta los que ya cumplieron ``delay``.
+    """
 
+    def __init__(self, transport, delay: float = 900, interval: float = 60,
+                 max_pending: int = 100000, background: bool = True):
+        self.transport = transport
+        self.delay = delay
+        self.interval = interval
+        self.max_pending = max_pending
+        self.background = background
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
 
-def _chunks(seq: List[str], size: int) -> Iterable[List[str]]:
-    for i in range(0, len(seq), size):
-        yield seq[i : i + size]
+    def __len__(self):
+        return len(self._pending)
+
+    def track(self, tickets: Dict[str, str]):
+        if not tickets:
+            return
+        due = time.monotonic() + self.delay
+        with self._lock:
+            for ticket_id, token in tickets.items():
+                self._pending[ticket_id] = (due, token)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+        if self.background:
+            self._ensure_worker()
+
+    def _take_due(self, now: float) -> Dict[str, str]:
+        due = {}
+        with self._lock:
+            # Orden de inserción = orden de vencimiento
+            while self._pending and len(due) < RECEIPT_CHUNK:
+                ticket_id, (due_at, token) = next(iter(self._pending.items()))
+                if due_at > now:
+                    break
+                self._pending.popitem(last=False)
+                due[ticket_id] = token
+        return due
+
+    def poll(self, now: float = None) -> int:
+        """Consulta los recibos vencidos; devuelve cuántos tokens desactivó."""
+        now = time.monotonic() if now is None else now
+        dead = []
+        while True:
+            due = self._take_due(now)
+            if not due:
+                break
+            try:
+                receipts = self.transport.receipts(list(due))
+            except Exception as exc:
+                logger.warning("No se pudieron consultar recibos de Expo: %s", exc)
+                break
+            for ticket_id, receipt in receipts.items():
+                if receipt.get("status") == "error":
+                    if (receipt.get("details") or {}).get("error") == DEVICE_NOT_REGISTERED:
+                        dead.append(due[ticket_id])
+                    else:
+                        logger.warning("Recibo push con error: %s", receipt)
+        return deactivate_tokens(dead) if dead else 0
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="push-receipts", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Error al procesar recibos push")
+            finally:
+                connections.close_all()
+
+
+# ─────────────────────────────────────────────────────────────
+#  Servicio
+# ─────────────────────────────────────────────────────────────
+
+class PushDeliveryError(RuntimeError):
+    """
+    Algún lote no pudo enviarse a Expo. ``tokens`` son los de esos lotes:
+    reintentar solo con ellos no duplica el push a quien ya lo recibió.
+    """
+
+    def __init__(self, message, tokens=()):
+        super().__init__(message)
+        self.tokens = list(tokens)
+
+
+class PushService:
+
+    def __init__(self, transport=None, chunk_size: int = CHUNK, max_workers: int = 8,
+                 receipt_delay: float = 900, receipt_interval: float = 60,
+                 background: bool = True):
+        self.transport = transport or ExpoTransport(pool_size=max_workers)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.receipts = ReceiptPoller(
+            self.transport, delay=receipt_delay, interval=receipt_interval, background=background
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="push")
+
+    def tokens(self, users=None, tokens=None):
+        """
+        Tokens activos de ``users`` (usuarios o ids) o de todos, en streaming.
+        Con ``tokens`` solo los de esa lista que sigan activos.
+        """
+        qs = ExpoPushToken.objects.filter(active=True)
+        if users is not None:
+            user_ids = {getattr(user, "pk", user) for user in users}
+            qs = qs.filter(user_id__in=user_ids)
+        if tokens is not None:
+            qs = qs.filter(token__in=list(tokens))
+        return qs.order_by().values_list("token", flat=True).iterator(chunk_size=2000)
+
+    def _send_chunk(self, batch: List[str], template: dict):
+        return batch, self.transport.send([{**template, "to": token} for token in batch])
+
+    def send(self, title: str, body: str, data: Optional[Dict[str, Any]] = None, *,
+             users=None, tokens=None, badge: Optional[int] = None,
+             raise_errors: bool = False) -> dict:
+        """
+        Envía a los tokens activos de ``users`` (``None`` = todos) o, con
+        ``tokens``, solo a esos. Devuelve ``{"sent": n, "failed": n,
+        "deactivated": n}``.
+        """
+        template = {"title": title, "body": body, "data": data or {}}
+        if badge is not None:
+            template["badge"] = badge
+
+        stats = {"sent": 0, "failed": 0, "deactivated": 0}
+        dead = []
+        accepted = {}
+        errors = []
+        failed_tokens = []
+        batches = {}
+
+        def collect(future):
+            batch = batches.pop(future)
+            try:
+                batch, tickets = future.result()
+            except PushServerError as exc:
+                logger.error(
+                    "PushServerError: %s | response=%s | errors=%s",
+                    exc,
+                    getattr(exc, "response_data", None),
+                    getattr(exc, "errors", None),
+                )
+                errors.append(exc)
+                failed_tokens.extend(batch)
+                return
+            except Exception as exc:
+                logger.exception("Error genérico al enviar push: %s", exc)
+                errors.append(exc)
+                failed_tokens.extend(batch)
+                return
+            for ticket, token in zip(tickets, batch):
+                if ticket.get("status") == "ok":
+                    stats["sent"] += 1
+                    if ticket.get("id"):
+                        accepted[ticket["id"]] = token
+                    continue
+                stats["failed"] += 1
+                if (ticket.get("details") or {}).get("error") == DEVICE_NOT_REGISTERED:
+                    dead.append(token)
+
+        # Como mucho 2 lotes por hilo en vuelo: la lectura de tokens avanza
+        # al ritmo de los envíos
+        in_flight = set()
+        for batch in _chunks(self.tokens(users, tokens), self.chunk_size):
+            if len(in_flight) >= self.max_workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            future = self._executor.submit(self._send_chunk, batch, template)
+            batches[future] = batch
+            in_flight.add(future)
+        for future in in_flight:
+            collect(future)
+
+        if not stats["sent"] and not stats["failed"] and not errors:
+            logger.info("Sin tokens para enviar push: %s", title)
+        if dead:
+            stats["deactivated"] = deactivate_tokens(dead)
+        self.receipts.track(accepted)
+
+        if errors and raise_errors:
+            raise PushDeliveryError(
+                f"{len(errors)} lote(s) push fallaron: {errors[0]}",
+                tokens=failed_tokens,
+            ) from errors[0]
+        return stats
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def build_push_service(transport=None) -> PushService:
+    max_workers = getattr(settings, "PUSH_MAX_WORKERS", 8)
+    return PushService(
+        transport=transport or ExpoTransport(
+            pool_size=max_workers, timeout=getattr(settings, "PUSH_TIMEOUT", 10)
+        ),
+        max_workers=max_workers,
+        receipt_delay=getattr(settings, "PUSH_RECEIPT_DELAY", 900),
+        receipt_interval=getattr(settings, "PUSH_RECEIPT_INTERVAL", 60),
+    )
+
+
+def get_push_service() -> PushService:
+    """Servicio compartido por el proceso (se crea en el primer uso)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = build_push_service()
+    return _service
+
+
+def set_push_service(service: PushService = None):
+    """Reemplaza el servicio del proceso (pruebas); ``None`` lo reinicia."""
+    global _service
+    _service = service
 
 
 def send_push(
@@ -21,53 +403,20 @@ def send_push(
     data: Optional[Dict[str, Any]] = None,
     *,
     user: Optional[UserAccount] = None,
+    users: Optional[Iterable] = None,
+    tokens: Optional[Iterable[str]] = None,
     badge: Optional[int] = None,
-) -> None:
+    raise_errors: bool = False,
+) -> dict:
     """
     Envía notificaciones push mediante Expo.
-    - Si se pasa `user`, sólo se envía a sus tokens activos.
-    - Si `user` es None, se envía a todos los tokens activos.
+    - Si se pasa `user` o `users` (usuarios o ids), sólo a sus tokens activos.
+    - Si no, se envía a todos los tokens activos.
+    - Con `tokens`, solo a esos tokens (reintentos de lotes fallidos).
+    - Con `raise_errors` los fallos de Expo se propagan (el outbox reintenta).
     """
-
-    qs = (
-        user.push_tokens.filter(active=True)
-        if user
-        else ExpoPushToken.objects.filter(active=True)
+    if user is not None:
+        users = [user, *(users or [])]
+    return get_push_service().send(
+        title, body, data, users=users, tokens=tokens, badge=badge, raise_errors=raise_errors
     )
-    tokens = list(qs.values_list("token", flat=True))
-    if not tokens:
-        logger.info("Sin tokens para enviar push: %s", title)
-        return
-
-    payload_data = data or {}
-
-    for batch in _chunks(tokens, CHUNK):
-        messages = []
-        for token in batch:
-            payload = {"to": token, "title": title, "body": body, "data": payload_data}
-            if badge is not None:
-                payload["badge"] = badge
-            messages.append(PushMessage(**payload))
-
-        try:
-            tickets = PushClient().publish_multiple(messages)
-        except PushServerError as exc:
-            logger.error(
-                "PushServerError: %s | response=%s | errors=%s",
-                exc,
-                getattr(exc, "response_data", None),
-                getattr(exc, "errors", None),
-            )
-            continue
-        except Exception as exc:  # pragma: no cover
-            logger.exception("Error genérico al enviar push: %s", exc)
-            continue
-
-        # Limpia tokens inválidos
-        for ticket, target in zip(tickets, batch):
-            if (
-                ticket.get("status") == "error"
-                and ticket.get("details", {}).get("error") == "DeviceNotRegistered"
-            ):
-                ExpoPushToken.objects.filter(token=target).update(active=False)
-                logger.info("Token desactivado: %s", target)
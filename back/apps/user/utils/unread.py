@@ -0,0 +1,83 @@
+"""
+utils/unread.py
+───────────────
+Contadores de pendientes por leer para los badges de la app.
+
+``UnreadCounter`` guarda por usuario las notificaciones sin leer y los
+mensajes de chat de pedidos sin leer; ``OrderChatUnread`` (app orders)
+desglosa estos últimos por pedido. Se actualizan con ``UPDATE … SET n = n ± k``
+al crear o leer notificaciones y mensajes, así que consultar el badge es
+una lectura por clave primaria sin importar cuánto historial tenga el usuario.
+
+Si se desincronizan (cambios hechos a mano en la base de datos),
+``manage.py rebuild_unread_counters`` los recalcula desde las tablas.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
+
+from apps.user.models import Notification, UnreadCounter
+
+FIELDS = ("notifications", "order_chat")
+
+
+def add_unread(user_ids, field: str, amount: int = 1):
+    """Suma ``amount`` al contador ``field`` de cada usuario."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids or amount <= 0:
+        return
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    UnreadCounter.objects.filter(user_id__in=user_ids).update(**{field: F(field) + amount})
+
+
+def remove_unread(user_id, field: str, amount: int = 1):
+    if amount <= 0:
+        return
+    UnreadCounter.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) - amount, 0)}
+    )
+
+
+def get_badges(user) -> dict:
+    row = (
+        UnreadCounter.objects.filter(user_id=user.pk).values(*FIELDS).first()
+        or dict.fromkeys(FIELDS, 0)
+    )
+    return {**row, "total": sum(row.values())}
+
+
+@transaction.atomic
+def rebuild_unread_counters() -> int:
+    """Recalcula todos los contadores; devuelve cuántos usuarios tienen alguno."""
+    from apps.orders.models import OrderChatUnread
+    from apps.orders.utils import rebuild_chat_unread
+
+    rebuild_chat_unread()
+    totals = {}
+    for user_id, count in (
+        Notification.objects.filter(read=False, user__isnull=False)
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values_list("user_id", "count")
+    ):
+        totals.setdefault(user_id, dict.fromkeys(FIELDS, 0))["notifications"] = count
+    for user_id, count in (
+        OrderChatUnread.objects.filter(count__gt=0)
+        .order_by()
+        .values("user_id")
+        .annotate(count=Sum("count"))
+        .values_list("user_id", "count")
+    ):
+        totals.setdefault(user_id, dict.fromkeys(FIELDS, 0))["order_chat"] = count
+
+    UnreadCounter.objects.all().delete()
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id, **values) for user_id, values in totals.items()],
+        batch_size=1000,
+    )
+    return len(totals)
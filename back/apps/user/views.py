@@ -41,11 +41,12 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
 from apps.product.models import Product
 from apps.product.serializers import ProductMinimalSerializer
-from apps.utils.pagination import MediumSetPagination
+from apps.utils.pagination import KeysetPagination, MediumSetPagination, cursor_requested, get_paginator
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from .models import LoginLog
 from .utils.push import send_push
+from .utils.unread import get_badges, remove_unread
 from rest_framework.permissions import IsAuthenticated
 from django.http import Http404
 from apps.utils.yuancity_stage_templates import build_stage_output
@@ -558,6 +559,10 @@ class FollowToggleView(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
+# Orden de las listas de seguidores; el id final desempata para el cursor
+FOLLOW_LIST_ORDERING = ("first_name", "last_name", "id")
+
+
 class FollowersListView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -569,7 +574,7 @@ class FollowersListView(APIView):
             User.objects.filter(following__following=target)
             .select_related("social_profile")
             .distinct()
-            .order_by("first_name", "last_name")
+            .order_by(*FOLLOW_LIST_ORDERING)
         )
 
         if search:
@@ -579,7 +584,10 @@ class FollowersListView(APIView):
                 | Q(email__icontains=search)
             )
 
-        paginator = MediumSetPagination()
+        # Con ?cursor= se pagina por el mismo orden alfabético de la lista
+        paginator = get_paginator(
+            request, MediumSetPagination, ordering=FOLLOW_LIST_ORDERING, descending=False
+        )
         page = paginator.paginate_queryset(qs, request, view=self)
         context = self._serializer_context(request, page)
         serializer = FollowListEntrySerializer(page, many=True, context=context)
@@ -633,7 +641,7 @@ class FollowingListView(APIView):
             User.objects.filter(followers__follower=target)
             .select_related("social_profile")
             .distinct()
-            .order_by("first_name", "last_name")
+            .order_by(*FOLLOW_LIST_ORDERING)
         )
 
         if search:
@@ -643,7 +651,10 @@ class FollowingListView(APIView):
                 | Q(email__icontains=search)
             )
 
-        paginator = MediumSetPagination()
+        # Con ?cursor= se pagina por el mismo orden alfabético de la lista
+        paginator = get_paginator(
+            request, MediumSetPagination, ordering=FOLLOW_LIST_ORDERING, descending=False
+        )
         page = paginator.paginate_queryset(qs, request, view=self)
         context = self._serializer_context(request, page)
         serializer = FollowListEntrySerializer(page, many=True, context=context)
@@ -743,7 +754,14 @@ class NotificationListView(APIView):
             limit = 50
         limit = max(1, min(limit, 100))
 
-        notifications_qs = request.user.notifications.order_by("-created_at")[:limit]
+        paginator = None
+        if cursor_requested(request):
+            paginator = KeysetPagination(page_size=limit, max_page_size=100)
+            notifications_qs = paginator.paginate_queryset(
+                request.user.notifications.all(), request, view=self
+            )
+        else:
+            notifications_qs = request.user.notifications.order_by("-created_at")[:limit]
         payload = [
             {
                 "id": notif.id,
@@ -755,6 +773,8 @@ class NotificationListView(APIView):
             }
             for notif in notifications_qs
         ]
+        if paginator is not None:
+            return Response({"results": payload, "next_cursor": paginator.get_next_cursor()})
         return Response({"results": payload})
 
 
@@ -765,9 +785,9 @@ class NotificationMarkReadView(APIView):
         notif = get_object_or_404(
             Notification, pk=notification_id, user=request.user
         )
-        if not notif.read:
-            notif.read = True
-            notif.save(update_fields=["read"])
+        # Condicional: dos llamadas simultáneas descuentan una sola vez
+        if Notification.objects.filter(pk=notif.pk, read=False).update(read=True):
+            remove_unread(request.user.pk, "notifications")
         return Response({"read": True})
 
 
@@ -775,10 +795,23 @@ class NotificationMarkAllView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        request.user.notifications.filter(read=False).update(read=True)
+        marked = request.user.notifications.filter(read=False).update(read=True)
+        remove_unread(request.user.pk, "notifications", marked)
         return Response({"marked": True})
 
 
+class UnreadBadgeView(APIView):
+    """
+    GET /api/badges/
+    Notificaciones y mensajes de chat sin leer, desde los contadores
+    materializados: una sola lectura por clave primaria.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_badges(request.user))
+
+
 class NotificationDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
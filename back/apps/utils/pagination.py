@@ -1,4 +1,12 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class SmallSetPagination(PageNumberPagination):
@@ -20,3 +28,136 @@ class LargeSetPagination(PageNumberPagination):
     page_size = 18
     page_size_query_param = 'page_size'
     max_page_size = 60
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre ``(created_at, id)``, de más nuevo a más viejo.
+
+    En lugar de ``OFFSET n`` + ``COUNT(*)`` filtra por la última fila vista,
+    así cada página cuesta lo mismo sin importar qué tan profundo se navegue.
+    Se activa enviando ``?cursor=`` (vacío para la primera página); la
+    respuesta incluye ``next_cursor`` para pedir la siguiente. Acepta
+    querysets de modelos o de ``.values()`` que incluyan los campos de
+    ``ordering``, que puede tener más de dos (el último debe ser único) e ir
+    en orden ascendente con ``descending=False``.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 18
+    max_page_size = 60
+    ordering = ('created_at', 'id')
+    descending = True
+
+    def __init__(self, page_size=None, max_page_size=None, ordering=None, descending=None):
+        if page_size is not None:
+            self.page_size = page_size
+        if max_page_size is not None:
+            self.max_page_size = max_page_size
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        if descending is not None:
+            self.descending = descending
+        self.next_position = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value)
+                          for value in position])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param, '').strip()
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded).decode())
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Cursor inválido.')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound('Cursor inválido.')
+        # Las fechas viajan en ISO 8601; el campo del modelo las convierte
+        return position
+
+    def position_filter(self, position):
+        """
+        Filas después de ``position`` en el orden de ``ordering``:
+        ``(a < x) OR (a = x AND b < y) OR …`` (``>`` si es ascendente).
+        """
+        lookup = 'lt' if self.descending else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            equal = dict(zip(self.ordering[:index], position[:index]))
+            condition |= Q(**equal, **{f'{field}__{lookup}': position[index]})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        prefix = '-' if self.descending else ''
+        order_by = [f'{prefix}{field}' for field in self.ordering]
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.position_filter(position))
+                rows = list(queryset.order_by(*order_by)[:page_size + 1])
+            except (ValidationError, TypeError, ValueError):
+                # Cursor bien codificado pero con valores que no encajan en los
+                # campos (p. ej. un id que no es UUID ni entero): 404, no 500.
+                raise NotFound('Cursor inválido.')
+        else:
+            rows = list(queryset.order_by(*order_by)[:page_size + 1])
+
+        page = rows[:page_size]
+        if len(rows) > page_size:
+            last = page[-1]
+            if isinstance(last, dict):
+                self.next_position = tuple(last[field] for field in self.ordering)
+            else:
+                self.next_position = tuple(getattr(last, field) for field in self.ordering)
+        return page
+
+    def get_next_cursor(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.get_next_cursor(),
+            'results': data,
+        })
+
+
+def cursor_requested(request):
+    return KeysetPagination.cursor_query_param in request.query_params
+
+
+def get_paginator(request, default_class, **keyset_options):
+    """
+    Paginador de la vista: ``KeysetPagination`` si el cliente envía
+    ``?cursor=``, si no la paginación por páginas de siempre.
+    """
+    if cursor_requested(request):
+        return KeysetPagination(
+            page_size=default_class.page_size,
+            max_page_size=default_class.max_page_size,
+            **keyset_options,
+        )
+    return default_class()
@@ -0,0 +1,80 @@
+"""
+Muestreo aleatorio de querysets sin ``order_by('?')``.
+
+``ORDER BY RANDOM()`` obliga a la base de datos a leer y ordenar todas las
+filas que cumplen el filtro. Aquí se elige un pivote al azar dentro del rango
+de claves primarias y se leen las filas siguientes recorriendo el índice de
+la PK (con vuelta al inicio si no alcanzan), lo que cuesta lo mismo sin
+importar el tamaño de la tabla.
+
+  - PK UUID (uuid4):  el pivote es un UUID aleatorio; como las claves ya están
+                      distribuidas uniformemente, las filas siguientes son una
+                      muestra aleatoria del catálogo.
+  - PK entera:        el pivote se toma entre el mínimo y el máximo.
+"""
+
+import random
+import uuid
+
+from django.db import models
+from django.db.models import Max, Min
+
+# Pivotes por muestra: más pivotes dan muestras más variadas a cambio de
+# una consulta más por pivote.
+DEFAULT_PIVOTS = 3
+
+
+def _pivot_factory(queryset):
+    """
+    Función que genera pivotes aleatorios para la PK del modelo, o ``None``
+    si el queryset está vacío.
+    """
+    if isinstance(queryset.model._meta.pk, models.UUIDField):
+        return uuid.uuid4
+    bounds = queryset.order_by().aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return None
+    return lambda: random.randint(bounds["low"], bounds["high"])
+
+
+def random_sample(queryset, size: int, pivots: int = DEFAULT_PIVOTS) -> list:
+    """
+    Devuelve hasta ``size`` objetos al azar (sin repetir) de ``queryset``.
+    Respeta filtros, ``select_related``, ``prefetch_related`` y anotaciones.
+    """
+    if size <= 0:
+        return []
+    pivots = max(1, min(pivots, size))
+    per_pivot = -(-size // pivots)
+
+    random_pivot = _pivot_factory(queryset)
+    if random_pivot is None:
+        return []
+
+    picked = {}
+    for _ in range(pivots):
+        pivot = random_pivot()
+        remaining = size - len(picked)
+        if remaining <= 0:
+            break
+        take = min(per_pivot, remaining)
+        rows = list(
+            queryset.filter(pk__gte=pivot).exclude(pk__in=list(picked)).order_by("pk")[:take]
+        )
+        if len(rows) < take:
+            # Vuelta al inicio del índice
+            rows += list(
+                queryset.filter(pk__lt=pivot).exclude(pk__in=list(picked)).order_by("pk")[: take - len(rows)]
+            )
+        for row in rows:
+            picked.setdefault(row.pk, row)
+
+    if len(picked) < size:
+        # Pocos resultados: completar con lo que quede
+        rows = queryset.exclude(pk__in=list(picked)).order_by("pk")[: size - len(picked)]
+        for row in rows:
+            picked.setdefault(row.pk, row)
+
+    sample = list(picked.values())
+    random.shuffle(sample)
+    return sample
@@ -134,7 +134,8 @@ def _load_stage_media_items(stage: int, max_items: int = 3) -> list[dict]:
     try:
         from django.apps import apps
         from django.db.models import F, Q
-        
+        from apps.utils.sampling import random_sample
+
         Product = apps.get_model("product", "Product")
         ProductImage = apps.get_model("product", "ProductImage")
     except Exception:
@@ -187,7 +188,7 @@ def _load_stage_media_items(stage: int, max_items: int = 3) -> list[dict]:
     
     elif stage == 5:
         # Regresa: sugerencias variadas
-        prioritized = _query_base().order_by("?")[:max_items * 2]
+        prioritized = random_sample(_query_base(), max_items * 2)
     
     else:
         prioritized = _query_base()[:max_items * 2]
@@ -2,27 +2,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from apps.cart.models import Cart, CartItem
+from apps.cart.utils import bump_cart, release as release_reservation
 from .models import WishList, WishListItem
 from apps.product.models import Product
 from apps.product.serializers import ProductSerializer
 
+
+def _serialize_wishlist(wishlist):
+    wishlist_items = list(
+        WishListItem.objects.filter(wishlist=wishlist).select_related('product')
+    )
+    products = ProductSerializer(
+        [wishlist_item.product for wishlist_item in wishlist_items], many=True
+    ).data
+    return [
+        {'id': wishlist_item.id, 'product': product}
+        for wishlist_item, product in zip(wishlist_items, products)
+    ]
+
+
 class GetItemsView(APIView):
     def get(self, request, format=None):
         user = self.request.user
 
         try:
             wishlist, _ = WishList.objects.get_or_create(user=user)
-            wishlist_items = WishListItem.objects.filter(wishlist=wishlist)
-            result = []
-
-            if WishListItem.objects.filter(wishlist=wishlist).exists():
-                for wishlist_item in wishlist_items:
-                    item = {}
-                    item['id'] = wishlist_item.id
-                    product = Product.objects.get(id=wishlist_item.product.id)
-                    product = ProductSerializer(product)
-                    item['product'] = product.data
-                    result.append(item)
+            result = _serialize_wishlist(wishlist)
             return Response(
                 {'wishlist': result},
                 status=status.HTTP_200_OK
@@ -81,28 +86,13 @@ class AddItemView(APIView):
                         cart=cart,
                         product=product
                     ).delete()
+                    release_reservation(cart, product)
 
-                    if not CartItem.objects.filter(cart=cart, product=product).exists():
-                        # actualizar items totales ene l carrito
-                        total_items = int(cart.total_items) - 1
-                        Cart.objects.filter(user=user).update(
-                            total_items=total_items
-                        )
-
-            wishlist_items = WishListItem.objects.filter(wishlist=wishlist)
-            result = []
-
-            for wishlist_item in wishlist_items:
-                item = {}
-
-                item['id'] = wishlist_item.id
-                product = Product.objects.get(id=wishlist_item.product.id)
-                product = ProductSerializer(product)
+                    # actualizar items totales ene l carrito
+                    bump_cart(cart, items_delta=-1)
 
-                item['product'] = product.data
+            result = _serialize_wishlist(wishlist)
 
-                result.append(item)
-            
             return Response(
                 {'wishlist': result},
                 status=status.HTTP_201_CREATED
@@ -172,21 +162,7 @@ class RemoveItemView(APIView):
                     total_items=total_items
                 )
             
-            wishlist_items = WishListItem.objects.filter(wishlist=wishlist)
-
-            result = []
-
-            if WishListItem.objects.filter(wishlist=wishlist).exists():
-                for wishlist_item in wishlist_items:
-                    item = {}
-
-                    item['id'] = wishlist_item.id
-                    product = Product.objects.get(id=wishlist_item.product.id)
-                    product = ProductSerializer(product)
-
-                    item['product'] = product.data
-
-                    result.append(item)
+            result = _serialize_wishlist(wishlist)
 
             return Response(
                 {'wishlist': result},
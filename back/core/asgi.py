@@ -3,6 +3,9 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP lo atiende Django; los WebSocket (chat de pedidos en tiempo real) los
+atiende Channels. Servir con ``uvicorn core.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -13,4 +16,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+# Inicializa Django antes de importar consumers y modelos
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from apps.orders.routing import websocket_urlpatterns  # noqa: E402
+from core.midle.ws_auth import JWTAuthMiddleware  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Sin validación de Origin: la app móvil no lo envía y la autenticación
+    # es por JWT, no por cookies
+    'websocket': JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
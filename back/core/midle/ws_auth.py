@@ -0,0 +1,46 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+@database_sync_to_async
+def _user_from_token(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    # AuthenticationFailed: usuario inexistente o inactivo
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Autentica los WebSocket con el mismo JWT de la API: cabecera
+    ``Authorization: JWT <token>`` o, desde clientes que no pueden enviar
+    cabeceras, ``?token=<token>``.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token = self._header_token(scope) or self._query_token(scope)
+        scope["user"] = await _user_from_token(raw_token) if raw_token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+    @staticmethod
+    def _header_token(scope):
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                parts = value.decode("latin1").split()
+                if len(parts) == 2:
+                    return parts[1]
+        return None
+
+    @staticmethod
+    def _query_token(scope):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        return (query.get("token") or [None])[0]
@@ -3,7 +3,9 @@ from django.urls import reverse_lazy
 from django.templatetags.static import static
 from pathlib import Path
 import os
+import sys
 import environ
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 env = environ.Env()
 
@@ -39,9 +41,60 @@ TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
 # Stripe
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
+# Stripe en memoria (apps/payment/stripe_client.py) para desarrollo sin claves
+STRIPE_FAKE = os.environ.get('STRIPE_FAKE', 'false').lower() in ('true', '1', 'yes')
+# Nunca en producción: FakeStripe da por cobrado cualquier pago con tarjeta
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if STRIPE_FAKE and not (DEBUG or TESTING):
+    raise ImproperlyConfigured('STRIPE_FAKE solo se permite con DEBUG activo o en pruebas.')
+# Vigencia (segundos) de la cotización firmada del checkout
+CHECKOUT_QUOTE_TTL = int(os.environ.get('CHECKOUT_QUOTE_TTL', '900'))
+# Caché de cupones por proceso (apps/coupons/utils.py)
+COUPON_CACHE_SIZE = int(os.environ.get('COUPON_CACHE_SIZE', '5000'))
+COUPON_CACHE_TTL = int(os.environ.get('COUPON_CACHE_TTL', '60'))
 
 # OpenAI
 OPENAI_API_KEY = os.environ.get('APIKEY')
+# Búsqueda con IA: caché del contexto (segundos) y de interpretaciones
+AI_SEARCH_CACHE_TIMEOUT = int(os.environ.get('AI_SEARCH_CACHE_TIMEOUT', '900'))
+AI_SEARCH_INTERPRETATION_TTL = int(os.environ.get('AI_SEARCH_INTERPRETATION_TTL', '3600'))
+AI_SEARCH_MAX_WORKERS = int(os.environ.get('AI_SEARCH_MAX_WORKERS', '4'))
+# Espera máxima (segundos) por la interpretación antes de usar solo la BD
+AI_SEARCH_INTERPRETATION_TIMEOUT = float(os.environ.get('AI_SEARCH_INTERPRETATION_TIMEOUT', '15'))
+# Gateway de OpenAI (apps/AI/utils/llm_gateway): timeouts en segundos por endpoint
+LLM_TIMEOUTS = {
+    'chat': float(os.environ.get('LLM_CHAT_TIMEOUT', '20')),
+    'responses': float(os.environ.get('LLM_RESPONSES_TIMEOUT', '40')),
+}
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '5'))
+LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Visitas (apps/count/tracking.py): buffer en memoria y geolocalización en segundo plano
+PAGEVIEW_FLUSH_INTERVAL = float(os.environ.get('PAGEVIEW_FLUSH_INTERVAL', '5'))
+PAGEVIEW_BATCH_SIZE = int(os.environ.get('PAGEVIEW_BATCH_SIZE', '200'))
+PAGEVIEW_BUFFER_LIMIT = int(os.environ.get('PAGEVIEW_BUFFER_LIMIT', '10000'))
+PAGEVIEW_GEO_TIMEOUT = float(os.environ.get('PAGEVIEW_GEO_TIMEOUT', '2'))
+PAGEVIEW_GEO_CACHE_SIZE = int(os.environ.get('PAGEVIEW_GEO_CACHE_SIZE', '10000'))
+PAGEVIEW_GEO_CACHE_TTL = int(os.environ.get('PAGEVIEW_GEO_CACHE_TTL', '86400'))
+# Ruta a GeoLite2-City.mmdb (requiere geoip2); sin ella se usa ip-api.com
+GEOIP_DATABASE = os.environ.get('GEOIP_DATABASE')
+
+# Outbox de push y correos (apps/user/utils/outbox.py, manage.py process_outbox)
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', '8'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BACKOFF = float(os.environ.get('OUTBOX_RETRY_BACKOFF', '30'))
+OUTBOX_LEASE_SECONDS = float(os.environ.get('OUTBOX_LEASE_SECONDS', '300'))
+# Entregar también en segundo plano tras cada commit (sin esperar al worker)
+OUTBOX_DISPATCH_ON_COMMIT = os.environ.get('OUTBOX_DISPATCH_ON_COMMIT', 'true').lower() in ('true', '1', 'yes')
+# Push de Expo (apps/user/utils/push.py): lotes en paralelo y recibos en segundo plano
+PUSH_MAX_WORKERS = int(os.environ.get('PUSH_MAX_WORKERS', '8'))
+PUSH_TIMEOUT = float(os.environ.get('PUSH_TIMEOUT', '10'))
+PUSH_RECEIPT_DELAY = float(os.environ.get('PUSH_RECEIPT_DELAY', '900'))
+PUSH_RECEIPT_INTERVAL = float(os.environ.get('PUSH_RECEIPT_INTERVAL', '60'))
 
 # Boto3
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -169,6 +222,46 @@ else:
 
 
 DATABASES["default"]["ATOMIC_REQUESTS"] = True
+
+
+# Cache
+# Con REDIS_URL la caché se comparte entre procesos; si no, memoria local.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "yuancity",
+        }
+    }
+
+# Pub/sub de Channels para el chat en tiempo real (ver apps/orders/realtime.py).
+# Con REDIS_URL se comparte entre procesos; si no, solo dentro del proceso ASGI.
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+    }
+
+CATEGORY_TREE_CACHE_TIMEOUT = int(os.environ.get("CATEGORY_TREE_CACHE_TIMEOUT", "3600"))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 